@@ -2,9 +2,10 @@
 ### Script for exporting courseware from Mongo to a tar.gz file
 ###
 import os
+from optparse import make_option
 
 from django.core.management.base import BaseCommand, CommandError
-from xmodule.modulestore.xml_exporter import export_to_xml
+from xmodule.modulestore.xml_exporter import export_to_xml, export_changes_to_xml
 from xmodule.modulestore.django import modulestore
 from xmodule.contentstore.django import contentstore
 from xmodule.course_module import CourseDescriptor
@@ -16,6 +17,15 @@ unnamed_modules = 0
 class Command(BaseCommand):
     help = 'Import the specified data directory into the default ModuleStore'
 
+    option_list = BaseCommand.option_list + (
+        make_option('--incremental',
+                    action='store_true',
+                    dest='incremental',
+                    default=False,
+                    help='Only write the files that changed since the last --incremental export '
+                         'to the same path, and remove the ones no longer exported'),
+    )
+
     def handle(self, *args, **options):
         if len(args) != 2:
             raise CommandError("import requires two arguments: <course location> <output path>")
@@ -23,11 +33,19 @@ class Command(BaseCommand):
         course_id = args[0]
         output_path = args[1]
 
-        print "Exporting course id = {0} to {1}".format(course_id, output_path)
+        self.stdout.write("Exporting course id = {0} to {1}\n".format(course_id, output_path))
 
         location = CourseDescriptor.id_to_location(course_id)
 
         root_dir = os.path.dirname(output_path)
         course_dir = os.path.splitext(os.path.basename(output_path))[0]
 
-        export_to_xml(modulestore('direct'), contentstore(), location, root_dir, course_dir)
+        if not options['incremental']:
+            export_to_xml(modulestore('direct'), contentstore(), location, root_dir, course_dir)
+            return
+
+        written, removed = export_changes_to_xml(modulestore('direct'), contentstore(), location, root_dir, course_dir)
+        for filename in written:
+            self.stdout.write("Wrote {0}\n".format(filename))
+        for filename in removed:
+            self.stdout.write("Removed {0}\n".format(filename))
@@ -0,0 +1,82 @@
+"""
+Models for Studio.
+
+CourseJob records a course import or export that is run by a Celery worker
+(see contentstore.tasks), so that the page that started it can poll for its
+progress instead of waiting on one long request.
+"""
+from django.contrib.auth.models import User
+from django.db import models
+
+
+class CourseJob(models.Model):
+    """
+    A course import or export, and how far it has got.
+
+    path is the uploaded archive for an import, and the finished archive
+    for an export.
+    """
+    IMPORT = 'import'
+    EXPORT = 'export'
+    JOB_TYPES = ((IMPORT, 'Import'), (EXPORT, 'Export'))
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = ((QUEUED, 'Queued'), (RUNNING, 'Running'),
+                (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed'))
+
+    job_type = models.CharField(max_length=32, choices=JOB_TYPES)
+    course_id = models.CharField(max_length=255, db_index=True)
+    user = models.ForeignKey(User)
+    task_id = models.CharField(max_length=255, blank=True)
+
+    status = models.CharField(max_length=32, choices=STATUSES, default=QUEUED)
+    step = models.CharField(max_length=255, blank=True)
+    steps_done = models.IntegerField(default=0)
+    steps_total = models.IntegerField(default=0)
+    message = models.TextField(blank=True)
+    path = models.CharField(max_length=255, blank=True)
+
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return u'{0} of {1} ({2})'.format(self.job_type, self.course_id, self.status)
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def start_step(self, step, steps_done):
+        """
+        Record that the job is now running step, after steps_done of its steps
+        """
+        self.status = self.RUNNING
+        self.step = step
+        self.steps_done = steps_done
+        self.save()
+
+    def succeed(self, message=''):
+        self.status = self.SUCCEEDED
+        self.steps_done = self.steps_total
+        self.step = ''
+        self.message = message
+        self.save()
+
+    def fail(self, message):
+        self.status = self.FAILED
+        self.message = message
+        self.save()
+
+    def to_json(self):
+        return {
+            'id': self.id,
+            'type': self.job_type,
+            'status': self.status,
+            'step': self.step,
+            'steps_done': self.steps_done,
+            'steps_total': self.steps_total,
+            'message': self.message,
+        }
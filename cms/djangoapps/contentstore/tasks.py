@@ -0,0 +1,162 @@
+"""
+Celery tasks that import and export courses for Studio.
+
+The views create a CourseJob and queue one of these tasks with its id; the
+task records each step it reaches on the job, which the page that started
+it polls.  With CELERY_ALWAYS_EAGER (dev and test settings) the task runs
+within the request that queues it.
+
+Imports read the uploaded archive from, and exports write to, directories
+under GITHUB_REPO_ROOT and COURSE_EXPORT_ROOT, which have to be shared
+between the Studio web servers and the workers.
+"""
+import logging
+import os
+import shutil
+import tarfile
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import transaction
+from djcelery import celery
+from path import path
+
+from auth.authz import create_all_course_groups
+from xmodule.contentstore.django import contentstore
+from xmodule.course_module import CourseDescriptor
+from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.tar_exporter import write_course_tarball
+from xmodule.modulestore.xml_importer import import_from_xml
+
+from contentstore.models import CourseJob
+
+log = logging.getLogger(__name__)
+
+IMPORT_STEPS = ('Unpacking', 'Verifying', 'Importing', 'Setting up course groups')
+EXPORT_STEPS = ('Exporting',)
+
+
+class CourseJobError(Exception):
+    """
+    A job failed for a reason that can be shown to the user as it is
+    """
+    pass
+
+
+@transaction.commit_on_success
+def _create_job(job_type, course_id, user, archive_path):
+    # committed straight away, so that a worker can see it
+    return CourseJob.objects.create(job_type=job_type, course_id=course_id, user=user,
+                                    path=archive_path, task_id=str(uuid4()))
+
+
+def start_job(job_type, course_id, user, archive_path=''):
+    """
+    Record a job of job_type (CourseJob.IMPORT or EXPORT) for the course
+    course_id (org/course/name) and queue the task to run it.  Returns the
+    job as it stands once queued.
+    """
+    task = run_course_import if job_type == CourseJob.IMPORT else run_course_export
+    job = _create_job(job_type, course_id, user, archive_path)
+    task.apply_async(args=[job.id], task_id=job.task_id)
+    return CourseJob.objects.get(id=job.id)
+
+
+def _run_job(job_id, steps, work):
+    """
+    Run work(job, step) for the job with id job_id, where step(number)
+    records that the job has reached steps[number], and record the result
+    """
+    job = CourseJob.objects.get(id=job_id)
+    job.steps_total = len(steps)
+
+    def step(number):
+        job.start_step(steps[number], number)
+
+    try:
+        work(job, step)
+    except CourseJobError as err:
+        job.fail(unicode(err))
+    except Exception:
+        log.exception("Course %s of %s failed", job.job_type, job.course_id)
+        job.fail('An unexpected error occurred during {0}.'.format(job.step.lower() or job.job_type))
+    else:
+        job.succeed()
+
+
+@celery.task
+def run_course_import(job_id):
+    _run_job(job_id, IMPORT_STEPS, import_course_archive)
+
+
+@celery.task
+def run_course_export(job_id):
+    _run_job(job_id, EXPORT_STEPS, export_course_archive)
+
+
+def import_course_archive(job, step):
+    """
+    Import the course in the .tar.gz at job.path, which is in its own
+    directory under GITHUB_REPO_ROOT, over the course of the job
+    """
+    location = CourseDescriptor.id_to_location(job.course_id)
+    archive = path(job.path)
+    course_dir = archive.dirname()
+    try:
+        step(0)
+        tar_file = tarfile.open(archive)
+        tar_file.extractall(course_dir + '/')
+        tar_file.close()
+        archive.remove()
+
+        # find the 'course.xml' file
+        step(1)
+        for dirpath, _dirnames, filenames in os.walk(course_dir):
+            if 'course.xml' in filenames:
+                break
+        else:
+            raise CourseJobError('Could not find the course.xml file in the package.')
+
+        log.debug('found course.xml at {0}'.format(dirpath))
+
+        if dirpath != course_dir:
+            for fname in os.listdir(dirpath):
+                shutil.move(path(dirpath) / fname, course_dir)
+
+        step(2)
+        _module_store, course_items = import_from_xml(modulestore('direct'), settings.GITHUB_REPO_ROOT,
+                                                      [course_dir.basename()], load_error_modules=False,
+                                                      static_content_store=contentstore(),
+                                                      target_location_namespace=location,
+                                                      draft_store=modulestore())
+        log.debug('new course at {0}'.format(course_items[0].location))
+
+        step(3)
+        create_all_course_groups(job.user, course_items[0].location)
+    finally:
+        # we can blow this away when we're done importing.
+        shutil.rmtree(course_dir, ignore_errors=True)
+
+
+def export_course_archive(job, step):
+    """
+    Export the course of the job to a .tar.gz under COURSE_EXPORT_ROOT,
+    replacing any earlier export of the same course
+    """
+    location = CourseDescriptor.id_to_location(job.course_id)
+    export_root = path(settings.COURSE_EXPORT_ROOT)
+    if not export_root.isdir():
+        export_root.makedirs_p()
+
+    step(0)
+    archive = export_root / '{0}.{1}.tar.gz'.format(location.name, job.id)
+    with open(archive, 'wb') as archive_file:
+        write_course_tarball(modulestore('direct'), contentstore(), location, location.name,
+                             archive_file, modulestore())
+    job.path = archive
+
+    earlier = CourseJob.objects.filter(job_type=CourseJob.EXPORT, course_id=job.course_id,
+                                       id__lt=job.id).exclude(path='')
+    for old_job in earlier:
+        path(old_job.path).remove_p()
+    earlier.update(path='')
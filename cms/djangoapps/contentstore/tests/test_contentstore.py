@@ -1,9 +1,14 @@
 import json
 import shutil
+import tarfile
+from StringIO import StringIO
 from django.test.client import Client
 from django.test.utils import override_settings
 from django.conf import settings
+from django.core.cache import cache, get_cache
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
+from django.http import HttpRequest
 from path import path
 from tempdir import mkdtemp_clean
 from fs.osfs import OSFS
@@ -24,8 +29,8 @@ from xmodule.modulestore.store_utilities import clone_course
 from xmodule.modulestore.store_utilities import delete_course
 from xmodule.modulestore.django import modulestore
 from xmodule.contentstore.django import contentstore
-from xmodule.templates import update_templates
-from xmodule.modulestore.xml_exporter import export_to_xml
+from xmodule.templates import update_templates, get_template_summaries
+from xmodule.modulestore.xml_exporter import export_to_xml, export_changes_to_xml
 from xmodule.modulestore.xml_importer import import_from_xml, perform_xlint
 from xmodule.modulestore.inheritance import own_metadata
 
@@ -35,8 +40,10 @@ from xmodule.seq_module import SequenceDescriptor
 from xmodule.modulestore.exceptions import ItemNotFoundError
 
 from contentstore.views.component import ADVANCED_COMPONENT_TYPES
+from contentstore.views.preview import preview_cache_key
 
 from django_comment_common.utils import are_permissions_roles_seeded
+from request_cache.middleware import RequestCache
 
 TEST_DATA_MODULESTORE = copy.deepcopy(settings.MODULESTORE)
 TEST_DATA_MODULESTORE['default']['OPTIONS']['fs_root'] = path('common/test/data')
@@ -404,6 +411,47 @@ class ContentStoreToyCourseTest(ModuleStoreTestCase):
             resp = self.client.get(reverse('edit_unit', kwargs={'location': new_loc.url()}))
             self.assertEqual(resp.status_code, 200)
 
+        # the children of the cloned course point into the clone
+        clone_course_module = module_store.get_item(dest_location)
+        self.assertGreater(len(clone_course_module.children), 0)
+        for child in clone_course_module.children:
+            self.assertTrue(child.startswith('i4x://MITx/999/'))
+
+        # and the assets were copied, data included
+        assets = content_store.get_all_content_for_course(source_location)
+        clone_assets = content_store.get_all_content_for_course(dest_location)
+        self.assertEqual(len(assets), len(clone_assets))
+        self.assertGreater(len(assets), 0)
+        asset_loc = Location(assets[0]['_id'])
+        clone_asset = content_store.find(asset_loc._replace(org='MITx', course='999'))
+        self.assertEqual(clone_asset.data, content_store.find(asset_loc).data)
+
+    def test_asset_list_pages(self):
+        content_store = contentstore()
+        import_from_xml(modulestore('direct'), 'common/test/data/', ['full'], static_content_store=content_store)
+        location = Location(['i4x', 'edX', 'full', 'course', '6.002_Spring_2012', None])
+
+        assets = content_store.get_all_content_for_course(location)
+        self.assertGreater(len(assets), 2)
+        newest_first = sorted(assets, key=lambda asset: (asset['uploadDate'], asset['_id']['name']), reverse=True)
+
+        # the asset library shows the first page, linking to the rest
+        resp = self.client.get(reverse('asset_index', kwargs={'org': 'edX', 'course': 'full', 'name': '6.002_Spring_2012'}))
+        self.assertEqual(resp.status_code, 200)
+
+        list_url = reverse('asset_list', kwargs={'org': 'edX', 'course': 'full', 'name': '6.002_Spring_2012'})
+        listed = []
+        url = list_url + '?page_size=2'
+        while url is not None:
+            page = parse_json(self.client.get(url))
+            self.assertLessEqual(len(page['assets']), 2)
+            listed.extend(asset['displayname'] for asset in page['assets'])
+            url = page['next'] and page['next'] + '&page_size=2'
+        self.assertEqual(listed, [asset['displayname'] for asset in newest_first])
+
+        resp = self.client.get(list_url + '?after=bogus')
+        self.assertEqual(resp.status_code, 400)
+
     def test_bad_contentstore_request(self):
         resp = self.client.get('http://localhost:8001/c4x/CDX/123123/asset/&images_circuits_Lab7Solution2.png')
         self.assertEqual(resp.status_code, 400)
@@ -551,6 +599,76 @@ class ContentStoreToyCourseTest(ModuleStoreTestCase):
 
         shutil.rmtree(root_dir)
 
+    def test_stream_export_course(self):
+        module_store = modulestore('direct')
+        content_store = contentstore()
+        import_from_xml(module_store, 'common/test/data/', ['full'], static_content_store=content_store)
+
+        # as one_time_startup sets up the stores, so that the export thread
+        # needs a request cache of its own
+        for store in (module_store, modulestore()):
+            store.request_cache = RequestCache.get_request_cache()
+
+        resp = self.client.get(reverse('generate_export_course', kwargs={
+            'org': 'edX', 'course': 'full', 'name': '6.002_Spring_2012'}))
+        self.assertEqual(resp.status_code, 200)
+        archive = tarfile.open(fileobj=StringIO(''.join(resp)), mode='r:gz')
+        names = archive.getnames()
+        self.assertIn('6.002_Spring_2012/course.xml', names)
+        self.assertIn('6.002_Spring_2012/policies/6.002_Spring_2012/policy.json', names)
+        self.assertTrue(any(name.startswith('6.002_Spring_2012/sequential/') for name in names))
+        self.assertTrue(any(name.startswith('6.002_Spring_2012/static/') for name in names))
+
+    def test_export_course_changes(self):
+        module_store = modulestore('direct')
+        content_store = contentstore()
+
+        import_from_xml(module_store, 'common/test/data/', ['full'], static_content_store=content_store)
+        location = CourseDescriptor.id_to_location('edX/full/6.002_Spring_2012')
+        root_dir = path(mkdtemp_clean())
+
+        written, removed = export_changes_to_xml(module_store, content_store, location, root_dir, 'test_export')
+        self.assertIn('course.xml', written)
+        self.assertIn('about/faq.html', written)
+        self.assertTrue(any(filename.startswith('static/') for filename in written))
+        self.assertEqual(removed, [])
+
+        # nothing has changed, so nothing is written again
+        self.assertEqual(
+            export_changes_to_xml(module_store, content_store, location, root_dir, 'test_export'),
+            ([], []))
+
+        module_store.update_item(Location(['i4x', 'edX', 'full', 'about', 'effort', None]), '5 hours')
+        module_store.delete_item(Location(['i4x', 'edX', 'full', 'about', 'faq', None]))
+
+        written, removed = export_changes_to_xml(module_store, content_store, location, root_dir, 'test_export')
+        self.assertEqual(written, ['about/effort.html'])
+        self.assertEqual(removed, ['about/faq.html'])
+        self.assertEqual((root_dir / 'test_export/about/effort.html').text(), '5 hours')
+        self.assertFalse((root_dir / 'test_export/about/faq.html').exists())
+
+        shutil.rmtree(root_dir)
+
+    def test_export_command_incremental(self):
+        module_store = modulestore('direct')
+        content_store = contentstore()
+
+        import_from_xml(module_store, 'common/test/data/', ['full'], static_content_store=content_store)
+        root_dir = path(mkdtemp_clean())
+
+        def export():
+            out = StringIO()
+            call_command('export', 'edX/full/6.002_Spring_2012', root_dir / 'test_export', incremental=True, stdout=out)
+            return out.getvalue().splitlines()[1:]
+
+        self.assertIn('Wrote course.xml', export())
+        self.assertEqual(export(), [])
+
+        module_store.delete_item(Location(['i4x', 'edX', 'full', 'about', 'faq', None]))
+        self.assertEqual(export(), ['Removed about/faq.html'])
+
+        shutil.rmtree(root_dir)
+
     def test_course_handouts_rewrites(self):
         module_store = modulestore('direct')
 
@@ -747,6 +865,26 @@ class ContentStoreTest(ModuleStoreTestCase):
             html=True
         )
 
+    def test_preview_is_cached(self):
+        """Test that previews are rendered again only when the component changes"""
+        course = CourseFactory.create(org='MITx', course='999', display_name='Robot Super Course')
+        item = ItemFactory.create(parent_location=course.location,
+                                  template='i4x://edx/templates/html/Blank_HTML_Page')
+        url = reverse('preview_component', kwargs={'location': item.location.url()})
+        request = HttpRequest()
+        request.session = self.client.session
+
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        cache_key = preview_cache_key(request, '0', modulestore().get_item(item.location))
+        self.assertIsNotNone(cache_key)
+        self.assertIsNotNone(cache.get(cache_key))
+
+        modulestore().update_item(item.location, '<p>Robots are educational</p>')
+        self.assertNotEqual(cache_key, preview_cache_key(request, '0', modulestore().get_item(item.location)))
+        resp = self.client.get(url)
+        self.assertContains(resp, 'Robots are educational')
+
     def test_clone_item(self):
         """Test cloning an item. E.g. creating a new section"""
         CourseFactory.create(org='MITx', course='999', display_name='Robot Super Course')
@@ -1017,3 +1155,46 @@ class TemplateTestCase(ModuleStoreTestCase):
             asserted = True
 
         self.assertTrue(asserted)
+
+    def test_template_summaries_are_read_once(self):
+        module_store = modulestore()
+        summaries = get_template_summaries(module_store)
+        self.assertIn(Location('i4x', 'edx', 'templates', 'html', 'Blank_HTML_Page'),
+                      [summary.location for summary in summaries])
+
+        wrapper = MongoCollectionFindWrapper(module_store.collection.find)
+        module_store.collection.find = wrapper.find
+        try:
+            self.assertIs(summaries, get_template_summaries(module_store))
+            self.assertEqual(wrapper.counter, 0)
+
+            # updating the templates makes them be read again
+            update_templates(modulestore('direct'))
+            self.assertIsNot(summaries, get_template_summaries(module_store))
+            self.assertGreater(wrapper.counter, 0)
+        finally:
+            del module_store.collection.find
+
+    def test_template_summaries_follow_writes_from_other_processes(self):
+        draft_store, direct_store = modulestore(), modulestore('direct')
+        # the content versions are shared through this cache, as one_time_startup sets up the stores
+        for store in (draft_store, direct_store):
+            store.metadata_inheritance_cache_subsystem = get_cache('mongo_metadata_inheritance')
+        location = Location('i4x', 'edx', 'templates', 'html', 'Blank_HTML_Page')
+
+        def display_name():
+            summaries = get_template_summaries(draft_store)
+            return [summary.display_name for summary in summaries if summary.location == location][0]
+
+        try:
+            summaries = get_template_summaries(draft_store)
+            self.assertIs(summaries, get_template_summaries(draft_store))
+
+            # written without this process's summaries being cleared, as
+            # update_templates run elsewhere would
+            direct_store.update_metadata(location, {'display_name': 'Changed HTML Page'})
+            self.assertEqual(display_name(), 'Changed HTML Page')
+        finally:
+            update_templates(direct_store)
+            for store in (draft_store, direct_store):
+                store.metadata_inheritance_cache_subsystem = None
@@ -0,0 +1,93 @@
+"""
+Tests for course import and export run as jobs (contentstore.tasks)
+"""
+import copy
+import tarfile
+from StringIO import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test.client import Client
+from django.test.utils import override_settings
+from path import path
+from tempdir import mkdtemp_clean
+
+from contentstore.models import CourseJob
+from contentstore.tests.utils import parse_json
+from xmodule.modulestore import Location
+from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
+from xmodule.modulestore.xml_importer import import_from_xml
+
+TEST_DATA_MODULESTORE = copy.deepcopy(settings.MODULESTORE)
+TEST_DATA_MODULESTORE['default']['OPTIONS']['fs_root'] = path('common/test/data')
+TEST_DATA_MODULESTORE['direct']['OPTIONS']['fs_root'] = path('common/test/data')
+
+
+@override_settings(MODULESTORE=TEST_DATA_MODULESTORE)
+class CourseJobTest(ModuleStoreTestCase):
+    """
+    Celery runs tasks eagerly under the test settings, so each job has
+    finished by the time the request that started it returns.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'test+courses@edx.org', 'foo')
+        self.user.is_active = True
+        self.user.is_staff = True
+        self.user.save()
+
+        self.client = Client()
+        self.client.login(username='testuser', password='foo')
+
+        import_from_xml(modulestore('direct'), 'common/test/data/', ['simple'])
+        self.location = Location(['i4x', 'edX', 'simple', 'course', '2012_Fall', None])
+        self.kwargs = {'org': self.location.org, 'course': self.location.course, 'name': self.location.name}
+
+    def upload(self, archive):
+        upload_dir = path(mkdtemp_clean())
+        upload_path = upload_dir / 'course.tar.gz'
+        upload_path.write_bytes(archive)
+        with open(upload_path, 'rb') as upload:
+            return self.client.post(reverse('import_course', kwargs=self.kwargs), {'course-data': upload})
+
+    def test_export_then_import(self):
+        resp = self.client.post(reverse('start_course_export', kwargs=self.kwargs))
+        self.assertEqual(resp.status_code, 200)
+        job = parse_json(resp)
+        self.assertEqual(job['status'], CourseJob.SUCCEEDED)
+        self.assertEqual(job['steps_done'], job['steps_total'])
+
+        resp = self.client.get(job['status_url'])
+        self.assertEqual(parse_json(resp)['status'], CourseJob.SUCCEEDED)
+
+        resp = self.client.get(job['download_url'])
+        self.assertEqual(resp.status_code, 200)
+        archive = ''.join(resp)
+        names = tarfile.open(fileobj=StringIO(archive), mode='r:gz').getnames()
+        self.assertIn('2012_Fall/course.xml', names)
+
+        resp = self.upload(archive)
+        job = parse_json(resp)['job']
+        self.assertEqual(job['type'], CourseJob.IMPORT)
+        self.assertEqual(job['status'], CourseJob.SUCCEEDED, job['message'])
+        self.assertIsNotNone(modulestore('direct').get_item(self.location))
+
+    def test_import_without_course_xml(self):
+        buf = StringIO()
+        tar = tarfile.open(fileobj=buf, mode='w:gz')
+        info = tarfile.TarInfo('readme.txt')
+        info.size = 5
+        tar.addfile(info, StringIO('hello'))
+        tar.close()
+
+        job = parse_json(self.upload(buf.getvalue()))['job']
+        self.assertEqual(job['status'], CourseJob.FAILED)
+        self.assertIn('course.xml', job['message'])
+
+    def test_status_of_other_course(self):
+        resp = self.client.post(reverse('start_course_export', kwargs=self.kwargs))
+        job_id = parse_json(resp)['id']
+        kwargs = dict(self.kwargs, name='2013_Spring', job_id=job_id)
+        resp = self.client.get(reverse('course_job_status', kwargs=kwargs))
+        self.assertIn(resp.status_code, (403, 404))
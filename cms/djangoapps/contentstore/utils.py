@@ -167,11 +167,15 @@ def compute_unit_state(unit):
     """
 
     if getattr(unit, 'is_draft', False):
-        try:
-            modulestore('direct').get_item(unit.location)
-            return UnitState.draft
-        except ItemNotFoundError:
-            return UnitState.private
+        # outline nodes already know whether there's a published version
+        has_published = getattr(unit, 'has_published', None)
+        if has_published is None:
+            try:
+                modulestore('direct').get_item(unit.location)
+                has_published = True
+            except ItemNotFoundError:
+                has_published = False
+        return UnitState.draft if has_published else UnitState.private
     else:
         return UnitState.public
 
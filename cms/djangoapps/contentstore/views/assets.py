@@ -1,36 +1,38 @@
 import logging
 import json
 import os
-import tarfile
-import shutil
-from tempfile import mkdtemp
+from urllib import urlencode
 from path import path
 
 from django.conf import settings
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.http import HttpResponse, HttpResponseBadRequest, Http404
 from django.contrib.auth.decorators import login_required
 from django_future.csrf import ensure_csrf_cookie
 from django.core.urlresolvers import reverse
 from django.core.servers.basehttp import FileWrapper
-from django.core.files.temp import NamedTemporaryFile
 
 from mitxmako.shortcuts import render_to_response
 from cache_toolbox.core import del_cached_content
-from auth.authz import create_all_course_groups
 
-from xmodule.modulestore.xml_importer import import_from_xml
 from xmodule.contentstore.django import contentstore
-from xmodule.modulestore.xml_exporter import export_to_xml
+from xmodule.modulestore.tar_exporter import stream_course_tarball
 from xmodule.modulestore.django import modulestore
 from xmodule.modulestore import Location
 from xmodule.contentstore.content import StaticContent
 from xmodule.util.date_utils import get_default_time_display
 
+from ..models import CourseJob
+from ..tasks import start_job
 from ..utils import get_url_reverse
 from .access import get_location_and_verify_access
 
 
-__all__ = ['asset_index', 'upload_asset', 'import_course', 'generate_export_course', 'export_course']
+__all__ = ['asset_index', 'asset_list', 'upload_asset', 'import_course', 'generate_export_course', 'export_course',
+           'start_course_export', 'course_job_status', 'download_course_export']
+
+# assets shown per page of the asset library
+ASSET_PAGE_SIZE = 50
+MAX_ASSET_PAGE_SIZE = 500
 
 
 @login_required
@@ -52,36 +54,76 @@ def asset_index(request, org, course, name):
     course_module = modulestore().get_item(location)
 
     course_reference = StaticContent.compute_location(org, course, name)
-    assets = contentstore().get_all_content_for_course(course_reference)
-
-    # sort in reverse upload date order
-    assets = sorted(assets, key=lambda asset: asset['uploadDate'], reverse=True)
-
-    asset_display = []
-    for asset in assets:
-        asset_id = asset['_id']
-        display_info = {}
-        display_info['displayname'] = asset['displayname']
-        display_info['uploadDate'] = get_default_time_display(asset['uploadDate'].timetuple())
-
-        asset_location = StaticContent.compute_location(asset_id['org'], asset_id['course'], asset_id['name'])
-        display_info['url'] = StaticContent.get_url_path_from_location(asset_location)
-
-        # note, due to the schema change we may not have a 'thumbnail_location' in the result set
-        _thumbnail_location = asset.get('thumbnail_location', None)
-        thumbnail_location = Location(_thumbnail_location) if _thumbnail_location is not None else None
-        display_info['thumb_url'] = StaticContent.get_url_path_from_location(thumbnail_location) if thumbnail_location is not None else None
-
-        asset_display.append(display_info)
+    assets, next_cursor = contentstore().get_assets_page(course_reference, ASSET_PAGE_SIZE)
 
     return render_to_response('asset_index.html', {
         'active_tab': 'assets',
         'context_course': course_module,
-        'assets': asset_display,
+        'assets': [_asset_display(asset) for asset in assets],
+        'next_assets_url': _asset_list_url(org, course, name, next_cursor),
         'upload_asset_callback_url': upload_asset_callback_url
     })
 
 
+def _asset_display(asset):
+    """
+    The information the asset library shows about asset, an entry of
+    get_assets_page
+    """
+    asset_id = asset['_id']
+    display_info = {}
+    display_info['displayname'] = asset['displayname']
+    display_info['uploadDate'] = get_default_time_display(asset['uploadDate'].timetuple())
+
+    asset_location = StaticContent.compute_location(asset_id['org'], asset_id['course'], asset_id['name'])
+    display_info['url'] = StaticContent.get_url_path_from_location(asset_location)
+
+    # note, due to the schema change we may not have a 'thumbnail_location' in the result set
+    _thumbnail_location = asset.get('thumbnail_location', None)
+    thumbnail_location = Location(_thumbnail_location) if _thumbnail_location is not None else None
+    display_info['thumb_url'] = StaticContent.get_url_path_from_location(thumbnail_location) if thumbnail_location is not None else None
+    return display_info
+
+
+def _asset_list_url(org, course, name, cursor):
+    """
+    The url of the page of assets after cursor, or None if there is no cursor
+    """
+    if cursor is None:
+        return None
+    url = reverse('asset_list', kwargs={'org': org, 'course': course, 'name': name})
+    return url + '?' + urlencode({'after': cursor.encode('utf-8')})
+
+
+@login_required
+def asset_list(request, org, course, name):
+    """
+    A page of the asset library, newest first, as json.  The 'after' parameter
+    is the cursor of the previous page (by default, the first page is
+    returned) and 'page_size' the number of assets to return.  'next' is the
+    url of the following page, or null on the last page.
+    """
+    get_location_and_verify_access(request, org, course, name)
+    try:
+        page_size = min(int(request.GET.get('page_size', ASSET_PAGE_SIZE)), MAX_ASSET_PAGE_SIZE)
+    except ValueError:
+        return HttpResponseBadRequest()
+    if page_size < 1:
+        return HttpResponseBadRequest()
+
+    course_reference = StaticContent.compute_location(org, course, name)
+    try:
+        assets, next_cursor = contentstore().get_assets_page(course_reference, page_size,
+                                                             after=request.GET.get('after'))
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    return HttpResponse(json.dumps({
+        'assets': [_asset_display(asset) for asset in assets],
+        'next': _asset_list_url(org, course, name, next_cursor),
+    }), mimetype='application/json')
+
+
 def upload_asset(request, org, course, coursename):
     '''
     cdodge: this method allows for POST uploading of files into the course asset library, which will
@@ -154,6 +196,11 @@ def import_course(request, org, course, name):
         if not filename.endswith('.tar.gz'):
             return HttpResponse(json.dumps({'ErrMsg': 'We only support uploading a .tar.gz file.'}))
 
+        # an import in progress is using the course's directory
+        if CourseJob.objects.filter(job_type=CourseJob.IMPORT, course_id='/'.join([org, course, name]),
+                                    status__in=[CourseJob.QUEUED, CourseJob.RUNNING]).exists():
+            return HttpResponse(json.dumps({'ErrMsg': 'This course is already being imported.'}))
+
         data_root = path(settings.GITHUB_REPO_ROOT)
 
         course_subdir = "{0}-{1}-{2}".format(org, course, name)
@@ -171,41 +218,9 @@ def import_course(request, org, course, name):
             temp_file.write(chunk)
         temp_file.close()
 
-        tar_file = tarfile.open(temp_filepath)
-        tar_file.extractall(course_dir + '/')
-
-        # find the 'course.xml' file
-
-        for dirpath, _dirnames, filenames in os.walk(course_dir):
-            for files in filenames:
-                if files == 'course.xml':
-                    break
-            if files == 'course.xml':
-                break
-
-        if files != 'course.xml':
-            return HttpResponse(json.dumps({'ErrMsg': 'Could not find the course.xml file in the package.'}))
-
-        logging.debug('found course.xml at {0}'.format(dirpath))
-
-        if dirpath != course_dir:
-            for fname in os.listdir(dirpath):
-                shutil.move(dirpath / fname, course_dir)
-
-        _module_store, course_items = import_from_xml(modulestore('direct'), settings.GITHUB_REPO_ROOT,
-                                                      [course_subdir], load_error_modules=False,
-                                                      static_content_store=contentstore(),
-                                                      target_location_namespace=Location(location),
-                                                      draft_store=modulestore())
-
-        # we can blow this away when we're done importing.
-        shutil.rmtree(course_dir)
-
-        logging.debug('new course at {0}'.format(course_items[0].location))
-
-        create_all_course_groups(request.user, course_items[0].location)
-
-        return HttpResponse(json.dumps({'Status': 'OK'}))
+        # unpacking and importing are left to a worker
+        job = start_job(CourseJob.IMPORT, '/'.join([org, course, name]), request.user, temp_filepath)
+        return HttpResponse(json.dumps({'Status': 'OK', 'job': _job_json(job)}))
     else:
         course_module = modulestore().get_item(location)
 
@@ -222,29 +237,71 @@ def generate_export_course(request, org, course, name):
     location = get_location_and_verify_access(request, org, course, name)
 
     loc = Location(location)
-    export_file = NamedTemporaryFile(prefix=name + '.', suffix=".tar.gz")
 
-    root_dir = path(mkdtemp())
+    # the tarball is generated as it is sent, so its length isn't known
+    chunks = stream_course_tarball(modulestore('direct'), contentstore(), loc, name, modulestore())
+    response = HttpResponse(chunks, content_type='application/x-tgz')
+    response['Content-Disposition'] = 'attachment; filename=%s.tar.gz' % name
+    return response
+
+
+def _job_json(job):
+    """
+    The state of job, with the urls to poll it and to download its result
+    """
+    org, course, name = job.course_id.split('/')
+    job_json = job.to_json()
+    job_json['status_url'] = reverse('course_job_status', kwargs={
+        'org': org, 'course': course, 'name': name, 'job_id': job.id})
+    if job.job_type == CourseJob.EXPORT and job.status == CourseJob.SUCCEEDED:
+        job_json['download_url'] = reverse('download_course_export', kwargs={
+            'org': org, 'course': course, 'name': name, 'job_id': job.id})
+    return job_json
+
 
-    # export out to a tempdir
+def _get_job(org, course, name, job_id):
+    try:
+        return CourseJob.objects.get(id=job_id, course_id='/'.join([org, course, name]))
+    except CourseJob.DoesNotExist:
+        raise Http404
 
-    logging.debug('root = {0}'.format(root_dir))
 
-    export_to_xml(modulestore('direct'), contentstore(), loc, root_dir, name, modulestore())
-    #filename = root_dir / name + '.tar.gz'
+@login_required
+def course_job_status(request, org, course, name, job_id):
+    """
+    The progress of a course import or export, as json
+    """
+    get_location_and_verify_access(request, org, course, name)
+    job = _get_job(org, course, name, job_id)
+    return HttpResponse(json.dumps(_job_json(job)), mimetype='application/json')
 
-    logging.debug('tar file being generated at {0}'.format(export_file.name))
-    tar_file = tarfile.open(name=export_file.name, mode='w:gz')
-    tar_file.add(root_dir / name, arcname=name)
-    tar_file.close()
 
-    # remove temp dir
-    shutil.rmtree(root_dir / name)
+@login_required
+def start_course_export(request, org, course, name):
+    """
+    Queue an export of the course, returning the job as json
+    """
+    get_location_and_verify_access(request, org, course, name)
+    if request.method != 'POST':
+        return HttpResponseBadRequest()
+
+    job = start_job(CourseJob.EXPORT, '/'.join([org, course, name]), request.user)
+    return HttpResponse(json.dumps(_job_json(job)), mimetype='application/json')
+
 
-    wrapper = FileWrapper(export_file)
-    response = HttpResponse(wrapper, content_type='application/x-tgz')
-    response['Content-Disposition'] = 'attachment; filename=%s' % os.path.basename(export_file.name)
-    response['Content-Length'] = os.path.getsize(export_file.name)
+@login_required
+def download_course_export(request, org, course, name, job_id):
+    """
+    The .tar.gz written by a finished export job
+    """
+    get_location_and_verify_access(request, org, course, name)
+    job = _get_job(org, course, name, job_id)
+    if job.job_type != CourseJob.EXPORT or job.status != CourseJob.SUCCEEDED or not os.path.exists(job.path):
+        raise Http404
+
+    response = HttpResponse(FileWrapper(open(job.path, 'rb')), content_type='application/x-tgz')
+    response['Content-Disposition'] = 'attachment; filename=%s.tar.gz' % name
+    response['Content-Length'] = os.path.getsize(job.path)
     return response
 
 
@@ -12,6 +12,7 @@ from mitxmako.shortcuts import render_to_response
 
 from xmodule.modulestore import Location
 from xmodule.modulestore.django import modulestore
+from xmodule.templates import get_template_summaries
 from xmodule.util.date_utils import get_default_time_display
 
 from xblock.core import Scope
@@ -137,8 +138,7 @@ def edit_unit(request, location):
     else:
         log.error("Improper format for course advanced keys! {0}".format(course_advanced_keys))
 
-    templates = modulestore().get_items(Location('i4x', 'edx', 'templates'))
-    for template in templates:
+    for template in get_template_summaries(modulestore()):
         category = template.location.category
 
         if category in course_advanced_keys:
@@ -147,9 +147,9 @@ def edit_unit(request, location):
         if category in component_types:
             # This is a hack to create categories for different xmodules
             component_templates[category].append((
-                template.display_name_with_default,
+                template.display_name,
                 template.location.url(),
-                hasattr(template, 'markdown') and template.markdown is not None
+                template.has_markdown
             ))
 
     components = [
@@ -62,8 +62,9 @@ def course_index(request, org, course, name):
         'coursename': name
     })
 
-    course = modulestore().get_item(location, depth=3)
-    sections = course.get_children()
+    course = modulestore().get_item(location)
+    # the outline only needs names, dates and draft states, not descriptors
+    sections = modulestore().get_course_outline(location).get_children()
 
     return render_to_response('overview.html', {
         'active_tab': 'courseware',
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import sys
 from functools import partial
@@ -5,6 +6,7 @@ from functools import partial
 from django.http import HttpResponse, Http404, HttpResponseBadRequest, HttpResponseForbidden
 from django.core.urlresolvers import reverse
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from mitxmako.shortcuts import render_to_response
 
 from xmodule_modifiers import replace_static_urls, wrap_xmodule
@@ -26,6 +28,13 @@ __all__ = ['preview_dispatch', 'preview_component']
 
 log = logging.getLogger(__name__)
 
+# how long a rendered preview is kept (see get_module_previews)
+PREVIEW_CACHE_TIMEOUT = 60 * 60
+
+# session key of a counter that is bumped whenever the state of a preview
+# in the session may have changed, which outdates the cached previews
+PREVIEW_STATE_VERSION_KEY = 'preview_state_version'
+
 
 @login_required
 def preview_dispatch(request, preview_id, location, dispatch=None):
@@ -41,6 +50,7 @@ def preview_dispatch(request, preview_id, location, dispatch=None):
 
     descriptor = modulestore().get_item(location)
     instance = load_preview_module(request, preview_id, descriptor)
+    request.session[PREVIEW_STATE_VERSION_KEY] = request.session.get(PREVIEW_STATE_VERSION_KEY, 0) + 1
     # Let the module handle the AJAX
     try:
         ajax_return = instance.handle_ajax(dispatch, request.POST)
@@ -163,15 +173,53 @@ def load_preview_module(request, preview_id, descriptor):
     return module
 
 
+def preview_cache_key(request, preview_id, descriptor):
+    """
+    Returns the key under which the html of the preview of descriptor is
+    cached, or None if it can't be cached.
+
+    A preview depends on what was stored for the descriptor (told apart by
+    when it was last written), the metadata it inherits, and the state of the
+    preview (its random seed, answers and so on), which is kept in the
+    session.  Descriptors with children aren't cached, since their previews
+    also depend on their children.
+    """
+    edited_on = getattr(descriptor, 'edited_on', None)
+    session_key = request.session.session_key
+    if edited_on is None or session_key is None or descriptor.has_children:
+        return None
+
+    key = repr((
+        descriptor.location.url(),
+        getattr(descriptor, 'is_draft', False),
+        edited_on,
+        sorted(getattr(descriptor, '_inherited_metadata', {}).items()),
+        preview_id,
+        session_key,
+        request.session.get(PREVIEW_STATE_VERSION_KEY, 0),
+    ))
+    return 'preview_html.' + hashlib.md5(key).hexdigest()
+
+
 def get_module_previews(request, descriptor):
     """
     Returns a list of preview XModule html contents. One preview is returned for each
     pair of states returned by get_sample_state() for the supplied descriptor.
 
+    Previews are cached (see preview_cache_key), so a component that hasn't
+    changed isn't rendered again each time its unit is visited.
+
     descriptor: An XModuleDescriptor
     """
     preview_html = []
     for idx, (_instance_state, _shared_state) in enumerate(descriptor.get_sample_state()):
-        module = load_preview_module(request, str(idx), descriptor)
-        preview_html.append(module.get_html())
+        preview_id = str(idx)
+        cache_key = preview_cache_key(request, preview_id, descriptor)
+        html = cache.get(cache_key) if cache_key is not None else None
+        if html is None:
+            module = load_preview_module(request, preview_id, descriptor)
+            html = module.get_html()
+            if cache_key is not None:
+                cache.set(cache_key, html, PREVIEW_CACHE_TIMEOUT)
+        preview_html.append(html)
     return preview_html
@@ -59,6 +59,10 @@ ENV_ROOT = REPO_ROOT.dirname()  # virtualenv dir /mitx is in
 
 GITHUB_REPO_ROOT = ENV_ROOT / "data"
 
+# Where course export jobs leave their .tar.gz files for download.  This,
+# like GITHUB_REPO_ROOT, has to be shared with the celery workers.
+COURSE_EXPORT_ROOT = ENV_ROOT / "exports"
+
 sys.path.append(REPO_ROOT)
 sys.path.append(PROJECT_ROOT / 'djangoapps')
 sys.path.append(PROJECT_ROOT / 'lib')
@@ -194,6 +198,24 @@ LOCALE_PATHS = (REPO_ROOT + '/conf/locale',)  # mitx/conf/locale/
 # Tracking
 TRACK_MAX_EVENT = 10000
 
+# Tracking events are written by a background thread, in batches of up to
+# TRACK_BATCH_SIZE or every TRACK_FLUSH_INTERVAL seconds.  Events beyond
+# TRACK_QUEUE_SIZE waiting to be written are dropped.  At exit, the process
+# waits up to TRACK_EXIT_FLUSH_TIMEOUT seconds for queued events to be written.
+TRACK_ASYNC = True
+TRACK_QUEUE_SIZE = 10000
+TRACK_BATCH_SIZE = 100
+TRACK_FLUSH_INTERVAL = 1.0
+TRACK_EXIT_FLUSH_TIMEOUT = 5.0
+
+# Requests to paths matching TRACK_IGNORE_URLS are not tracked.  The POST
+# data of requests matching TRACK_IGNORE_POST_URLS, of multipart requests, and
+# of requests with bodies over TRACK_MAX_POST_BODY bytes is not tracked, so
+# that the body does not have to be parsed.
+TRACK_IGNORE_URLS = [r'^/event$', r'^/login$']
+TRACK_IGNORE_POST_URLS = [r'/upload_asset$', r'/import/[^/]+$']
+TRACK_MAX_POST_BODY = 64 * 1024
+
 # Messages
 MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
 
@@ -33,6 +33,7 @@ $(document).ready(function() {
     $modal.bind('click', hideModal);
     $modalCover.bind('click', hideModal);
     $('.uploads .upload-button').bind('click', showUploadModal);
+    $('.uploads .load-more-assets').bind('click', loadMoreAssets);
     $('.upload-modal .close-button').bind('click', hideModal);
 
     $body.on('click', '.embeddable-xml-input', function() {
@@ -461,6 +462,25 @@ function displayFinishedUpload(xhr) {
 
 }
 
+function loadMoreAssets(e) {
+    e.preventDefault();
+    var $link = $(this);
+    var template = $('#new-asset-element').html();
+    $.getJSON($link.attr('href'), function(resp) {
+        $.each(resp.assets, function(index, asset) {
+            // skip files uploaded since the page was loaded, which are shown already
+            if ($("tr[data-id='" + asset.url + "']").length == 0) {
+                $('table > tbody').append(Mustache.to_html(template, asset));
+            }
+        });
+        if (resp.next) {
+            $link.attr('href', resp.next);
+        } else {
+            $link.closest('.pagination').remove();
+        }
+    });
+}
+
 function markAsLoaded() {
     $('.upload-modal .copy-button').css('display', 'inline-block');
     $('.upload-modal .progress-bar').addClass('loaded');
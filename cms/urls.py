@@ -30,6 +30,12 @@ urlpatterns = ('',  # nopep8
         'contentstore.views.export_course', name='export_course'),
     url(r'^(?P<org>[^/]+)/(?P<course>[^/]+)/generate_export/(?P<name>[^/]+)$',
         'contentstore.views.generate_export_course', name='generate_export_course'),
+    url(r'^(?P<org>[^/]+)/(?P<course>[^/]+)/start_export/(?P<name>[^/]+)$',
+        'contentstore.views.start_course_export', name='start_course_export'),
+    url(r'^(?P<org>[^/]+)/(?P<course>[^/]+)/download_export/(?P<name>[^/]+)/(?P<job_id>\d+)$',
+        'contentstore.views.download_course_export', name='download_course_export'),
+    url(r'^(?P<org>[^/]+)/(?P<course>[^/]+)/job_status/(?P<name>[^/]+)/(?P<job_id>\d+)$',
+        'contentstore.views.course_job_status', name='course_job_status'),
 
     url(r'^preview/modx/(?P<preview_id>[^/]*)/(?P<location>.*?)/(?P<dispatch>[^/]*)$',
         'contentstore.views.preview_dispatch', name='preview_dispatch'),
@@ -73,6 +79,8 @@ urlpatterns = ('',  # nopep8
         'contentstore.views.edit_tabs', name='edit_tabs'),
     url(r'^(?P<org>[^/]+)/(?P<course>[^/]+)/assets/(?P<name>[^/]+)$',
         'contentstore.views.asset_index', name='asset_index'),
+    url(r'^(?P<org>[^/]+)/(?P<course>[^/]+)/asset_list/(?P<name>[^/]+)$',
+        'contentstore.views.asset_list', name='asset_list'),
 
     # this is a generic method to return the data/metadata associated with a xmodule
     url(r'^module_info/(?P<module_location>.*)$',
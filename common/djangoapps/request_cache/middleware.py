@@ -1,7 +1,14 @@
 import threading
 
-_request_cache_threadlocal = threading.local()
-_request_cache_threadlocal.data = {}
+
+class _RequestCacheThreadLocal(threading.local):
+    # threading.local runs __init__ in each thread that uses it, so threads
+    # started outside of a request (e.g. to stream an export) get a cache too
+    def __init__(self):
+        self.data = {}
+
+
+_request_cache_threadlocal = _RequestCacheThreadLocal()
 
 class RequestCache(object):
     @classmethod
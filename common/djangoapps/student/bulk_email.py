@@ -0,0 +1,150 @@
+"""
+Sending the same e-mail to a large number of users.
+
+Recipients are read in chunks and all sent over one SMTP connection, sending
+is held to a maximum rate, and the position reached is written to a checkpoint
+file after every chunk so that an interrupted run can be restarted where it
+stopped.  The checkpoint is removed once a run completes.
+"""
+import json
+import logging
+import os
+import smtplib
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+
+log = logging.getLogger(__name__)
+
+
+def iter_active_user_emails(chunk_size=1000, after_id=0):
+    """
+    Yields lists of up to chunk_size (id, email) pairs for active users, in
+    id order, starting after after_id.  Each chunk is its own query, keyed on
+    the last id seen, so only one chunk is in memory at a time.
+    """
+    users = User.objects.filter(is_active=True).order_by('id')
+    while True:
+        chunk = list(users.filter(id__gt=after_id).values_list('id', 'email')[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1][0]
+
+
+class CheckpointMismatch(Exception):
+    """
+    A checkpoint was saved by a run sending something else, or to other recipients
+    """
+    pass
+
+
+def read_checkpoint(filename, job=None):
+    """
+    Returns the position saved in filename by a BulkMailer for job, or None if
+    there is no checkpoint.
+
+    Raises CheckpointMismatch if the checkpoint was saved for a different job,
+    as resuming from its position would skip recipients of this one.
+    """
+    if filename is None or not os.path.exists(filename):
+        return None
+    with open(filename) as checkpoint:
+        saved = json.load(checkpoint)
+    if saved['job'] != job:
+        raise CheckpointMismatch("{0} was saved by a run for {1}, not {2}".format(filename, saved['job'], job))
+    return saved['position']
+
+
+class BulkMailer(object):
+    """
+    Sends one message (subject and body already rendered) to many recipients.
+
+    rate: maximum messages per second, or None for no limit
+    checkpoint: file to record the position of the last recipient sent to
+    job: JSON-serializable description of the run (e.g. the message and
+        recipient list used), saved with the checkpoint for read_checkpoint
+    connection: e-mail backend connection to use (defaults to get_connection())
+    """
+    def __init__(self, subject, body, from_email=None, rate=None, checkpoint=None, job=None, connection=None):
+        self.subject = subject
+        self.body = body
+        self.from_email = from_email or settings.DEFAULT_FROM_EMAIL
+        self.rate = rate
+        self.checkpoint = checkpoint
+        self.job = job
+        self.connection = connection or get_connection()
+        self.sent = 0
+        self._started = None
+
+    def send(self, chunks):
+        """
+        Send to the recipients in chunks, an iterable of lists of
+        (position, email) pairs in increasing position order.
+
+        The checkpoint is removed once all of them have been sent.
+
+        Returns the number of messages sent.
+        """
+        self._started = time.time()
+        self.connection.open()
+        try:
+            for chunk in chunks:
+                self.send_chunk(chunk)
+        finally:
+            self.connection.close()
+        if self.checkpoint is not None and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        return self.sent
+
+    def send_chunk(self, chunk):
+        """
+        Send to one chunk of (position, email) pairs and record the last position.
+
+        Messages are sent one at a time, so that if the server drops the
+        connection only the ones not yet sent are sent again, and if sending
+        fails the checkpoint is the last position actually sent to.
+        """
+        self._throttle(len([email for position, email in chunk if email]))
+        last_sent = None
+        try:
+            for position, email in chunk:
+                if email:
+                    self._send_message(EmailMessage(self.subject, self.body, self.from_email, [email]))
+                last_sent = position
+        finally:
+            if last_sent is not None:
+                self._save_checkpoint(last_sent)
+        log.info("bulk email: %d sent", self.sent)
+
+    def _send_message(self, message):
+        try:
+            self.connection.send_messages([message])
+        except smtplib.SMTPServerDisconnected:
+            # the server dropped the connection before this message was sent
+            self.connection.close()
+            self.connection.open()
+            self.connection.send_messages([message])
+        self.sent += 1
+
+    def _throttle(self, count):
+        """
+        Wait until count more messages can be sent without exceeding the rate
+        """
+        if not self.rate:
+            return
+        earliest = self._started + float(self.sent + count) / self.rate
+        delay = earliest - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _save_checkpoint(self, position):
+        if self.checkpoint is None:
+            return
+        # write then rename, so a crash never leaves a partial checkpoint
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'w') as checkpoint:
+            json.dump({'job': self.job, 'position': position}, checkpoint)
+        os.rename(tmp, self.checkpoint)
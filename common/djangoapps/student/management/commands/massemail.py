@@ -1,13 +1,11 @@
-import os.path
+from optparse import make_option
 
-from lxml import etree
-
-from django.core.management.base import BaseCommand
-from django.conf import settings
-from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
 
 import mitxmako.middleware as middleware
 
+from student.bulk_email import BulkMailer, CheckpointMismatch, iter_active_user_emails, read_checkpoint
+
 middleware.MakoMiddleware()
 
 
@@ -16,14 +14,39 @@ class Command(BaseCommand):
 '''Sends an e-mail to all users. Takes a single
 parameter -- name of e-mail template -- located
 in templates/email. Adds a .txt for the message
-body, and an _subject.txt for the subject. '''
+body, and an _subject.txt for the subject.
+
+With --checkpoint, the id of the last user e-mailed is saved
+to the given file, and a run for the same template with the same
+checkpoint file starts after that user.  The file is removed once
+every user has been e-mailed. '''
+
+    option_list = BaseCommand.option_list + (
+        make_option('--rate',
+                    dest='rate',
+                    type='float',
+                    default=None,
+                    help='Maximum messages to send per second'),
+        make_option('--batch-size',
+                    dest='batch_size',
+                    type='int',
+                    default=100,
+                    help='Number of users to read, and send to, between checkpoints'),
+        make_option('--checkpoint',
+                    dest='checkpoint',
+                    default=None,
+                    help='File in which to record progress, for resuming'),
+    )
 
     def handle(self, *args, **options):
-        #text = open(args[0]).read()
-        #subject = open(args[1]).read()
-        users = User.objects.all()
         text = middleware.lookup['main'].get_template('email/' + args[0] + ".txt").render()
         subject = middleware.lookup['main'].get_template('email/' + args[0] + "_subject.txt").render().strip()
-        for user in users:
-            if user.is_active:
-                user.email_user(subject, text)
+
+        job = {'message': args[0]}
+        try:
+            after_id = read_checkpoint(options['checkpoint'], job) or 0
+        except CheckpointMismatch as err:
+            raise CommandError(str(err))
+        mailer = BulkMailer(subject, text, rate=options['rate'], checkpoint=options['checkpoint'], job=job)
+        sent = mailer.send(iter_active_user_emails(options['batch_size'], after_id=after_id))
+        print "{0} messages sent".format(sent)
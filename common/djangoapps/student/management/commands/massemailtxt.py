@@ -1,29 +1,18 @@
 import os.path
-import time
-
-from lxml import etree
+import sys
 
-from django.core.management.base import BaseCommand
-from django.conf import settings
-from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
 
 import mitxmako.middleware as middleware
 
-from django.core.mail import send_mass_mail
-import sys
+from courseware.model_data import chunks
+from student.bulk_email import BulkMailer, CheckpointMismatch, read_checkpoint
 
 import datetime
 
 middleware.MakoMiddleware()
 
 
-def chunks(l, n):
-    """ Yield successive n-sized chunks from l.
-    """
-    for i in xrange(0, len(l), n):
-        yield l[i:i + n]
-
-
 class Command(BaseCommand):
     help = \
 '''Sends an e-mail to all users in a text file.
@@ -33,6 +22,11 @@ userlist.txt -- list of all users
 message -- prefix for template with message
 logfile.txt -- where to log progress
 rate -- messages per second
+
+The line number of the last address sent to is kept in
+logfile.txt.checkpoint; running again with the same user list,
+message and log file resumes after it.  The checkpoint is
+removed once every address has been sent to.
  '''
     log_file = None
 
@@ -40,7 +34,6 @@ rate -- messages per second
         self.log_file.write(datetime.datetime.utcnow().isoformat() + ' -- ' + text + '\n')
 
     def handle(self, *args, **options):
-        global log_file
         (user_file, message_base, logfilename, ratestr) = args
 
         users = [u.strip() for u in open(user_file).readlines()]
@@ -49,18 +42,26 @@ rate -- messages per second
         subject = middleware.lookup['main'].get_template('emails/' + message_base + "_subject.txt").render().strip()
         rate = int(ratestr)
 
-        self.log_file = open(logfilename, "a+", buffering=0)
+        checkpoint = logfilename + '.checkpoint'
+        job = {'user_file': os.path.abspath(user_file), 'message': message_base}
+        try:
+            start = read_checkpoint(checkpoint, job) or 0
+        except CheckpointMismatch as err:
+            raise CommandError(str(err))
 
-        i = 0
-        for users in chunks(users, rate):
-            emails = [(subject, message, settings.DEFAULT_FROM_EMAIL, [u]) for u in users]
-            self.hard_log(" ".join(users))
-            send_mass_mail(emails, fail_silently=False)
-            time.sleep(1)
-            print datetime.datetime.utcnow().isoformat(), i
-            i = i + len(users)
-            # Emergency interruptor
-            if os.path.exists("/tmp/stopemails.txt"):
-                self.log_file.close()
-                sys.exit(-1)
+        self.log_file = open(logfilename, "a+", buffering=0)
+        mailer = BulkMailer(subject, message, rate=rate, checkpoint=checkpoint, job=job)
+
+        def numbered_chunks():
+            numbered = list(enumerate(users, 1))[start:]
+            for chunk in chunks(numbered, rate):
+                # Emergency interruptor
+                if os.path.exists("/tmp/stopemails.txt"):
+                    self.log_file.close()
+                    sys.exit(-1)
+                self.hard_log(" ".join(email for (number, email) in chunk))
+                yield chunk
+                print datetime.datetime.utcnow().isoformat(), chunk[-1][0]
+
+        mailer.send(numbered_chunks())
         self.log_file.close()
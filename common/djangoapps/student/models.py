@@ -10,10 +10,13 @@ file and check it in at the same time as your model changes. To do that,
 2. django-admin.py schemamigration student --auto --settings=lms.envs.dev --pythonpath=. description_of_your_change
 3. Add the migration file created in mitx/common/djangoapps/student/migrations/
 """
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime
 import hashlib
 import json
 import logging
+import threading
 import uuid
 from random import randint
 from time import strftime
@@ -22,11 +25,12 @@ from time import strftime
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.forms import ModelForm, forms
 
 import comment_client as cc
+from util.cache import cache
 
 
 log = logging.getLogger(__name__)
@@ -654,6 +658,89 @@ class CourseEnrollment(models.Model):
         return "[CourseEnrollment] %s: %s (%s)" % (self.user, self.course_id, self.created)
 
 
+# Enrollment counts are recounted at least this often (seconds)
+ENROLLMENT_COUNT_TIMEOUT = 60 * 60
+
+
+def _enrollment_count_key(course_id):
+    return u'course_enrollment_count.{0}'.format(course_id)
+
+
+def course_enrollment_count(course_id):
+    """
+    Returns the number of students enrolled in course_id.
+
+    The count is cached, and kept up to date as CourseEnrollments are
+    created and deleted.
+    """
+    key = _enrollment_count_key(course_id)
+    count = cache.get(key)
+    if count is None:
+        count = CourseEnrollment.objects.filter(course_id=course_id).count()
+        cache.add(key, count, ENROLLMENT_COUNT_TIMEOUT)
+    return count
+
+
+# course_id -> delta of the adjustments held back by deferred_enrollment_counts
+_deferred_enrollment_counts = threading.local()
+
+
+@contextmanager
+def deferred_enrollment_counts():
+    """
+    Hold back the enrollment count adjustments made inside the block, and
+    apply them once it completes.  Wrap a transaction that creates or deletes
+    CourseEnrollments in this, so that the counts only change once it has
+    been committed; if the block raises, the adjustments are dropped along
+    with the rolled back changes.
+    """
+    if getattr(_deferred_enrollment_counts, 'deltas', None) is not None:
+        # an enclosing block applies them
+        yield
+        return
+
+    deltas = _deferred_enrollment_counts.deltas = defaultdict(int)
+    try:
+        yield
+    finally:
+        _deferred_enrollment_counts.deltas = None
+    for course_id, delta in deltas.iteritems():
+        adjust_course_enrollment_count(course_id, delta)
+
+
+def adjust_course_enrollment_count(course_id, delta):
+    """
+    Add delta to the cached enrollment count for course_id.  Call this after
+    creating or deleting CourseEnrollments without sending signals, e.g.
+    with bulk_create.
+    """
+    deltas = getattr(_deferred_enrollment_counts, 'deltas', None)
+    if deltas is not None:
+        deltas[course_id] += delta
+        return
+
+    key = _enrollment_count_key(course_id)
+    try:
+        if delta > 0:
+            cache.incr(key, delta)
+        elif delta < 0:
+            cache.decr(key, -delta)
+    except ValueError:
+        # not cached, it will be counted when next needed
+        pass
+
+
+@receiver(post_save, sender=CourseEnrollment)
+def count_enrollment(sender, instance, created, **kwargs):
+    if created:
+        adjust_course_enrollment_count(instance.course_id, 1)
+
+
+@receiver(post_delete, sender=CourseEnrollment)
+def uncount_enrollment(sender, instance, **kwargs):
+    adjust_course_enrollment_count(instance.course_id, -1)
+
+
 class CourseEnrollmentAllowed(models.Model):
     """
     Table of users (specified by email address strings) who are allowed to enroll in a specified course.
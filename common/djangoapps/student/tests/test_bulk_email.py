@@ -0,0 +1,102 @@
+import os
+import shutil
+import smtplib
+import tempfile
+
+from django.core import mail
+from django.test import TestCase
+from mock import patch
+
+from student.bulk_email import BulkMailer, CheckpointMismatch, iter_active_user_emails, read_checkpoint
+from student.tests.factories import UserFactory
+
+
+class DroppingConnection(object):
+    """
+    An e-mail connection that the server drops once, after drop_after messages
+    """
+    def __init__(self, drop_after):
+        self.drop_after = drop_after
+        self.sent = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        for message in messages:
+            if len(self.sent) == self.drop_after:
+                self.drop_after = None
+                raise smtplib.SMTPServerDisconnected()
+            self.sent.append(message.to[0])
+        return len(messages)
+
+
+class BulkMailerTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.tempdir, 'checkpoint')
+        self.users = [UserFactory.create(username='user%d' % n, email='user%d@example.com' % n)
+                      for n in range(5)]
+        UserFactory.create(username='inactive', email='inactive@example.com', is_active=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_iter_active_user_emails(self):
+        chunks = list(iter_active_user_emails(chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual([email for chunk in chunks for _, email in chunk],
+                         [user.email for user in self.users])
+
+    def interrupted_send(self, job):
+        """
+        Send to the first chunk of users, then stop as if interrupted
+        """
+        def chunks():
+            for chunk in iter_active_user_emails(chunk_size=2):
+                yield chunk
+                raise KeyboardInterrupt
+
+        mailer = BulkMailer('subject', 'body', checkpoint=self.checkpoint, job=job)
+        with self.assertRaises(KeyboardInterrupt):
+            mailer.send(chunks())
+
+    def test_send_and_resume(self):
+        job = {'message': 'test'}
+        self.interrupted_send(job)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(read_checkpoint(self.checkpoint, job), self.users[1].id)
+
+        mailer = BulkMailer('subject', 'body', checkpoint=self.checkpoint, job=job)
+        mailer.send(iter_active_user_emails(chunk_size=2, after_id=read_checkpoint(self.checkpoint, job)))
+        self.assertEqual([message.to[0] for message in mail.outbox],
+                         [user.email for user in self.users])
+        # a complete run leaves nothing to resume
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assertEqual(read_checkpoint(self.checkpoint, job), None)
+
+    def test_resume_other_job(self):
+        self.interrupted_send({'message': 'test', 'user_file': '/tmp/users.txt'})
+        with self.assertRaises(CheckpointMismatch):
+            read_checkpoint(self.checkpoint, {'message': 'other', 'user_file': '/tmp/users.txt'})
+        with self.assertRaises(CheckpointMismatch):
+            read_checkpoint(self.checkpoint, {'message': 'test', 'user_file': '/tmp/other.txt'})
+
+    @patch('student.bulk_email.time')
+    def test_rate(self, mock_time):
+        mock_time.time.return_value = 100.0
+        mailer = BulkMailer('subject', 'body', rate=2)
+        mailer.send(iter_active_user_emails(chunk_size=2))
+        # 5 messages at 2 a second, with no time passing while sending
+        self.assertEqual([call[0][0] for call in mock_time.sleep.call_args_list], [1.0, 2.0, 2.5])
+
+    def test_server_disconnect(self):
+        connection = DroppingConnection(drop_after=3)
+        mailer = BulkMailer('subject', 'body', checkpoint=self.checkpoint, connection=connection)
+        self.assertEqual(mailer.send(iter_active_user_emails(chunk_size=5)), 5)
+        # the messages sent before the server dropped the connection aren't sent again
+        self.assertEqual(connection.sent, [user.email for user in self.users])
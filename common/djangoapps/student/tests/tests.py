@@ -9,7 +9,11 @@ import logging
 from django.test import TestCase
 from mock import Mock
 
-from student.models import unique_id_for_user
+from student.models import unique_id_for_user, course_enrollment_count, adjust_course_enrollment_count
+from student.models import deferred_enrollment_counts
+from student.models import CourseEnrollment
+from student.tests.factories import CourseEnrollmentFactory, UserFactory
+from util.cache import cache
 from student.views import process_survey_link, _cert_info
 
 COURSE_1 = 'edX/toy/2012_Fall'
@@ -105,3 +109,46 @@ class CourseEndingTest(TestCase):
                           'show_survey_button': False,
                           'grade': '67'
                           })
+
+
+class CourseEnrollmentCountTest(TestCase):
+
+    COURSE_ID = 'edX/toy/2012_Fall'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_maintained(self):
+        CourseEnrollmentFactory.create(course_id=self.COURSE_ID)
+        self.assertEqual(course_enrollment_count(self.COURSE_ID), 1)
+
+        enrollment = CourseEnrollmentFactory.create(course_id=self.COURSE_ID)
+        self.assertEqual(course_enrollment_count(self.COURSE_ID), 2)
+
+        enrollment.delete()
+        self.assertEqual(course_enrollment_count(self.COURSE_ID), 1)
+
+    def test_adjust_for_bulk_create(self):
+        self.assertEqual(course_enrollment_count(self.COURSE_ID), 0)
+        users = [UserFactory.create(username='bulk%d' % n, email='bulk%d@example.com' % n) for n in range(3)]
+        CourseEnrollment.objects.bulk_create([CourseEnrollment(user=user, course_id=self.COURSE_ID) for user in users])
+        adjust_course_enrollment_count(self.COURSE_ID, len(users))
+        self.assertEqual(course_enrollment_count(self.COURSE_ID), 3)
+
+    def test_deferred_until_block_completes(self):
+        enrollment = CourseEnrollmentFactory.create(course_id=self.COURSE_ID)
+        self.assertEqual(course_enrollment_count(self.COURSE_ID), 1)
+        with deferred_enrollment_counts():
+            CourseEnrollmentFactory.create(course_id=self.COURSE_ID)
+            CourseEnrollmentFactory.create(course_id=self.COURSE_ID)
+            enrollment.delete()
+            self.assertEqual(course_enrollment_count(self.COURSE_ID), 1)
+        self.assertEqual(course_enrollment_count(self.COURSE_ID), 2)
+
+    def test_deferred_dropped_on_error(self):
+        self.assertEqual(course_enrollment_count(self.COURSE_ID), 0)
+        with self.assertRaises(ValueError):
+            with deferred_enrollment_counts():
+                adjust_course_enrollment_count(self.COURSE_ID, 3)
+                raise ValueError
+        self.assertEqual(course_enrollment_count(self.COURSE_ID), 0)
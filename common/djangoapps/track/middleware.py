@@ -1,49 +1,124 @@
 import json
+import re
 
 from django.conf import settings
 
 import views
 
+# Removes passwords from the tracking logs
+# WARNING: This list needs to be changed whenever we change
+# password handling functionality.
+#
+# As of the time of this comment, only 'password' is used
+# The rest are there for future extension.
+#
+# Passwords should never be sent as GET requests, but
+# this can happen due to older browser bugs. We censor
+# this too.
+#
+# We should manually confirm no passwords make it into log
+# files when we change this.
+CENSORED_STRINGS = ['password', 'newpassword', 'new_password',
+                    'oldpassword', 'old_password']
+
+# Length of the serialized GET/POST data kept in the event
+MAX_EVENT_LENGTH = 512
+
+
+def _compile(patterns):
+    return [re.compile(pattern) for pattern in patterns]
+
+
+def truncated_json(obj, limit):
+    """
+    Returns json.dumps(obj)[:limit], but stops serializing once
+    limit characters have been produced
+    """
+    chunks = []
+    length = 0
+    for chunk in json.JSONEncoder().iterencode(obj):
+        chunks.append(chunk)
+        length += len(chunk)
+        if length >= limit:
+            break
+    return ''.join(chunks)[:limit]
+
+
+def _censored_params(querydict, limit):
+    """
+    The parameters in querydict as a dict of lists, with passwords replaced,
+    and with no more values, or characters of a value, than could fit in
+    limit characters of json
+    """
+    params = {}
+    budget = limit
+    for key, values in querydict.iterlists():
+        if budget <= 0:
+            break
+        if key in CENSORED_STRINGS:
+            params[key] = '*' * 8
+        else:
+            params[key] = [value[:budget] for value in values[:budget]]
+        budget -= len(key) + sum(len(value) for value in values)
+    return params
+
 
 class TrackMiddleware:
+    """
+    Logs a server event for each request, with (a truncated copy of) its
+    GET and POST parameters.
+
+    Paths matching TRACK_IGNORE_URLS are not logged at all.  The POST data
+    is left out, so that Django does not have to parse the request body, for
+    paths matching TRACK_IGNORE_POST_URLS, multipart bodies (file uploads)
+    that have not already been parsed, and bodies longer than
+    TRACK_MAX_POST_BODY bytes.
+    """
+    def __init__(self):
+        self.ignore_urls = _compile(getattr(settings, 'TRACK_IGNORE_URLS', [r'^/event$', r'^/login$']))
+        self.ignore_post_urls = _compile(getattr(settings, 'TRACK_IGNORE_POST_URLS', []))
+        self.max_post_body = getattr(settings, 'TRACK_MAX_POST_BODY', 64 * 1024)
+
+    def should_log_post(self, request, path):
+        """
+        Whether the POST data of request can be logged without an
+        expensive parse of its body
+        """
+        if request.method != 'POST':
+            return False
+        if hasattr(request, '_post'):
+            # already parsed by something else
+            return True
+        if any(pattern.search(path) for pattern in self.ignore_post_urls):
+            return False
+        if request.META.get('CONTENT_TYPE', '').startswith('multipart'):
+            return False
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return False
+        return content_length <= self.max_post_body
+
     def process_request(self, request):
         try:
+            path = request.META['PATH_INFO']
+
             # We're already logging events, and we don't want to capture user
             # names/passwords.
-            if request.META['PATH_INFO'] in ['/event', '/login']:
+            if any(pattern.search(path) for pattern in self.ignore_urls):
                 return
 
-            # Removes passwords from the tracking logs
-            # WARNING: This list needs to be changed whenever we change
-            # password handling functionality.
-            #
-            # As of the time of this comment, only 'password' is used
-            # The rest are there for future extension.
-            #
-            # Passwords should never be sent as GET requests, but
-            # this can happen due to older browser bugs. We censor
-            # this too.
-            #
-            # We should manually confirm no passwords make it into log
-            # files when we change this.
-
-            censored_strings = ['password', 'newpassword', 'new_password',
-                                'oldpassword', 'old_password']
-            post_dict = dict(request.POST)
-            get_dict = dict(request.GET)
-            for string in censored_strings:
-                if string in post_dict:
-                    post_dict[string] = '*' * 8
-                if string in get_dict:
-                    get_dict[string] = '*' * 8
-
-            event = {'GET': dict(get_dict),
-                      'POST': dict(post_dict)}
-
-            # TODO: Confirm no large file uploads
-            event = json.dumps(event)
-            event = event[:512]
-
-            views.server_track(request, request.META['PATH_INFO'], event)
+            if self.should_log_post(request, path):
+                post_dict = _censored_params(request.POST, MAX_EVENT_LENGTH)
+            else:
+                post_dict = {}
+            get_dict = _censored_params(request.GET, MAX_EVENT_LENGTH)
+
+            event = {'GET': get_dict,
+                     'POST': post_dict}
+
+            event = truncated_json(event, MAX_EVENT_LENGTH)
+
+            views.server_track(request, path, event)
         except:
             pass
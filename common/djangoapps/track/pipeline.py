@@ -0,0 +1,178 @@
+"""
+Background delivery of tracking events.
+
+Events are put on a bounded in-process queue by the request thread and
+written out by a daemon thread: to the "tracking" log, and, when
+ENABLE_SQL_TRACKING_LOGS is on, to the TrackingLog table with one
+bulk_create per batch.
+
+If the queue is full the event is dropped and counted rather than
+making the request wait.  With TRACK_ASYNC set to False, events are
+written immediately by the calling thread instead.
+
+The thread closes its database connection after each batch, since Django
+doesn't reconnect one that the server has timed out.  Events still queued
+when the process exits are written out by an atexit handler, for up to
+TRACK_EXIT_FLUSH_TIMEOUT seconds.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import Queue
+
+import dateutil.parser
+from django.conf import settings
+from django.db import close_connection
+
+from track.models import TrackingLog
+
+log = logging.getLogger("tracking")
+errlog = logging.getLogger(__name__)
+
+LOGFIELDS = ['username', 'ip', 'event_source', 'event_type', 'event', 'agent', 'page', 'time', 'host']
+
+# log a warning for the first dropped event and then every this many
+DROP_WARNING_INTERVAL = 1000
+
+
+class EventPipeline(object):
+    """
+    A bounded queue of events with a thread flushing them in batches.
+
+    The thread is started on the first event sent, and again by the first
+    event sent after a fork, so the pipeline can be created at import time.
+    """
+    def __init__(self, max_queue_size=10000, batch_size=100, flush_interval=1.0):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.sent = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._dropped_lock = threading.Lock()
+        self._atexit_registered = False
+
+    def send(self, event):
+        """
+        Queue event (a dict with at least the LOGFIELDS keys) to be logged.
+        Returns False if it had to be dropped.
+        """
+        if not getattr(settings, 'TRACK_ASYNC', True):
+            self.write([event])
+            return True
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except Queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped % DROP_WARNING_INTERVAL == 1:
+                errlog.warning("Tracking queue full, %d events dropped so far", dropped)
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Block until all the events queued so far have been written, or
+        until timeout seconds have passed.
+        """
+        if self._queue is None or self._pid != os.getpid():
+            return
+        if timeout is None:
+            self._queue.join()
+            return
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def write(self, events):
+        """
+        Write a batch of events to the tracking log and, if enabled, the database
+        """
+        records = []
+        for event in events:
+            log.info(json.dumps(event)[:settings.TRACK_MAX_EVENT])
+            if settings.MITX_FEATURES.get('ENABLE_SQL_TRACKING_LOGS'):
+                try:
+                    fields = dict((x, event[x]) for x in LOGFIELDS)
+                    fields['time'] = dateutil.parser.parse(fields['time'])
+                    records.append(TrackingLog(**fields))
+                except Exception as err:
+                    log.exception(err)
+        if records:
+            try:
+                TrackingLog.objects.bulk_create(records)
+            except Exception as err:
+                log.exception(err)
+        self.sent += len(events)
+
+    def _ensure_started(self):
+        """
+        Start the flushing thread, unless it is already running in this process
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # a forked child inherits the queue but not the thread
+            self._queue = Queue.Queue(self.max_queue_size)
+            self._thread = threading.Thread(target=self._run, name='tracking-pipeline')
+            self._thread.daemon = True
+            self._thread.start()
+            self._pid = pid
+            # a forked child inherits the handler along with the pipeline
+            if not self._atexit_registered:
+                atexit.register(self._flush_at_exit)
+                self._atexit_registered = True
+
+    def _flush_at_exit(self):
+        """
+        Write out the events still queued when the process exits
+        """
+        timeout = getattr(settings, 'TRACK_EXIT_FLUSH_TIMEOUT', 5.0)
+        self.flush(timeout)
+        if self._queue is not None and self._pid == os.getpid() and self._queue.unfinished_tasks:
+            errlog.warning("%d tracking events were not written before exit", self._queue.unfinished_tasks)
+
+    def _run(self):
+        queue = self._queue
+        while True:
+            batch = [queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(queue.get(timeout=remaining))
+                except Queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            except Exception:
+                errlog.exception("Unable to write tracking events")
+            finally:
+                # don't hold on to a connection that may time out before the next batch
+                try:
+                    close_connection()
+                except Exception:
+                    errlog.exception("Unable to close the tracking database connection")
+                for _ in batch:
+                    queue.task_done()
+
+
+pipeline = EventPipeline(
+    max_queue_size=getattr(settings, 'TRACK_QUEUE_SIZE', 10000),
+    batch_size=getattr(settings, 'TRACK_BATCH_SIZE', 100),
+    flush_interval=getattr(settings, 'TRACK_FLUSH_INTERVAL', 1.0),
+)
@@ -5,7 +5,19 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+import datetime
+import time
+from StringIO import StringIO
+
+from django.conf import settings
 from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from mock import patch
+
+from track.middleware import TrackMiddleware, MAX_EVENT_LENGTH
+from track.models import TrackingLog
+from track.pipeline import EventPipeline
 
 
 class SimpleTest(TestCase):
@@ -14,3 +26,96 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class EventPipelineTest(TestCase):
+    """
+    Tests for the background tracking event pipeline
+    """
+    def make_event(self, n):
+        return {'username': 'user%d' % n, 'ip': '127.0.0.1', 'event_source': 'server',
+                'event_type': '/test', 'event': '{}', 'agent': '', 'page': None,
+                'time': datetime.datetime.utcnow().isoformat(), 'host': 'testserver'}
+
+    @override_settings(TRACK_ASYNC=True)
+    def test_events_written_in_batches(self):
+        events = EventPipeline(batch_size=10, flush_interval=0.01)
+        batches = []
+        with patch.object(events, 'write', side_effect=batches.append):
+            for n in range(25):
+                self.assertTrue(events.send(self.make_event(n)))
+            events.flush(timeout=10)
+        self.assertEqual(sum(len(batch) for batch in batches), 25)
+        self.assertTrue(all(len(batch) <= 10 for batch in batches))
+
+    @override_settings(MITX_FEATURES=dict(settings.MITX_FEATURES, ENABLE_SQL_TRACKING_LOGS=True))
+    def test_write_saves_tracking_logs(self):
+        EventPipeline().write([self.make_event(n) for n in range(3)])
+        self.assertEqual(TrackingLog.objects.filter(event_type='/test').count(), 3)
+
+    @override_settings(TRACK_ASYNC=True)
+    def test_full_queue_drops_events(self):
+        events = EventPipeline(max_queue_size=1, batch_size=1)
+        with patch.object(events, 'write', side_effect=lambda batch: time.sleep(0.5)):
+            results = [events.send(self.make_event(n)) for n in range(5)]
+            # let the writer finish while write is still patched
+            events.flush(timeout=10)
+        self.assertIn(False, results)
+        self.assertEqual(events.dropped, results.count(False))
+
+
+    @override_settings(TRACK_ASYNC=True)
+    def test_connection_closed_after_each_batch(self):
+        events = EventPipeline(batch_size=1, flush_interval=0.01)
+        with patch.object(events, 'write', side_effect=ValueError('no database')):
+            with patch('track.pipeline.close_connection') as close_connection:
+                for n in range(3):
+                    events.send(self.make_event(n))
+                events.flush(timeout=10)
+        self.assertEqual(close_connection.call_count, 3)
+
+    @override_settings(TRACK_ASYNC=True)
+    def test_queued_events_written_at_exit(self):
+        events = EventPipeline(batch_size=100, flush_interval=0.5)
+        batches = []
+        with patch('track.pipeline.atexit.register') as register:
+            with patch.object(events, 'write', side_effect=batches.append):
+                for n in range(5):
+                    events.send(self.make_event(n))
+                # what atexit would run
+                register.call_args[0][0]()
+        self.assertEqual(register.call_count, 1)
+        self.assertEqual(sum(len(batch) for batch in batches), 5)
+
+class TrackMiddlewareTest(TestCase):
+    """
+    Tests for the request tracking middleware
+    """
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = TrackMiddleware()
+
+    def tracked_event(self, request):
+        with patch('track.views.server_track') as server_track:
+            self.middleware.process_request(request)
+        if not server_track.called:
+            return None
+        return server_track.call_args[0][2]
+
+    def test_censors_passwords(self):
+        event = self.tracked_event(self.factory.post('/create_account', {'password': 'secret', 'name': 'x'}))
+        self.assertNotIn('secret', event)
+        self.assertIn('"name": ["x"]', event)
+
+    def test_truncated(self):
+        event = self.tracked_event(self.factory.post('/somewhere', {'answer': 'x' * 10000}))
+        self.assertEqual(len(event), MAX_EVENT_LENGTH)
+
+    def test_ignored_url(self):
+        self.assertIsNone(self.tracked_event(self.factory.get('/event')))
+
+    def test_multipart_body_not_parsed(self):
+        request = self.factory.post('/upload', {'file': StringIO('contents'), 'name': 'x'})
+        event = self.tracked_event(request)
+        self.assertFalse(hasattr(request, '_post'))
+        self.assertIn('"POST": {}', event)
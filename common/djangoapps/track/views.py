@@ -1,35 +1,27 @@
-import json
 import logging
 import os
 import pytz
 import datetime
-import dateutil.parser
 
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse
 from django.http import Http404
 from django.shortcuts import redirect
-from django.conf import settings
 from mitxmako.shortcuts import render_to_response
 
 from django_future.csrf import ensure_csrf_cookie
 from track.models import TrackingLog
+from track.pipeline import pipeline
 
 log = logging.getLogger("tracking")
 
-LOGFIELDS = ['username', 'ip', 'event_source', 'event_type', 'event', 'agent', 'page', 'time', 'host']
-
 
 def log_event(event):
-    event_str = json.dumps(event)
-    log.info(event_str[:settings.TRACK_MAX_EVENT])
-    if settings.MITX_FEATURES.get('ENABLE_SQL_TRACKING_LOGS'):
-        event['time'] = dateutil.parser.parse(event['time'])
-        tldat = TrackingLog(**dict((x, event[x]) for x in LOGFIELDS))
-        try:
-            tldat.save()
-        except Exception as err:
-            log.exception(err)
+    """
+    Log event to the tracking log (and the TrackingLog table, if enabled).
+    The writes are done in the background, see track.pipeline.
+    """
+    pipeline.send(event)
 
 
 def user_track(request):
@@ -70,20 +70,22 @@ def replace_static_urls(get_html, data_dir, course_namespace=None):
 def grade_histogram(module_id):
     ''' Print out a histogram of grades on a given problem.
         Part of staff member debug info.
+
+        The counts are maintained by courseware.models.StudentModuleGradeCount.
+        If GRADE_HISTOGRAM_CACHE_TIMEOUT is set, histograms are also cached for
+        that many seconds.
     '''
-    from django.db import connection
-    cursor = connection.cursor()
-
-    q = """SELECT courseware_studentmodule.grade,
-                  COUNT(courseware_studentmodule.student_id)
-    FROM courseware_studentmodule
-    WHERE courseware_studentmodule.module_id=%s
-    GROUP BY courseware_studentmodule.grade"""
-    # Passing module_id this way prevents sql-injection.
-    cursor.execute(q, [module_id])
-
-    grades = list(cursor.fetchall())
-    grades.sort(key=lambda x: x[0])          # Add ORDER BY to sql query?
+    from courseware.models import StudentModuleGradeCount
+    from util.cache import cache
+
+    timeout = getattr(settings, 'GRADE_HISTOGRAM_CACHE_TIMEOUT', 0)
+    key = u'grade_histogram.{0}'.format(module_id)
+    grades = cache.get(key) if timeout else None
+    if grades is None:
+        grades = StudentModuleGradeCount.histogram_for_module(module_id)
+        if timeout:
+            cache.set(key, grades, timeout)
+
     if len(grades) >= 1 and grades[0][0] is None:
         return []
     return grades
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+from mock import Mock, patch
+
+from capa.xqueue_interface import TIMEOUT_MSG, XQueueInterface, XQueueOutbox
+
+
+class XQueueInterfaceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.interface = XQueueInterface('http://xqueue', {'username': 'lms', 'password': 'pw'},
+                                         retries=2, backoff=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def reply(self, return_code=0, content='ok'):
+        return Mock(status_code=200, text='{"return_code": %d, "content": "%s"}' % (return_code, content))
+
+    def test_retries_connection_errors(self):
+        with patch.object(self.interface.session, 'post') as post:
+            post.side_effect = [requests.exceptions.ConnectionError(), self.reply()]
+            self.assertEqual(self.interface.send_to_queue('header', 'body'), (0, 'ok'))
+            self.assertEqual(post.call_count, 2)
+
+            post.reset_mock()
+            post.side_effect = requests.exceptions.ConnectionError()
+            self.assertEqual(self.interface.send_to_queue('header', 'body'), (1, 'cannot connect to server'))
+            self.assertEqual(post.call_count, 3)
+
+    def test_does_not_retry_timeouts(self):
+        with patch.object(self.interface.session, 'post') as post:
+            post.side_effect = [requests.exceptions.Timeout(), self.reply()]
+            self.assertEqual(self.interface.send_to_queue('header', 'body'), (1, TIMEOUT_MSG))
+            self.assertEqual(post.call_count, 1)
+
+    def test_send_many(self):
+        with patch.object(self.interface.session, 'post', return_value=self.reply()) as post:
+            results = self.interface.send_many([('header', 'body %d' % n) for n in range(20)])
+        self.assertEqual(results, [(0, 'ok')] * 20)
+        self.assertEqual(post.call_count, 20)
+
+    def outbox(self):
+        """
+        An outbox for self.interface that only sends when drained
+        """
+        return XQueueOutbox(os.path.join(self.tempdir, 'outbox.db'), self.interface, send_in_background=False)
+
+    def test_outbox(self):
+        outbox = self.outbox()
+        with patch.object(self.interface.session, 'post') as post:
+            error, msg = outbox.put('header', 'body')
+            self.assertEqual(error, 0)
+            self.assertFalse(post.called)
+            self.assertEqual(len(outbox), 1)
+
+            post.return_value = self.reply(1, 'busy')
+            self.assertEqual(outbox.drain(), 0)
+            self.assertEqual(len(outbox), 1)
+
+            post.return_value = self.reply()
+            self.assertEqual(outbox.drain(), 1)
+            self.assertEqual(len(outbox), 0)
+
+    def test_outbox_does_not_resend_timeouts(self):
+        outbox = self.outbox()
+        outbox.put('header', 'body')
+        with patch.object(self.interface.session, 'post') as post:
+            post.side_effect = requests.exceptions.Timeout()
+            self.assertEqual(outbox.drain(), 0)
+            self.assertEqual(len(outbox), 0)
+            self.assertEqual(post.call_count, 1)
@@ -4,12 +4,21 @@
 import hashlib
 import json
 import logging
+import os
 import requests
+import sqlite3
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 
 
 log = logging.getLogger(__name__)
 dateformat = '%Y%m%d%H%M%S'
 
+# the message of the error returned when xqueue doesn't reply in time.  By
+# then it has usually received the request, so it isn't sent again.
+TIMEOUT_MSG = 'timed out waiting for server'
+
 
 def make_hashkey(seed):
     '''
@@ -57,12 +66,31 @@ def parse_xreply(xreply):
 class XQueueInterface(object):
     '''
     Interface to the external grading system
+
+    pool_size: number of connections to keep open to xqueue (and so the number
+        of requests that send_many will have in flight at once)
+    timeout: seconds to wait for xqueue to respond, or None to wait forever
+    retries: number of times to retry a request that could not connect,
+        waiting backoff, 2 * backoff, 4 * backoff, ... seconds between.  A
+        request that times out is not retried, as xqueue may have queued it.
+    outbox_path: if set, submissions without files are not sent in the calling
+        thread, but saved to an XQueueOutbox in this sqlite file and sent by a
+        background thread
     '''
 
-    def __init__(self, url, django_auth, requests_auth=None):
+    def __init__(self, url, django_auth, requests_auth=None, pool_size=10,
+                 timeout=None, retries=0, backoff=0.5, outbox_path=None):
         self.url  = url
         self.auth = django_auth
-        self.session = requests.session(auth=requests_auth)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.session(auth=requests_auth, config={
+            'pool_connections': pool_size,
+            'pool_maxsize': pool_size,
+        })
+        self.outbox = XQueueOutbox(outbox_path, self) if outbox_path else None
 
     def send_to_queue(self, header, body, files_to_upload=None):
         """
@@ -77,6 +105,14 @@ class XQueueInterface(object):
 
         Returns (error_code, msg) where error_code != 0 indicates an error
         """
+        if self.outbox is not None and not files_to_upload:
+            return self.outbox.put(header, body)
+        return self.send_now(header, body, files_to_upload)
+
+    def send_now(self, header, body, files_to_upload=None):
+        """
+        send_to_queue, always waiting for xqueue's reply
+        """
         # Attempt to send to queue
         (error, msg) = self._send_to_queue(header, body, files_to_upload)
 
@@ -95,6 +131,23 @@ class XQueueInterface(object):
 
         return (error, msg)
 
+    def send_many(self, submissions):
+        """
+        Submit several requests to xqueue, up to pool_size at a time, and wait
+        for all of them.
+
+        submissions: list of (header, body) or (header, body, files_to_upload)
+
+        Returns a list of (error_code, msg), one for each submission
+        """
+        if not submissions:
+            return []
+        pool = ThreadPool(min(self.pool_size, len(submissions)))
+        try:
+            return pool.map(lambda submission: self.send_now(*submission), submissions)
+        finally:
+            pool.close()
+
 
     def _login(self):
         payload = {'username': self.auth['username'],
@@ -114,13 +167,152 @@ class XQueueInterface(object):
 
 
     def _http_post(self, url, data, files=None):
-        try:
-            r = self.session.post(url, data=data, files=files)
-        except requests.exceptions.ConnectionError, err:
-            log.error(err)
-            return (1, 'cannot connect to server')
+        attempt = 0
+        while True:
+            try:
+                r = self.session.post(url, data=data, files=files, timeout=self.timeout)
+                break
+            except requests.exceptions.Timeout, err:
+                log.error(err)
+                return (1, TIMEOUT_MSG)
+            except requests.exceptions.ConnectionError, err:
+                log.error(err)
+                if attempt >= self.retries:
+                    return (1, 'cannot connect to server')
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+            if files:
+                for f in files.values():
+                    f.seek(0)
 
         if r.status_code not in [200]:
             return (1, 'unexpected HTTP status code [%d]' % r.status_code)
 
         return parse_xreply(r.text)
+
+
+class XQueueOutbox(object):
+    '''
+    A durable queue of submissions waiting to be sent to xqueue, kept in a
+    sqlite database so that they survive restarts and can be shared by
+    several processes.
+
+    Submissions are sent by a background thread in each process that has put
+    anything in the outbox (unless send_in_background is False, in which case
+    they are only sent by calls to drain).  Each submission is claimed by one
+    sender at a time, and one that fails is retried with exponential backoff
+    up to max_attempts times.  One that times out is not, as xqueue has
+    usually received it by then.
+    '''
+
+    # seconds a sender may take to send a claimed submission before
+    # another sender may claim it
+    CLAIM_TIMEOUT = 300
+
+    def __init__(self, path, interface, max_attempts=10, poll_interval=1.0, send_in_background=True):
+        self.path = path
+        self.interface = interface
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.send_in_background = send_in_background
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        with self._connect() as db:
+            db.execute('''CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY,
+                header TEXT,
+                body TEXT,
+                attempts INTEGER DEFAULT 0,
+                not_before REAL DEFAULT 0)''')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def put(self, header, body):
+        """
+        Save a submission to be sent.  Returns (error_code, msg), like
+        XQueueInterface.send_to_queue
+        """
+        try:
+            with self._connect() as db:
+                db.execute('INSERT INTO outbox (header, body) VALUES (?, ?)', (header, body))
+        except sqlite3.Error, err:
+            log.exception(err)
+            return (1, 'unable to queue submission')
+        if self.send_in_background:
+            self._ensure_started()
+            self._wakeup.set()
+        return (0, 'Queued for delivery to the grader')
+
+    def __len__(self):
+        with self._connect() as db:
+            return db.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def drain(self):
+        """
+        Send the submissions that are due, returning the number sent
+        """
+        sent = 0
+        row_id = 0
+        while True:
+            submission = self._claim(row_id)
+            if submission is None:
+                return sent
+            row_id, header, body, attempts = submission
+            (error, msg) = self.interface.send_now(header, body)
+            with self._connect() as db:
+                if not error:
+                    db.execute('DELETE FROM outbox WHERE id = ?', (row_id,))
+                    sent += 1
+                elif msg == TIMEOUT_MSG:
+                    log.error("Timed out sending xqueue submission %s, not sending it again", header)
+                    db.execute('DELETE FROM outbox WHERE id = ?', (row_id,))
+                elif attempts + 1 >= self.max_attempts:
+                    log.error("Giving up on xqueue submission %s after %d attempts: %s",
+                              header, attempts + 1, msg)
+                    db.execute('DELETE FROM outbox WHERE id = ?', (row_id,))
+                else:
+                    log.warning("Unable to send xqueue submission, will retry: %s", msg)
+                    db.execute('UPDATE outbox SET attempts = ?, not_before = ? WHERE id = ?',
+                               (attempts + 1, time.time() + self.interface.backoff * 2 ** attempts, row_id))
+
+    def _claim(self, after_id):
+        """
+        Claim the oldest submission that is due with an id after after_id,
+        returning (id, header, body, attempts) or None
+        """
+        now = time.time()
+        with self._connect() as db:
+            due = db.execute('SELECT id, header, body, attempts FROM outbox '
+                             'WHERE not_before <= ? AND id > ? ORDER BY id LIMIT 10', (now, after_id)).fetchall()
+            for row_id, header, body, attempts in due:
+                claimed = db.execute('UPDATE outbox SET not_before = ? WHERE id = ? AND not_before <= ?',
+                                     (now + self.CLAIM_TIMEOUT, row_id, now)).rowcount
+                if claimed:
+                    return (row_id, header, body, attempts)
+        return None
+
+    def _ensure_started(self):
+        """
+        Start the sending thread, unless it is already running in this process
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            thread = threading.Thread(target=self._run, name='xqueue-outbox')
+            thread.daemon = True
+            thread.start()
+            self._pid = pid
+
+    def _run(self):
+        while True:
+            try:
+                self.drain()
+            except Exception:
+                log.exception("Error sending xqueue submissions")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
@@ -113,6 +113,50 @@ class ContentStore(object):
         '''
         raise NotImplementedError
 
+    def get_assets_page(self, location, page_size=50, after=None, get_thumbnails=False):
+        '''
+        Returns (assets, next_cursor): up to page_size of the assets of the
+        course of location, newest first, starting after the position
+        next_cursor marked on the previous page (or at the start if after is
+        None).  next_cursor is None on the last page.
+        '''
+        raise NotImplementedError
+
+    def get_asset_checksums(self, location):
+        """
+        Returns {asset name: (md5, import_path)} for the stored assets of the
+        course of location.  Default impl--nothing is known to be stored.
+        """
+        return {}
+
+    def export_all_for_course_to_fs(self, course_location, output_fs):
+        """
+        Write all the assets of the course into output_fs, a pyfilesystem object
+        """
+        raise NotImplementedError
+
+    def copy_all_for_course(self, source_location, dest_location):
+        """
+        Copy all the assets and thumbnails of the course of source_location
+        to the course of dest_location.  Default impl--find and save each one.
+        """
+        for content_list in (self.get_all_content_thumbnails_for_course(source_location),
+                             self.get_all_content_for_course(source_location)):
+            for item in content_list:
+                content = self.find(Location(item['_id']))
+                content.location = content.location._replace(org=dest_location.org,
+                                                             course=dest_location.course)
+                if content.thumbnail_location is not None:
+                    content.thumbnail_location = content.thumbnail_location._replace(
+                        org=dest_location.org, course=dest_location.course)
+                self.save(content)
+
+    def set_thumbnail_location(self, location, thumbnail_location):
+        """
+        Record thumbnail_location as the thumbnail of the asset at location
+        """
+        raise NotImplementedError
+
     def generate_thumbnail(self, content):
         thumbnail_content = None
         # use a naming convention to associate originals with the thumbnail
@@ -1,5 +1,6 @@
 from bson.son import SON
-from pymongo import Connection
+from datetime import datetime, timedelta
+from pymongo import Connection, DESCENDING
 import gridfs
 from gridfs.errors import NoFile
 
@@ -13,6 +14,32 @@ from xmodule.exceptions import NotFoundError
 from fs.osfs import OSFS
 import os
 
+# fields of fs.files needed to list an asset
+ASSET_LISTING_FIELDS = ('_id', 'displayname', 'uploadDate', 'thumbnail_location', 'contentType', 'length')
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _asset_cursor(item):
+    """
+    The position just after item in a listing, as a string: its upload time
+    in milliseconds and its name
+    """
+    delta = item['uploadDate'].replace(tzinfo=None) - _EPOCH
+    millis = (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+    return u'{0}:{1}'.format(millis, item['_id']['name'])
+
+
+def _parse_asset_cursor(cursor):
+    """
+    Returns the (upload time, name) encoded in cursor by _asset_cursor
+    """
+    millis, _, name = cursor.partition(':')
+    try:
+        return _EPOCH + timedelta(milliseconds=int(millis)), name
+    except ValueError:
+        raise ValueError("Invalid asset cursor {0!r}".format(cursor))
+
 
 class MongoContentStore(ContentStore):
     def __init__(self, host, db, port=27017, user=None, password=None, **kwargs):
@@ -24,6 +51,11 @@ class MongoContentStore(ContentStore):
 
         self.fs = gridfs.GridFS(_db)
         self.fs_files = _db["fs.files"]   # the underlying collection GridFS uses
+        self.fs_chunks = _db["fs.chunks"]
+
+        # serves get_assets_page: the assets of a course, newest first
+        self.fs_files.ensure_index([('_id.org', 1), ('_id.course', 1), ('_id.category', 1),
+                                    ('uploadDate', DESCENDING), ('_id.name', DESCENDING)])
 
     def save(self, content):
         id = content.get_id()
@@ -35,10 +67,65 @@ class MongoContentStore(ContentStore):
                               displayname=content.name, thumbnail_location=content.thumbnail_location,
                               import_path=content.import_path) as fp:
 
+            # GridFS reads file-like data in chunks, so large files needn't be
+            # held in memory
             fp.write(content.data)
 
         return content
 
+    def get_asset_checksums(self, location):
+        """
+        Returns {asset name: (md5, import_path)} for the assets (not thumbnails)
+        of the course of location, to tell which assets need re-uploading
+        """
+        course_filter = Location(XASSET_LOCATION_TAG, category="asset",
+                                 course=location.course, org=location.org)
+        items = self.fs_files.find(location_to_query(course_filter), {'_id': True, 'md5': True, 'import_path': True})
+        return dict((item['_id']['name'], (item.get('md5'), item.get('import_path'))) for item in items)
+
+    def copy_all_for_course(self, source_location, dest_location, chunk_batch_size=16):
+        """
+        Copy all the assets and thumbnails of the course of source_location to
+        the course of dest_location.
+
+        The GridFS documents are copied as they are, with their ids (and
+        thumbnail pointers) rewritten, so files are never reassembled or
+        re-hashed.  Chunks are copied chunk_batch_size at a time, and each
+        file's entry is written after its chunks, so a copy that fails
+        part way never leaves a file with missing data.
+        """
+        query = {'_id.tag': XASSET_LOCATION_TAG, '_id.org': source_location.org,
+                 '_id.course': source_location.course}
+        for file_doc in self.fs_files.find(query):
+            source_id = file_doc['_id']
+            location = Location(source_id)._replace(org=dest_location.org, course=dest_location.course)
+            dest_id = StaticContent.get_id_from_location(location)
+            self.delete(dest_id)
+
+            batch = []
+            for chunk in self.fs_chunks.find({'files_id': source_id}, {'_id': False}):
+                chunk['files_id'] = dest_id
+                batch.append(chunk)
+                if len(batch) >= chunk_batch_size:
+                    self.fs_chunks.insert(batch, safe=True)
+                    batch = []
+            if batch:
+                self.fs_chunks.insert(batch, safe=True)
+
+            file_doc['_id'] = dest_id
+            file_doc['filename'] = StaticContent.get_url_path_from_location(location)
+            if file_doc.get('thumbnail_location'):
+                file_doc['thumbnail_location'] = Location(file_doc['thumbnail_location'])._replace(
+                    org=dest_location.org, course=dest_location.course)
+            self.fs_files.insert(file_doc, safe=True)
+
+    def set_thumbnail_location(self, location, thumbnail_location):
+        """
+        Record thumbnail_location as the thumbnail of the asset at location
+        """
+        self.fs_files.update({'_id': StaticContent.get_id_from_location(location)},
+                             {'$set': {'thumbnail_location': thumbnail_location}})
+
     def delete(self, id):
         if self.fs.exists({"_id": id}):
             self.fs.delete(id)
@@ -55,25 +142,76 @@ class MongoContentStore(ContentStore):
             raise NotFoundError()
 
     def export(self, location, output_directory):
-        content = self.find(location)
-
-        if content.import_path is not None:
-            output_directory = output_directory + '/' + os.path.dirname(content.import_path)
-
         if not os.path.exists(output_directory):
             os.makedirs(output_directory)
+        self.export_to_fs(location, OSFS(output_directory))
 
-        disk_fs = OSFS(output_directory)
-
-        with disk_fs.open(content.name, 'wb') as asset_file:
-            asset_file.write(content.data)
+    def export_to_fs(self, location, output_fs):
+        """
+        Write the asset at location into output_fs (at its import path, if it
+        has one), copying it out of GridFS in chunks
+        """
+        id = StaticContent.get_id_from_location(location)
+        try:
+            with self.fs.get(id) as fp:
+                import_path = getattr(fp, 'import_path', None)
+                filepath = fp.displayname
+                if import_path is not None:
+                    dirname = os.path.dirname(import_path)
+                    if dirname:
+                        output_fs.makedir(dirname, recursive=True, allow_recreate=True)
+                        filepath = dirname + '/' + filepath
+                output_fs.setcontents(filepath, fp)
+        except NoFile:
+            raise NotFoundError()
 
     def export_all_for_course(self, course_location, output_directory):
+        if not os.path.exists(output_directory):
+            os.makedirs(output_directory)
+        self.export_all_for_course_to_fs(course_location, OSFS(output_directory))
+
+    def export_all_for_course_to_fs(self, course_location, output_fs):
         assets = self.get_all_content_for_course(course_location)
 
         for asset in assets:
             asset_location = Location(asset['_id'])
-            self.export(asset_location, output_directory)
+            self.export_to_fs(asset_location, output_fs)
+
+    def get_assets_page(self, location, page_size=50, after=None, get_thumbnails=False):
+        """
+        Returns (assets, next_cursor): up to page_size of the assets (or
+        thumbnails) of the course of location, newest first, in the format of
+        get_all_content_for_course but with only ASSET_LISTING_FIELDS.
+
+        after is the next_cursor returned for the previous page, or None for
+        the first page.  next_cursor is None on the last page.
+
+        The query walks the (org, course, category, uploadDate, name) index
+        from the cursor onwards, so a page costs the same however many assets
+        the course has and however far into the listing it is.
+        """
+        query = {'_id.org': location.org, '_id.course': location.course,
+                 '_id.category': 'thumbnail' if get_thumbnails else 'asset'}
+        after_name = None
+        if after is not None:
+            after_date, after_name = _parse_asset_cursor(after)
+            # uploadDate may be shared, so start at the cursor's upload time
+            # and skip the assets at that time that were already listed
+            query['uploadDate'] = {'$lte': after_date}
+
+        items = self.fs_files.find(query, dict.fromkeys(ASSET_LISTING_FIELDS, True)).sort(
+            [('uploadDate', DESCENDING), ('_id.name', DESCENDING)]).batch_size(page_size + 1)
+
+        assets = []
+        for item in items:
+            if after_name is not None:
+                if item['uploadDate'].replace(tzinfo=None) == after_date and item['_id']['name'] >= after_name:
+                    continue
+                after_name = None
+            if len(assets) == page_size:
+                return assets, _asset_cursor(assets[-1])
+            assets.append(item)
+        return assets, None
 
     def get_all_content_thumbnails_for_course(self, location):
         return self._get_all_content_for_course(location, get_thumbnails=True)
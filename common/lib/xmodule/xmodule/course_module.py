@@ -611,6 +611,68 @@ class CourseDescriptor(CourseFields, SequenceDescriptor):
         return {'graded_sections': graded_sections,
                 'all_descriptors': all_descriptors, }
 
+    def grading_context_structure(self):
+        """
+        Returns the grading_context for this course reduced to plain data, suitable
+        for caching: the same shape as grading_context, but with every descriptor
+        replaced by its location url.
+
+        {'graded_sections': {section_format: [{'section_location': url,
+                                               'xmodule_locations': [url, ...]}, ...]},
+         'all_locations': [url, ...]}
+        """
+        grading_context = self.grading_context
+        graded_sections = {}
+        for section_format, sections in grading_context['graded_sections'].iteritems():
+            graded_sections[section_format] = [
+                {
+                    'section_location': section['section_descriptor'].location.url(),
+                    'xmodule_locations': [descriptor.location.url() for descriptor in section['xmoduledescriptors']],
+                }
+                for section in sections
+            ]
+
+        return {'graded_sections': graded_sections,
+                'all_locations': [descriptor.location.url() for descriptor in grading_context['all_descriptors']], }
+
+    def load_grading_context(self, structure):
+        """
+        Rebuild grading_context from the output of grading_context_structure,
+        loading each descriptor by location through this course's system rather
+        than walking the course tree, and use it as this course's grading_context.
+
+        If this descriptor already has a grading_context, that is returned as-is.
+        """
+        if hasattr(self, '_lazy_grading_context'):
+            return self._lazy_grading_context
+
+        # fetch them all up front, rather than one at a time in load_item
+        self.system.prefetch_items(structure['all_locations'])
+
+        descriptors = {}
+
+        def load(url):
+            if url not in descriptors:
+                descriptors[url] = self.system.load_item(url)
+            return descriptors[url]
+
+        graded_sections = {}
+        for section_format, sections in structure['graded_sections'].iteritems():
+            graded_sections[section_format] = [
+                {
+                    'section_descriptor': load(section['section_location']),
+                    'xmoduledescriptors': [load(url) for url in section['xmodule_locations']],
+                }
+                for section in sections
+            ]
+
+        grading_context = {'graded_sections': graded_sections,
+                           'all_descriptors': [load(url) for url in structure['all_locations']], }
+
+        # Store it where the grading_context lazyproperty looks for it
+        self._lazy_grading_context = grading_context
+        return grading_context
+
     @staticmethod
     def make_id(org, course, url_name):
         return '/'.join([org, course, url_name])
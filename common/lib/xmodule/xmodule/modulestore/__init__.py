@@ -452,6 +452,50 @@ class ModuleStoreBase(ModuleStore):
                 return c
         return None
 
+    def get_parents_with_children(self, locations, course_id):
+        '''
+        Returns {url of location: [(parent location, urls of the parent's
+        children)]} for each of locations, to tell where in its parents each
+        one is.
+
+        Default impl--get_parent_locations and get_item for each location.
+        '''
+        parents = {}
+        for location in locations:
+            location = Location(location)
+            parents[location.url()] = [
+                (Location(parent_loc), self.get_item(parent_loc).children)
+                for parent_loc in self.get_parent_locations(location, course_id)
+            ]
+        return parents
+
+    def get_course_content_version(self, location):
+        """
+        Returns an opaque string that changes whenever the structure of the course
+        containing location changes, so that data derived from the course tree
+        can be cached against it.
+
+        Default impl--returns None, meaning that versions aren't tracked by this
+        modulestore and derived data shouldn't be cached across requests.
+        """
+        return None
+
+    def bulk_write_items(self, items):
+        """
+        Write many items at once, e.g. when importing a course.
+
+        items: iterable of (location, data, children, metadata) tuples.  children
+            is only written if it is non-empty.
+
+        Default impl--writes each item with update_item, update_children and
+        update_metadata.
+        """
+        for location, data, children, metadata in items:
+            self.update_item(location, data)
+            if children:
+                self.update_children(location, children)
+            self.update_metadata(location, metadata)
+
 
 def namedtuple_to_son(namedtuple, prefix=''):
     """
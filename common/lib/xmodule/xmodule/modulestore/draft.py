@@ -32,6 +32,25 @@ def wrap_draft(item):
     return item
 
 
+def prefer_drafts(items):
+    """
+    Returns the module documents in items, which may include both the draft
+    and the published version of a module, without the published versions
+    of those that have a draft
+    """
+    items = list(items)
+    drafted = set(
+        as_published(item['_id'])
+        for item in items
+        if item['_id'].get('revision') == DRAFT
+    )
+    return [
+        item
+        for item in items
+        if item['_id'].get('revision') == DRAFT or as_published(item['_id']) not in drafted
+    ]
+
+
 class DraftModuleStore(ModuleStoreBase):
     """
     This mixin modifies a modulestore to give it draft semantics.
@@ -41,8 +60,32 @@ class DraftModuleStore(ModuleStoreBase):
 
     This module also includes functionality to promote DRAFT modules (and optionally
     their children) to published modules.
+
+    Reads fetch the draft and the published revisions together, in one query,
+    and keep the draft where there is one.  This relies on the collection of
+    MongoModuleStore.
     """
 
+    def _draft_aware_query(self, location, wildcard=True):
+        """
+        A query for both the draft and the published revisions of the items
+        matching location, or only the drafts if location is a draft.
+
+        If `wildcard` is True, fields of location that are None match
+        any value.
+        """
+        location = Location(location)
+        query = namedtuple_to_son(as_published(location), prefix='_id.')
+        if wildcard:
+            for key, value in query.items():
+                if value is None:
+                    del query[key]
+        if location.revision == DRAFT:
+            query['_id.revision'] = DRAFT
+        else:
+            query['_id.revision'] = {'$in': [None, DRAFT]}
+        return query
+
     def get_item(self, location, depth=0):
         """
         Returns an XModuleDescriptor instance for the item at location.
@@ -63,21 +106,19 @@ class DraftModuleStore(ModuleStoreBase):
             get_children() to cache. None indicates to cache all descendents
         """
 
-        try:
-            return wrap_draft(super(DraftModuleStore, self).get_item(as_draft(location), depth=depth))
-        except ItemNotFoundError:
-            return wrap_draft(super(DraftModuleStore, self).get_item(location, depth=depth))
+        location = Location.ensure_fully_specified(location)
+        items = prefer_drafts(self.collection.find(self._draft_aware_query(location, wildcard=False)))
+        if not items:
+            raise ItemNotFoundError(location)
+        return wrap_draft(self._load_items(items, depth)[0])
 
     def get_instance(self, course_id, location, depth=0):
         """
         Get an instance of this location, with policy for course_id applied.
         TODO (vshnayder): this may want to live outside the modulestore eventually
         """
-
-        try:
-            return wrap_draft(super(DraftModuleStore, self).get_instance(course_id, as_draft(location), depth=depth))
-        except ItemNotFoundError:
-            return wrap_draft(super(DraftModuleStore, self).get_instance(course_id, location, depth=depth))
+        # the mongo store doesn't apply course policy, so this is just get_item
+        return self.get_item(location, depth=depth)
 
     def get_items(self, location, course_id=None, depth=0):
         """
@@ -92,19 +133,15 @@ class DraftModuleStore(ModuleStoreBase):
             in the request. The depth is counted in the number of calls to
             get_children() to cache. None indicates to cache all descendents
         """
-        draft_loc = as_draft(location)
+        items = prefer_drafts(self.collection.find(self._draft_aware_query(location)))
+        return [wrap_draft(item) for item in self._load_items(items, depth)]
 
-        draft_items = super(DraftModuleStore, self).get_items(draft_loc, course_id=course_id, depth=depth)
-        items = super(DraftModuleStore, self).get_items(location, course_id=course_id, depth=depth)
-
-        draft_locs_found = set(item.location._replace(revision=None) for item in draft_items)
-        non_draft_items = [
-            item
-            for item in items
-            if (item.location.revision != DRAFT
-                and item.location._replace(revision=None) not in draft_locs_found)
-        ]
-        return [wrap_draft(item) for item in draft_items + non_draft_items]
+    def get_course_outline(self, location, depth=3):
+        """
+        The course outline (see MongoModuleStore.get_course_outline), showing
+        drafts in place of their published versions
+        """
+        return super(DraftModuleStore, self).get_course_outline(location, depth, include_drafts=True)
 
     def clone_item(self, source, location):
         """
@@ -166,6 +203,10 @@ class DraftModuleStore(ModuleStoreBase):
 
         return super(DraftModuleStore, self).update_metadata(draft_loc, metadata)
 
+    # drafts are written item by item, so that each is cloned from its
+    # published version as needed
+    bulk_write_items = ModuleStoreBase.bulk_write_items
+
     def delete_item(self, location, delete_all_versions=False):
         """
         Delete an item from this modulestore
@@ -207,34 +248,20 @@ class DraftModuleStore(ModuleStoreBase):
         super(DraftModuleStore, self).delete_item(location)
 
     def _query_children_for_cache_children(self, items):
-        # first get non-draft in a round-trip
-        queried_children = []
-        to_process_non_drafts = super(DraftModuleStore, self)._query_children_for_cache_children(items)
-
-        to_process_dict = {}
-        for non_draft in to_process_non_drafts:
-            to_process_dict[Location(non_draft["_id"])] = non_draft
-
-        # now query all draft content in another round-trip
-        query = {
-            '_id': {'$in': [namedtuple_to_son(as_draft(Location(item))) for item in items]}
-        }
-        to_process_drafts = list(self.collection.find(query))
-
-        # now we have to go through all drafts and replace the non-draft
-        # with the draft. This is because the semantics of the DraftStore is to
-        # always return the draft - if available
-        for draft in to_process_drafts:
-            draft_loc = Location(draft["_id"])
-            draft_as_non_draft_loc = draft_loc._replace(revision=None)
-
-            # does non-draft exist in the collection
-            # if so, replace it
-            if draft_as_non_draft_loc in to_process_dict:
-                to_process_dict[draft_as_non_draft_loc] = draft
-
-        # convert the dict - which is used for look ups - back into a list
-        for key, value in to_process_dict.iteritems():
-            queried_children.append(value)
-
-        return queried_children
+        # the draft and published versions of all the children in one
+        # round-trip.  The semantics of the DraftStore is to always return
+        # the draft - if available
+        ids = []
+        for item in items:
+            ids.append(namedtuple_to_son(as_published(item)))
+            ids.append(namedtuple_to_son(as_draft(item)))
+        return prefer_drafts(self.collection.find({'_id': {'$in': ids}}))
+
+    def _cache_children(self, items, depth=0):
+        data = super(DraftModuleStore, self)._cache_children(items, depth)
+        # children are looked up by their published locations, so drafts
+        # have to be found under those too
+        for location, item in data.items():
+            if location.revision == DRAFT:
+                data[as_published(location)] = item
+        return data
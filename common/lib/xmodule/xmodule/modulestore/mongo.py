@@ -4,6 +4,7 @@ import logging
 import copy
 
 from collections import namedtuple
+from datetime import datetime
 from fs.osfs import OSFS
 from itertools import repeat
 from path import path
@@ -17,9 +18,10 @@ from xmodule.x_module import XModuleDescriptor
 from xmodule.error_module import ErrorDescriptor
 from xblock.runtime import DbModel, KeyValueStore, InvalidScopeError
 from xblock.core import Scope
+from xmodule.fields import Date
 
 from . import ModuleStoreBase, Location, namedtuple_to_son
-from .draft import DraftModuleStore
+from .draft import DraftModuleStore, DRAFT, prefer_drafts
 from .exceptions import (ItemNotFoundError,
                          DuplicateItemError)
 from .inheritance import own_metadata, INHERITABLE_METADATA, inherit_metadata
@@ -106,6 +108,53 @@ class MongoKeyValueStore(KeyValueStore):
 MongoUsage = namedtuple('MongoUsage', 'id, def_id')
 
 
+class OutlineNode(object):
+    """
+    What the course outline shows of a module: a plain object that is much
+    cheaper to build than the module's descriptor.  start and due are
+    time structs, inherited from the parent as in the descriptor.
+
+    has_published: whether a published version of a draft exists
+    """
+    def __init__(self, location, display_name=None, start=None, due=None, format=None,
+                 is_draft=False, has_published=True):
+        self.location = location
+        self.display_name = display_name
+        self.start = start
+        self.due = due
+        self.format = format
+        self.is_draft = is_draft
+        self.has_published = has_published
+        self.children = []
+
+    def __repr__(self):
+        return 'OutlineNode({0!r})'.format(self.location.url())
+
+    @property
+    def category(self):
+        return self.location.category
+
+    @property
+    def url_name(self):
+        return self.location.name
+
+    @property
+    def display_name_with_default(self):
+        name = self.display_name
+        if name is None:
+            name = self.url_name.replace('_', ' ')
+        return name
+
+    def get_children(self):
+        return self.children
+
+
+# the only parts of a module's metadata that the outline reads
+OUTLINE_METADATA = ('display_name', 'start', 'due', 'format')
+
+_date_field = Date()
+
+
 class CachingDescriptorSystem(MakoDescriptorSystem):
     """
     A system that has a cache of module json that it will use to load modules
@@ -141,6 +190,24 @@ class CachingDescriptorSystem(MakoDescriptorSystem):
         self.course_id = None
         self.cached_metadata = cached_metadata
 
+    def prefetch_items(self, locations):
+        """
+        Add the json of any of locations not already in module_data to it, with
+        a single query, so that load_item doesn't go to the DB for each of them
+        """
+        missing = [location for location in set(Location(location) for location in locations)
+                   if location not in self.module_data]
+        if not missing:
+            return
+
+        self.module_data.update(self.modulestore._cache_children(
+            self.modulestore._query_children_for_cache_children(missing)
+        ))
+        if not self.cached_metadata:
+            # e.g. a course loaded at depth 0 is given no inheritance tree,
+            # but the items loaded through it need one
+            self.cached_metadata = self.modulestore.get_cached_metadata_inheritance_tree(missing[0])
+
     def load_item(self, location):
         """
         Return an XModule instance for the specified location
@@ -175,6 +242,11 @@ class CachingDescriptorSystem(MakoDescriptorSystem):
 
                 model_data = DbModel(kvs, class_, None, MongoUsage(self.course_id, location))
                 module = class_(self, location, model_data)
+                # when the item was last written, for caches of what is rendered from it
+                module.edited_on = json_data.get('edited_on')
+                if json_data['location'].get('revision') == DRAFT:
+                    # a draft cached for its published location (see DraftModuleStore)
+                    module.is_draft = True
                 if self.cached_metadata is not None:
                     # parent container pointers don't differentiate between draft and non-draft
                     # so when we do the lookup, we should do so with a non-draft location
@@ -214,6 +286,14 @@ def location_to_query(location, wildcard=True):
 metadata_cache_key = attrgetter('org', 'course')
 
 
+def content_version_cache_key(location):
+    """
+    Key under which the content version for the course containing location is
+    kept in the metadata_inheritance_cache_subsystem
+    """
+    return ('content_version', location.org, location.course)
+
+
 class MongoModuleStore(ModuleStoreBase):
     """
     A Mongodb backed ModuleStore
@@ -380,6 +460,36 @@ class MongoModuleStore(ModuleStoreBase):
         pseudo_course_id = '/'.join([location.org, location.course])
         if pseudo_course_id not in self.ignore_write_events_on_courses:
             self.get_cached_metadata_inheritance_tree(location, force_refresh=True)
+            self._bump_course_content_version(location)
+
+    def get_course_content_version(self, location):
+        """
+        Returns the content version of the org/course combination for location.
+        The version changes every time the metadata inheritance tree is refreshed,
+        i.e. on every structural write to the course.
+
+        Versions are kept in the metadata_inheritance_cache_subsystem; without
+        one, returns None.
+        """
+        if self.metadata_inheritance_cache_subsystem is None:
+            return None
+
+        key = content_version_cache_key(location)
+        version = self.metadata_inheritance_cache_subsystem.get(key)
+        if version is None:
+            version = self._bump_course_content_version(location)
+        return version
+
+    def _bump_course_content_version(self, location):
+        """
+        Record a new content version for the org/course combination for location
+        """
+        if self.metadata_inheritance_cache_subsystem is None:
+            return None
+
+        version = uuid4().hex
+        self.metadata_inheritance_cache_subsystem.set(content_version_cache_key(location), version)
+        return version
 
     def _clean_item_data(self, item):
         """
@@ -566,6 +676,7 @@ class MongoModuleStore(ModuleStoreBase):
                     source_item['metadata'][key] = uuid4().hex
 
             source_item['_id'] = Location(location).dict()
+            source_item['edited_on'] = datetime.utcnow()
             self.collection.insert(
                 source_item,
                 # Must include this to avoid the django debug toolbar (which defines the deprecated "safe=False")
@@ -639,7 +750,7 @@ class MongoModuleStore(ModuleStoreBase):
         # atomic update syntax
         result = self.collection.update(
             {'_id': Location(location).dict()},
-            {'$set': update},
+            {'$set': dict(update, edited_on=datetime.utcnow())},
             multi=False,
             upsert=True,
             # Must include this to avoid the django debug toolbar (which defines the deprecated "safe=False")
@@ -649,6 +760,74 @@ class MongoModuleStore(ModuleStoreBase):
         if result['n'] == 0:
             raise ItemNotFoundError(location)
 
+    def bulk_write_items(self, items, batch_size=500):
+        """
+        Write many items at once, e.g. when importing a course.
+
+        items: iterable of (location, data, children, metadata) tuples.  children
+            is only written if it is non-empty.
+
+        Items are written in batches of batch_size: one query finds which of
+        them already exist, new items go in with a single batch insert, and
+        existing ones are updated in place without waiting for acknowledgement.
+        One query then counts the items of the batch carrying its edited_on
+        time, and raises if any item wasn't written.
+
+        Unlike the update_* methods, this doesn't refresh the metadata inheritance
+        tree or fire the modulestore update signal per item; that's done once
+        per course at the end.
+        """
+        courses = {}
+        batch = []
+        for item in items:
+            location = Location(item[0])
+            courses[(location.org, location.course)] = location
+            batch.append((location,) + tuple(item[1:]))
+            if len(batch) >= batch_size:
+                self._bulk_write_batch(batch)
+                batch = []
+        if batch:
+            self._bulk_write_batch(batch)
+
+        for location in courses.itervalues():
+            self.refresh_cached_metadata_inheritance_tree(location)
+            self.fire_updated_modulestore_signal(get_course_id_no_run(location), location)
+
+    def _bulk_write_batch(self, batch):
+        """
+        Write one batch of (location, data, children, metadata) for bulk_write_items
+        """
+        ids = [location.dict() for location, data, children, metadata in batch]
+        urls = set(location.url() for location, data, children, metadata in batch)
+        existing = set(
+            Location(item['_id']).url()
+            for item in self.collection.find({'_id': {'$in': ids}}, {'_id': True})
+        )
+
+        new_items = []
+        edited_on = datetime.utcnow()
+        for location, data, children, metadata in batch:
+            update = {'definition.data': data, 'metadata': metadata, 'edited_on': edited_on}
+            if children:
+                update['definition.children'] = children
+            if location.url() in existing:
+                # unacknowledged: the query below checks that the whole batch was written
+                self.collection.update({'_id': location.dict()}, {'$set': update}, multi=False, safe=False)
+            else:
+                definition = {'data': data}
+                if children:
+                    definition['children'] = children
+                new_items.append({'_id': location.dict(), 'definition': definition, 'metadata': metadata,
+                                  'edited_on': edited_on})
+
+        if new_items:
+            self.collection.insert(new_items, safe=True)
+
+        # the connection reads on the socket it wrote on, so this sees the updates above
+        written = self.collection.find({'_id': {'$in': ids}, 'edited_on': edited_on}).count()
+        if written != len(urls):
+            raise Exception('Only {0} of {1} items were written to the modulestore'.format(written, len(urls)))
+
     def update_item(self, location, data):
         """
         Set the data in the item specified by the location to
@@ -735,6 +914,91 @@ class MongoModuleStore(ModuleStoreBase):
                                      {'_id': True})
         return [i['_id'] for i in items]
 
+    def get_parents_with_children(self, locations, course_id):
+        '''
+        Returns {url of location: [(parent location, urls of the parent's
+        children)]} for each of locations, from a single query
+        '''
+        parents = dict((Location(location).url(), []) for location in locations)
+        items = self.collection.find({'definition.children': {'$in': parents.keys()}},
+                                     {'_id': True, 'definition.children': True})
+        for item in items:
+            children = item['definition']['children']
+            for url in set(children):
+                if url in parents:
+                    parents[url].append((Location(item['_id']), children))
+        return parents
+
+    def get_course_outline(self, location, depth=3, include_drafts=False):
+        """
+        Returns an OutlineNode for the course at location, with its
+        descendants to depth (3: sections, subsections and units).
+
+        This makes one query per level, which fetches only the location,
+        children and OUTLINE_METADATA of each module, and loads no descriptors.
+
+        include_drafts: use the draft of each module that has one
+        """
+        fields = {'_id': True, 'definition.children': True}
+        for attr in OUTLINE_METADATA:
+            fields['metadata.' + attr] = True
+
+        def fetch(urls):
+            """
+            {published url: (document, has_published)} for the modules at urls
+            """
+            ids = []
+            for url in urls:
+                ids.append(namedtuple_to_son(Location(url)._replace(revision=None)))
+                if include_drafts:
+                    ids.append(namedtuple_to_son(Location(url)._replace(revision=DRAFT)))
+            docs = list(self.collection.find({'_id': {'$in': ids}}, fields))
+            published = set(Location(doc['_id']).url() for doc in docs if doc['_id'].get('revision') is None)
+            fetched = {}
+            for doc in prefer_drafts(docs):
+                url = Location(doc['_id'])._replace(revision=None).url()
+                fetched[url] = (doc, url in published)
+            return fetched
+
+        def outline_node(doc, has_published, parent=None):
+            location = Location(doc['_id'])
+            metadata = doc.get('metadata', {})
+            node = OutlineNode(
+                location._replace(revision=None),
+                display_name=metadata.get('display_name'),
+                format=metadata.get('format'),
+                is_draft=location.revision == DRAFT,
+                has_published=has_published,
+            )
+            for attr in ('start', 'due'):
+                if attr in metadata:
+                    setattr(node, attr, _date_field.from_json(metadata[attr]))
+                elif parent is not None:
+                    setattr(node, attr, getattr(parent, attr))
+            return node
+
+        root_url = Location(location)._replace(revision=None).url()
+        fetched = fetch([root_url])
+        if root_url not in fetched:
+            raise ItemNotFoundError(location)
+        root = outline_node(*fetched[root_url])
+
+        level = [(root, fetched[root_url][0])]
+        while level and depth > 0:
+            depth -= 1
+            children = [url for node, doc in level for url in doc.get('definition', {}).get('children', [])]
+            fetched = fetch(children) if children else {}
+            next_level = []
+            for parent, doc in level:
+                for url in doc.get('definition', {}).get('children', []):
+                    if url in fetched:
+                        child_doc, has_published = fetched[url]
+                        child = outline_node(child_doc, has_published, parent)
+                        parent.children.append(child)
+                        next_level.append((child, child_doc))
+            level = next_level
+        return root
+
     def get_errored_courses(self):
         """
         This function doesn't make sense for the mongo modulestore, as courses
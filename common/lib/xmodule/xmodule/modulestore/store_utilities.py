@@ -1,6 +1,35 @@
 from xmodule.contentstore.content import StaticContent
 from xmodule.modulestore import Location
-from xmodule.modulestore.mongo import MongoModuleStore
+from xmodule.modulestore.mongo import MongoModuleStore, location_to_query
+
+
+def _cloned_items(modulestore, source_location, dest_location):
+    """
+    Yields (location, data, children, metadata) for a copy in the course of
+    dest_location of each (published) module of the course of source_location,
+    read straight from the modulestore's collection.  Children and asset urls
+    in the data are repointed at the destination course.
+    """
+    def relocate(location):
+        location = location._replace(tag=dest_location.tag, org=dest_location.org,
+                                     course=dest_location.course)
+        if location.category == 'course':
+            # the course module also takes the name of the destination course
+            location = location._replace(name=dest_location.name)
+        return location
+
+    source_assets = StaticContent.get_base_url_path_for_course_assets(source_location) + '/'
+    dest_assets = StaticContent.get_base_url_path_for_course_assets(dest_location) + '/'
+
+    query = location_to_query(Location([source_location.tag, source_location.org,
+                                        source_location.course, None, None, None]))
+    for item in modulestore.collection.find(query, {'_id': True, 'definition': True, 'metadata': True}):
+        definition = item.get('definition', {})
+        data = definition.get('data', {})
+        if isinstance(data, basestring):
+            data = data.replace(source_assets, dest_assets)
+        children = [relocate(Location(child)).url() for child in definition.get('children', [])]
+        yield (relocate(Location(item['_id'])), data, children, item.get('metadata', {}))
 
 
 def clone_course(modulestore, contentstore, source_location, dest_location, delete_original=False):
@@ -32,72 +61,12 @@ def clone_course(modulestore, contentstore, source_location, dest_location, dele
     if not modulestore.has_item(source_location):
         raise Exception("Cannot find a course at {0}. Aborting".format(source_location))
 
-    # Get all modules under this namespace which is (tag, org, course) tuple
+    # copy the module documents as they are stored, rewriting their locations,
+    # in batches; the inheritance tree is recomputed once, at the end
+    modulestore.bulk_write_items(_cloned_items(modulestore, source_location, dest_location))
 
-    modules = modulestore.get_items([source_location.tag, source_location.org, source_location.course, None, None, None])
-
-    for module in modules:
-        original_loc = Location(module.location)
-
-        if original_loc.category != 'course':
-            module.location = module.location._replace(tag=dest_location.tag, org=dest_location.org,
-                                                       course=dest_location.course)
-        else:
-            # on the course module we also have to update the module name
-            module.location = module.location._replace(tag=dest_location.tag, org=dest_location.org,
-                                                       course=dest_location.course, name=dest_location.name)
-
-        print "Cloning module {0} to {1}....".format(original_loc, module.location)
-
-        modulestore.update_item(module.location, module._model_data._kvs._data)
-
-        # repoint children
-        if module.has_children:
-            new_children = []
-            for child_loc_url in module.children:
-                child_loc = Location(child_loc_url)
-                child_loc = child_loc._replace(
-                    tag=dest_location.tag,
-                    org=dest_location.org,
-                    course=dest_location.course
-                )
-                new_children.append(child_loc.url())
-
-            modulestore.update_children(module.location, new_children)
-
-        # save metadata
-        modulestore.update_metadata(module.location, module._model_data._kvs._metadata)
-
-    # now iterate through all of the assets and clone them
-    # first the thumbnails
-    thumbs = contentstore.get_all_content_thumbnails_for_course(source_location)
-    for thumb in thumbs:
-        thumb_loc = Location(thumb["_id"])
-        content = contentstore.find(thumb_loc)
-        content.location = content.location._replace(org=dest_location.org,
-                                                     course=dest_location.course)
-
-        print "Cloning thumbnail {0} to {1}".format(thumb_loc, content.location)
-
-        contentstore.save(content)
-
-    # now iterate through all of the assets, also updating the thumbnail pointer
-
-    assets = contentstore.get_all_content_for_course(source_location)
-    for asset in assets:
-        asset_loc = Location(asset["_id"])
-        content = contentstore.find(asset_loc)
-        content.location = content.location._replace(org=dest_location.org,
-                                                     course=dest_location.course)
-
-        # be sure to update the pointer to the thumbnail
-        if content.thumbnail_location is not None:
-            content.thumbnail_location = content.thumbnail_location._replace(org=dest_location.org,
-                                                                             course=dest_location.course)
-
-        print "Cloning asset {0} to {1}".format(asset_loc, content.location)
-
-        contentstore.save(content)
+    # then the assets and their thumbnails
+    contentstore.copy_all_for_course(source_location, dest_location)
 
     return True
 
@@ -0,0 +1,238 @@
+"""
+Exporting a course straight into a gzipped tar stream.
+
+export_to_fs writes the course into a TarWriteFS, which adds each file to a
+streaming ('w|gz') tarfile as soon as it is closed.  The compressed output
+is handed over in chunks through a bounded queue, so memory use does not
+grow with the size of the course and nothing is written to disk.
+"""
+import logging
+import posixpath
+import tarfile
+import threading
+import time
+import Queue
+from cStringIO import StringIO
+
+from .xml_exporter import export_to_fs
+
+log = logging.getLogger(__name__)
+
+# size of the chunks of compressed output handed to the reader
+CHUNK_SIZE = 64 * 1024
+
+# chunks the export may get ahead of the reader by
+MAX_PENDING_CHUNKS = 16
+
+# how often a blocked export checks whether the reader has gone away
+PUT_POLL_INTERVAL = 1.0
+
+
+class ExportCancelled(Exception):
+    """
+    The reader of a streamed export stopped reading
+    """
+    pass
+
+
+def _encode(name):
+    if isinstance(name, unicode):
+        return name.encode('utf-8')
+    return name
+
+
+class _TarMemberFile(object):
+    """
+    A file opened for writing in a TarWriteFS.  Its contents are added to
+    the archive when it is closed.
+    """
+    def __init__(self, tar_fs, path):
+        self.tar_fs = tar_fs
+        self.path = path
+        self.buffer = StringIO()
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.write(_encode(data))
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        size = self.buffer.tell()
+        self.buffer.seek(0)
+        self.tar_fs.add_file(self.path, self.buffer, size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TarWriteFS(object):
+    """
+    The write-only subset of the pyfilesystem interface that course export
+    uses (makedir, makeopendir, open and setcontents), adding everything
+    written to an open tarfile under prefix.
+    """
+    def __init__(self, tar, prefix='', _dirs=None):
+        self.tar = tar
+        self.prefix = prefix
+        # directories already in the archive, shared with sub-filesystems
+        self._dirs = set() if _dirs is None else _dirs
+
+    def _path(self, path):
+        return posixpath.normpath(posixpath.join(self.prefix, _encode(path).lstrip('/')))
+
+    def _add_dir(self, fullpath):
+        if fullpath in ('', '.') or fullpath in self._dirs:
+            return
+        self._add_dir(posixpath.dirname(fullpath))
+        info = tarfile.TarInfo(fullpath)
+        info.type = tarfile.DIRTYPE
+        info.mode = 0755
+        info.mtime = time.time()
+        self.tar.addfile(info)
+        self._dirs.add(fullpath)
+
+    def makedir(self, path, recursive=False, allow_recreate=False):
+        self._add_dir(self._path(path))
+
+    def makeopendir(self, path, recursive=False):
+        fullpath = self._path(path)
+        self._add_dir(fullpath)
+        return TarWriteFS(self.tar, fullpath, self._dirs)
+
+    def open(self, path, mode='r', **kwargs):
+        if 'w' not in mode:
+            raise ValueError("TarWriteFS can only open files for writing")
+        return _TarMemberFile(self, path)
+
+    def setcontents(self, path, data, chunk_size=64 * 1024):
+        """
+        Add a file with contents data, a string or a file-like object.  A
+        file-like object with a length attribute (such as a GridFS file) is
+        copied into the archive without being read into memory first.
+        """
+        if isinstance(data, basestring):
+            data = _encode(data)
+            self.add_file(path, StringIO(data), len(data))
+        elif getattr(data, 'length', None) is not None:
+            self.add_file(path, data, data.length)
+        else:
+            with self.open(path, 'wb') as member:
+                for chunk in iter(lambda: data.read(chunk_size), ''):
+                    member.write(chunk)
+
+    def add_file(self, path, fileobj, size):
+        """
+        Add size bytes read from fileobj to the archive at path
+        """
+        fullpath = self._path(path)
+        self._add_dir(posixpath.dirname(fullpath))
+        info = tarfile.TarInfo(fullpath)
+        info.size = size
+        info.mode = 0644
+        info.mtime = time.time()
+        self.tar.addfile(info, fileobj)
+
+
+class _QueueWriter(object):
+    """
+    A write-only file that passes what is written to it on to a queue in
+    chunks of at least chunk_size bytes
+    """
+    def __init__(self, queue, cancelled, chunk_size=CHUNK_SIZE):
+        self.queue = queue
+        self.cancelled = cancelled
+        self.chunk_size = chunk_size
+        self._pending = []
+        self._pending_size = 0
+
+    def write(self, data):
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        self.put(''.join(self._pending))
+        self._pending = []
+        self._pending_size = 0
+
+    def put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise ExportCancelled()
+            try:
+                self.queue.put(item, timeout=PUT_POLL_INTERVAL)
+                return
+            except Queue.Full:
+                pass
+
+
+_DONE = object()
+
+
+def write_course_tarball(modulestore, contentstore, course_location, course_dir, fileobj, draft_modulestore=None):
+    """
+    Write the course at course_location to fileobj as a .tar.gz, laid out
+    as export_to_xml would lay out root_dir/course_dir.  fileobj is only
+    written to, never seeked.
+    """
+    tar = tarfile.open(mode='w|gz', fileobj=fileobj)
+    export_fs = TarWriteFS(tar).makeopendir(course_dir)
+    export_to_fs(modulestore, contentstore, course_location, export_fs, draft_modulestore)
+    tar.close()
+
+
+def stream_course_tarball(modulestore, contentstore, course_location, course_dir,
+                          draft_modulestore=None, chunk_size=CHUNK_SIZE, max_pending=MAX_PENDING_CHUNKS):
+    """
+    Yields the course at course_location as a .tar.gz, laid out as
+    export_to_xml would lay out root_dir/course_dir, in chunks of about
+    chunk_size bytes.
+
+    The export runs in a separate thread, at most max_pending chunks ahead
+    of the caller.  If the caller stops iterating, the export is abandoned.
+    An exception raised by the export is re-raised by the generator.
+    """
+    chunks = Queue.Queue(max_pending)
+    cancelled = threading.Event()
+    writer = _QueueWriter(chunks, cancelled, chunk_size)
+
+    def produce():
+        try:
+            write_course_tarball(modulestore, contentstore, course_location, course_dir, writer, draft_modulestore)
+            writer.flush()
+            writer.put(_DONE)
+        except ExportCancelled:
+            log.info("Export of %s abandoned by the reader", course_location)
+        except Exception as err:
+            log.exception("Export of %s failed", course_location)
+            try:
+                writer.put(err)
+            except ExportCancelled:
+                pass
+
+    thread = threading.Thread(target=produce, name='course-export')
+    thread.daemon = True
+    thread.start()
+
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        cancelled.set()
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 import pymongo
 
 from mock import Mock
@@ -5,7 +7,8 @@ from nose.tools import assert_equals, assert_raises, assert_not_equals, with_set
 from pprint import pprint
 
 from xmodule.modulestore import Location
-from xmodule.modulestore.mongo import MongoModuleStore
+from xmodule.modulestore.exceptions import ItemNotFoundError
+from xmodule.modulestore.mongo import MongoModuleStore, DraftMongoModuleStore
 from xmodule.modulestore.xml_importer import import_from_xml
 from xmodule.templates import update_templates
 
@@ -113,3 +116,126 @@ class TestMongoModuleStore(object):
                 course.location.org == 'edx' and course.location.course == 'templates',
                 '{0} is a template course'.format(course)
             )
+
+    def test_reimport_updates_in_place(self):
+        '''Importing a course again updates the existing items rather than adding more'''
+        collection = self.connection[DB][COLLECTION]
+        query = {'_id.org': 'edX', '_id.course': 'toy'}
+        before = collection.find(query).count()
+        welcome = Location("i4x://edX/toy/video/Welcome")
+        stale_on = datetime(2000, 1, 1)
+        collection.update({'_id': welcome.dict()},
+                          {'$set': {'metadata.display_name': 'Stale', 'edited_on': stale_on}},
+                          safe=True)
+
+        import_from_xml(self.store, DATA_DIR, ['toy'])
+        assert_equals(collection.find(query).count(), before)
+        item = self.store._find_one(welcome)
+        assert_equals(item['metadata']['display_name'], 'Welcome')
+        assert_not_equals(item['edited_on'], stale_on)
+
+
+class TestDraftMongoModuleStore(object):
+    '''Draft-aware reads, on a copy of the toy course with one module drafted'''
+    COLLECTION = 'draft_modulestore'
+
+    @classmethod
+    def setupClass(cls):
+        cls.connection = pymongo.connection.Connection(HOST, PORT)
+        cls.connection[DB].drop_collection(cls.COLLECTION)
+        store = MongoModuleStore(HOST, DB, cls.COLLECTION, FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS)
+        import_from_xml(store, DATA_DIR, ['toy'])
+
+        cls.store = DraftMongoModuleStore(HOST, DB, cls.COLLECTION, FS_ROOT, RENDER_TEMPLATE,
+                                          default_class=DEFAULT_CLASS)
+        cls.drafted = Location('i4x://edX/toy/video/Welcome')
+        cls.store.update_metadata(cls.drafted, {'display_name': 'Draft Welcome'})
+
+    @classmethod
+    def teardownClass(cls):
+        cls.connection[DB].drop_collection(cls.COLLECTION)
+
+    def count_finds(self):
+        collection = self.store.collection
+        counter = Mock(wraps=collection.find)
+        collection.find = counter
+        return counter
+
+    def tearDown(self):
+        # undo count_finds
+        self.store.collection.__dict__.pop('find', None)
+
+    def test_get_item_prefers_draft(self):
+        finds = self.count_finds()
+        item = self.store.get_item(self.drafted)
+        assert_equals(finds.call_count, 1)
+        assert_equals(item.display_name, 'Draft Welcome')
+        assert_equals(item.location, self.drafted)
+        assert_equals(item.is_draft, True)
+
+    def test_get_item_published(self):
+        item = self.store.get_item(Location('i4x://edX/toy/video/Video_Resources'))
+        assert_false(item.is_draft)
+
+    def test_get_item_missing(self):
+        assert_raises(ItemNotFoundError, self.store.get_item, Location('i4x://edX/toy/video/Nonexistent'))
+
+    def test_get_items_merges(self):
+        finds = self.count_finds()
+        items = self.store.get_items(Location('i4x', 'edX', 'toy', 'video', None))
+        assert_equals(finds.call_count, 1)
+        by_url = dict((item.location.url(), item) for item in items)
+        assert_equals(len(by_url), len(items))
+        assert_equals(by_url[self.drafted.url()].display_name, 'Draft Welcome')
+
+    def test_children_use_draft(self):
+        chapter = self.store.get_item(Location('i4x://edX/toy/chapter/Overview'), depth=1)
+        finds = self.count_finds()
+        children = dict((child.location.url(), child) for child in chapter.get_children())
+        # all the children were prefetched
+        assert_equals(finds.call_count, 0)
+        welcome = children[self.drafted.url()]
+        assert_equals(welcome.display_name, 'Draft Welcome')
+        assert_equals(welcome.is_draft, True)
+
+    def test_course_outline(self):
+        course_location = Location('i4x://edX/toy/course/2012_Fall')
+        course = self.store.get_item(course_location, depth=3)
+        finds = self.count_finds()
+        outline = self.store.get_course_outline(course_location)
+        # one query per level
+        assert_equals(finds.call_count, 4)
+
+        def check(node, descriptor):
+            assert_equals(node.location, descriptor.location)
+            assert_equals(node.display_name_with_default, descriptor.display_name_with_default)
+            assert_equals(node.start, descriptor.lms.start)
+            assert_equals(node.is_draft, getattr(descriptor, 'is_draft', False))
+            if node.category in ('course', 'chapter', 'videosequence'):
+                assert_equals(len(node.get_children()), len(descriptor.get_children()))
+                for child_node, child in zip(node.get_children(), descriptor.get_children()):
+                    check(child_node, child)
+
+        check(outline, course)
+        overview = [section for section in outline.get_children() if section.url_name == 'Overview'][0]
+        welcome = [unit for unit in overview.get_children() if unit.location == self.drafted][0]
+        assert_equals(welcome.display_name, 'Draft Welcome')
+        assert_equals(welcome.has_published, True)
+
+    def test_load_grading_context(self):
+        course_location = Location('i4x://edX/toy/course/2012_Fall')
+        structure = self.store.get_item(course_location, depth=None).grading_context_structure()
+        assert_not_equals(structure['graded_sections'], {})
+
+        course = self.store.get_item(course_location)
+        finds = self.count_finds()
+        grading_context = course.load_grading_context(structure)
+        # one for all the descriptors, one for the metadata inheritance tree
+        assert_equals(finds.call_count, 2)
+
+        assert_equals([descriptor.location.url() for descriptor in grading_context['all_descriptors']],
+                      structure['all_locations'])
+        for sections in grading_context['graded_sections'].values():
+            for section in sections:
+                # graded is inherited from the course
+                assert_equals(section['section_descriptor'].lms.graded, True)
@@ -0,0 +1,43 @@
+import hashlib
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock
+from path import path
+
+from xmodule.modulestore import Location
+from xmodule.modulestore.xml_importer import import_static_content
+
+
+class StaticImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.course_dir = path(tempfile.mkdtemp())
+        (self.course_dir / 'static' / 'css').makedirs()
+        (self.course_dir / 'static' / 'css' / 'course.css').write_text('body {}')
+        (self.course_dir / 'static' / 'handout.txt').write_text('handout')
+        self.namespace = Location('i4x', 'edX', 'toy', 'course', '2012_Fall')
+        self.store = Mock()
+        self.store.get_asset_checksums.return_value = {}
+
+    def tearDown(self):
+        shutil.rmtree(self.course_dir)
+
+    def import_static(self):
+        return import_static_content([], self.namespace, self.course_dir, self.store, self.namespace)
+
+    def test_uploads_and_remaps(self):
+        remap = self.import_static()
+        self.assertEqual(remap, {'css/course.css': 'css_course.css', 'handout.txt': 'handout.txt'})
+        self.assertEqual(self.store.save.call_count, 2)
+        self.assertFalse(self.store.generate_thumbnail.called)
+
+    def test_skips_unchanged(self):
+        self.store.get_asset_checksums.return_value = {
+            'handout.txt': (hashlib.md5('handout').hexdigest(), 'handout.txt'),
+            'css_course.css': (hashlib.md5('changed').hexdigest(), 'css/course.css'),
+        }
+        self.import_static()
+        saved = [call[0][0].import_path for call in self.store.save.call_args_list]
+        self.assertEqual(saved, ['css/course.css'])
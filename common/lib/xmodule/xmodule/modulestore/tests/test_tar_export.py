@@ -0,0 +1,54 @@
+import tarfile
+import unittest
+from StringIO import StringIO
+
+from mock import Mock, patch
+
+from xmodule.modulestore import Location
+from xmodule.modulestore.tar_exporter import stream_course_tarball
+
+
+class Asset(StringIO):
+    """A file-like asset that, like a GridFS file, knows its length"""
+    def __init__(self, data):
+        StringIO.__init__(self, data)
+        self.length = len(data)
+
+
+def fake_export(modulestore, contentstore, course_location, export_fs, draft_modulestore=None):
+    with export_fs.open('course.xml', 'w') as course_xml:
+        course_xml.write('<course url_name="2012_Fall" org="edX" course="toy"/>')
+    export_fs.makedir('html', recursive=True, allow_recreate=True)
+    with export_fs.open('html/intro.html', 'w') as html:
+        html.write(u'<p>caf\xe9</p>')
+    static_fs = export_fs.makeopendir('static')
+    static_fs.makedir('images', recursive=True, allow_recreate=True)
+    static_fs.setcontents('images/logo.png', Asset('x' * 100000))
+
+
+class TarExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.location = Location('i4x', 'edX', 'toy', 'course', '2012_Fall')
+
+    def stream(self, **kwargs):
+        return stream_course_tarball(Mock(), Mock(), self.location, 'toy', **kwargs)
+
+    @patch('xmodule.modulestore.tar_exporter.export_to_fs', fake_export)
+    def test_layout(self):
+        chunks = list(self.stream(chunk_size=1024))
+
+        tar = tarfile.open(fileobj=StringIO(''.join(chunks)), mode='r:gz')
+        self.assertEqual(
+            sorted(tar.getnames()),
+            ['toy', 'toy/course.xml', 'toy/html', 'toy/html/intro.html',
+             'toy/static', 'toy/static/images', 'toy/static/images/logo.png']
+        )
+        self.assertTrue(tar.getmember('toy/static/images').isdir())
+        self.assertEqual(tar.extractfile('toy/html/intro.html').read(), '<p>caf\xc3\xa9</p>')
+        self.assertEqual(tar.extractfile('toy/static/images/logo.png').read(), 'x' * 100000)
+
+    @patch('xmodule.modulestore.tar_exporter.export_to_fs', Mock(side_effect=ValueError('broken')))
+    def test_export_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            list(self.stream())
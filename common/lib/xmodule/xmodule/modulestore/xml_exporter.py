@@ -1,23 +1,69 @@
+import hashlib
 import logging
+import posixpath
 from xmodule.modulestore import Location
 from xmodule.modulestore.inheritance import own_metadata
 from fs.osfs import OSFS
-from json import dumps
+from json import dumps, loads
+
+# the file in the course directory in which export_changes_to_xml records what
+# it exported
+MANIFEST_FILENAME = '.export_manifest.json'
 
 
 def export_to_xml(modulestore, contentstore, course_location, root_dir, course_dir, draft_modulestore=None):
 
-    course = modulestore.get_item(course_location)
+    fs = OSFS(root_dir)
+    export_fs = fs.makeopendir(course_dir)
+
+    export_to_fs(modulestore, contentstore, course_location, export_fs, draft_modulestore)
 
+
+def export_changes_to_xml(modulestore, contentstore, course_location, root_dir, course_dir, draft_modulestore=None):
+    """
+    Export the course as export_to_xml does, but only write the files whose
+    contents differ from the last export by this function, and remove the
+    files that that export wrote but this one doesn't.  Returns the paths
+    (relative to the course directory) of the files that were written and
+    of those that were removed.
+
+    What was exported is recorded in MANIFEST_FILENAME in the course
+    directory: the md5 of each file.  Assets whose md5 in the contentstore
+    matches are not read at all.  Files that were in the course directory
+    before the first such export are only overwritten, never removed.
+    """
     fs = OSFS(root_dir)
     export_fs = fs.makeopendir(course_dir)
 
+    previous = {}
+    if export_fs.isfile(MANIFEST_FILENAME):
+        try:
+            previous = loads(export_fs.getcontents(MANIFEST_FILENAME))['files']
+        except (ValueError, KeyError):
+            logging.warning('Ignoring the unreadable export manifest of {0}'.format(course_location))
+
+    manifest_fs = ManifestFS(export_fs, previous)
+    export_to_fs(modulestore, contentstore, course_location, manifest_fs, draft_modulestore)
+    removed = manifest_fs.remove_stale_files()
+
+    export_fs.setcontents(MANIFEST_FILENAME, dumps({'files': manifest_fs.files}, sort_keys=True, indent=0))
+    return manifest_fs.changed, removed
+
+
+def export_to_fs(modulestore, contentstore, course_location, export_fs, draft_modulestore=None):
+    """
+    Export the course at course_location into export_fs, a pyfilesystem
+    object, with the same layout as export_to_xml gives the course directory
+    """
+    # the whole course is exported, so load it all up front
+    course = modulestore.get_item(course_location, depth=None)
+
     xml = course.export_to_xml(export_fs)
     with export_fs.open('course.xml', 'w') as course_xml:
         course_xml.write(xml)
 
     # export the static assets
-    contentstore.export_all_for_course(course_location, root_dir + '/' + course_dir + '/static/')
+    contentstore.export_all_for_course_to_fs(course_location, export_fs.makeopendir('static'))
 
     # export the static tabs
     export_extra_content(export_fs, modulestore, course_location, 'static_tab', 'tabs', '.html')
@@ -51,15 +97,17 @@ def export_to_xml(modulestore, contentstore, course_location, root_dir, course_d
                                                        'vertical', None, 'draft'])
         if len(draft_verticals) > 0:
             draft_course_dir = export_fs.makeopendir('drafts')
+            parents = modulestore.get_parents_with_children(
+                [draft_vertical.location for draft_vertical in draft_verticals], course.location.course_id)
             for draft_vertical in draft_verticals:
-                parent_locs = draft_modulestore.get_parent_locations(draft_vertical.location, course.location.course_id)
+                url = draft_vertical.location.url()
                 # Don't try to export orphaned items.
-                if len(parent_locs) > 0:
-                    logging.debug('parent_locs = {0}'.format(parent_locs))
-                    draft_vertical.xml_attributes['parent_sequential_url'] = Location(parent_locs[0]).url()
-                    sequential = modulestore.get_item(Location(parent_locs[0]))
-                    index = sequential.children.index(draft_vertical.location.url())
-                    draft_vertical.xml_attributes['index_in_children_list'] = str(index)
+                if len(parents.get(url, [])) > 0:
+                    # prefer a published parent to a draft one
+                    parent_loc, siblings = sorted(parents[url], key=lambda parent: parent[0].revision is not None)[0]
+                    logging.debug('parent_loc = {0}'.format(parent_loc))
+                    draft_vertical.xml_attributes['parent_sequential_url'] = parent_loc.url()
+                    draft_vertical.xml_attributes['index_in_children_list'] = str(siblings.index(url))
                     draft_vertical.export_to_xml(draft_course_dir)
 
 
@@ -72,3 +120,123 @@ def export_extra_content(export_fs, modulestore, course_location, category_type,
         for item in items:
             with item_dir.open(item.location.name + file_suffix, 'w') as item_file:
                 item_file.write(item.data.encode('utf8'))
+
+
+class _ManifestFile(object):
+    """
+    A file opened for writing in a ManifestFS, which is written out (if it
+    has changed) when it is closed
+    """
+    def __init__(self, manifest_fs, path):
+        self.manifest_fs = manifest_fs
+        self.path = path
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        self.parts.append(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.manifest_fs.write_file(self.path, ''.join(self.parts))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ManifestFS(object):
+    """
+    The subset of the pyfilesystem interface that course export uses (makedir,
+    makeopendir, open and setcontents) over a directory in wrapped_fs, which
+    only writes a file if its md5 differs from the one in previous, a
+    {path: md5} manifest of the last export into the directory.
+
+    files, the manifest of this export, and changed, the paths written, are
+    shared with the sub-filesystems returned by makeopendir.
+    """
+    def __init__(self, wrapped_fs, previous, prefix='', _shared=None):
+        self.wrapped_fs = wrapped_fs
+        self.previous = previous
+        self.prefix = prefix
+        if _shared is None:
+            _shared = ({}, [])
+        self._shared = _shared
+        self.files, self.changed = _shared
+
+    def _path(self, path):
+        if isinstance(path, unicode):
+            path = path.encode('utf-8')
+        return posixpath.normpath(posixpath.join(self.prefix, path.lstrip('/')))
+
+    def makedir(self, path, recursive=False, allow_recreate=False):
+        fullpath = self._path(path)
+        if fullpath != '.':
+            self.wrapped_fs.makedir(fullpath, recursive=True, allow_recreate=True)
+
+    def makeopendir(self, path, recursive=False):
+        self.makedir(path)
+        return ManifestFS(self.wrapped_fs, self.previous, self._path(path), self._shared)
+
+    def open(self, path, mode='r', **kwargs):
+        if 'w' not in mode:
+            raise ValueError("ManifestFS can only open files for writing")
+        return _ManifestFile(self, path)
+
+    def setcontents(self, path, data, chunk_size=64 * 1024):
+        """
+        Write data, a string or a file-like object, to path if it has
+        changed.  A file-like object with an md5 attribute (such as a GridFS
+        file) isn't read unless it has changed.
+        """
+        if isinstance(data, basestring):
+            return self.write_file(path, data)
+
+        md5 = getattr(data, 'md5', None)
+        if md5 is None:
+            return self.write_file(path, data.read())
+
+        fullpath = self._path(path)
+        self.files[fullpath] = md5
+        if self.previous.get(fullpath) != md5 or not self.wrapped_fs.isfile(fullpath):
+            self.wrapped_fs.setcontents(fullpath, data)
+            self.changed.append(fullpath)
+
+    def write_file(self, path, data):
+        """
+        Write the string data to path if it has changed
+        """
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        fullpath = self._path(path)
+        md5 = hashlib.md5(data).hexdigest()
+        self.files[fullpath] = md5
+        if self.previous.get(fullpath) != md5 or not self.wrapped_fs.isfile(fullpath):
+            self.wrapped_fs.setcontents(fullpath, data)
+            self.changed.append(fullpath)
+
+    def remove_stale_files(self):
+        """
+        Remove the files in the previous manifest that weren't written this
+        time, and any directories that leaves empty.  Returns their paths.
+        """
+        removed = []
+        for fullpath in sorted(set(self.previous) - set(self.files)):
+            if self.wrapped_fs.isfile(fullpath):
+                self.wrapped_fs.remove(fullpath)
+                removed.append(fullpath)
+
+            dirname = posixpath.dirname(fullpath)
+            while dirname and self.wrapped_fs.isdir(dirname) and self.wrapped_fs.isdirempty(dirname):
+                self.wrapped_fs.removedir(dirname)
+                dirname = posixpath.dirname(dirname)
+        return removed
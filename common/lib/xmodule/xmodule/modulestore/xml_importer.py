@@ -1,6 +1,8 @@
+import hashlib
 import logging
 import os
 import mimetypes
+from multiprocessing.pool import ThreadPool
 from lxml.html import rewrite_links as lxml_rewrite_links
 from path import path
 
@@ -15,8 +17,59 @@ from xmodule.errortracker import make_error_tracker
 log = logging.getLogger(__name__)
 
 
+# number of threads uploading static content, and generating thumbnails, during an import
+STATIC_IMPORT_WORKERS = 4
+
+# bytes read at a time when hashing static content
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _file_md5(filename):
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), ''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _import_static_file(static_content_store, content_path, fullname_with_subpath, target_location_namespace, stored):
+    """
+    Save the file content_path to static_content_store unless an identical copy
+    is already stored.  Returns the StaticContent saved (with data no longer
+    available), or None if it was already there.
+    """
+    content_loc = StaticContent.compute_location(target_location_namespace.org, target_location_namespace.course, fullname_with_subpath)
+    if stored.get(content_loc.name) == (_file_md5(content_path), fullname_with_subpath):
+        return None
+
+    filename = os.path.basename(content_path)
+    mime_type = mimetypes.guess_type(filename)[0]
+    with open(content_path, 'rb') as f:
+        content = StaticContent(content_loc, filename, mime_type, f, import_path=fullname_with_subpath)
+        static_content_store.save(content)
+    return content
+
+
+def _generate_thumbnail(static_content_store, content_path, content):
+    """
+    Generate and record the thumbnail for content, which was saved from content_path
+    """
+    with open(content_path, 'rb') as f:
+        content.data = f.read()
+    (thumbnail_content, thumbnail_location) = static_content_store.generate_thumbnail(content)
+    if thumbnail_content is not None:
+        static_content_store.set_thumbnail_location(content.location, thumbnail_location)
+
+
 def import_static_content(modules, course_loc, course_data_path, static_content_store, target_location_namespace,
                           subpath='static', verbose=False):
+    """
+    Import all the files under subpath of course_data_path as static content.
+
+    Files are uploaded by a pool of threads, and skipped if the store already
+    has an identical copy.  Thumbnails of the images uploaded are generated by
+    a second pool as the uploads finish.
+    """
 
     remap_dict = {}
 
@@ -25,38 +78,49 @@ def import_static_content(modules, course_loc, course_data_path, static_content_
 
     verbose = True
 
+    files = []
     for dirname, dirnames, filenames in os.walk(static_dir):
         for filename in filenames:
-
-            try:
-                content_path = os.path.join(dirname, filename)
-                if verbose:
-                    log.debug('importing static content {0}...'.format(content_path))
-
-                fullname_with_subpath = content_path.replace(static_dir, '')  # strip away leading path from the name
-                if fullname_with_subpath.startswith('/'):
-                    fullname_with_subpath = fullname_with_subpath[1:]
-                content_loc = StaticContent.compute_location(target_location_namespace.org, target_location_namespace.course, fullname_with_subpath)
-                mime_type = mimetypes.guess_type(filename)[0]
-
-                with open(content_path, 'rb') as f:
-                    data = f.read()
-
-                content = StaticContent(content_loc, filename, mime_type, data, import_path=fullname_with_subpath)
-
-                # first let's save a thumbnail so we can get back a thumbnail location
-                (thumbnail_content, thumbnail_location) = static_content_store.generate_thumbnail(content)
-
-                if thumbnail_content is not None:
-                    content.thumbnail_location = thumbnail_location
-
-                #then commit the content
-                static_content_store.save(content)
-
-                #store the remapping information which will be needed to subsitute in the module data
-                remap_dict[fullname_with_subpath] = content_loc.name
-            except:
-                raise
+            content_path = os.path.join(dirname, filename)
+            fullname_with_subpath = content_path.replace(static_dir, '')  # strip away leading path from the name
+            if fullname_with_subpath.startswith('/'):
+                fullname_with_subpath = fullname_with_subpath[1:]
+            files.append((content_path, fullname_with_subpath))
+
+            #store the remapping information which will be needed to subsitute in the module data
+            remap_dict[fullname_with_subpath] = StaticContent.compute_location(
+                target_location_namespace.org, target_location_namespace.course, fullname_with_subpath).name
+
+    if not files:
+        return remap_dict
+
+    stored = static_content_store.get_asset_checksums(target_location_namespace)
+
+    def _import(file_info):
+        content_path, fullname_with_subpath = file_info
+        if verbose:
+            log.debug('importing static content {0}...'.format(content_path))
+        return content_path, _import_static_file(static_content_store, content_path, fullname_with_subpath,
+                                                 target_location_namespace, stored)
+
+    upload_pool = ThreadPool(STATIC_IMPORT_WORKERS)
+    thumbnail_pool = ThreadPool(STATIC_IMPORT_WORKERS)
+    thumbnails = []
+    try:
+        for content_path, content in upload_pool.imap_unordered(_import, files):
+            if content is not None and content.content_type is not None and content.content_type.split('/')[0] == 'image':
+                thumbnails.append(thumbnail_pool.apply_async(_generate_thumbnail, (static_content_store, content_path, content)))
+    finally:
+        upload_pool.close()
+        thumbnail_pool.close()
+        thumbnail_pool.join()
+
+    for thumbnail in thumbnails:
+        try:
+            thumbnail.get()
+        except Exception:
+            # thumbnails are generally considered as optional
+            log.exception("Failed to generate thumbnail")
 
     return remap_dict
 
@@ -255,22 +319,13 @@ def import_from_xml(store, data_dir, course_dirs=None,
                 import_static_content(xml_module_store.modules[course_id], course_location, course_data_path, static_content_store,
                                       _namespace_rename, subpath='static', verbose=verbose)
 
-            # finally loop through all the modules
-            for module in xml_module_store.modules[course_id].itervalues():
-
-                if module.category == 'course':
-                    # we've already saved the course module up at the top of the loop
-                    # so just skip over it in the inner loop
-                    continue
-
-                # remap module to the new namespace
-                if target_location_namespace is not None:
-                    module = remap_namespace(module, target_location_namespace)
-
-                if verbose:
-                    log.debug('importing module location {0}'.format(module.location))
-
-                import_module(module, store, course_data_path, static_content_store)
+            # finally write all the modules, in bulk. We've already saved the
+            # course module up at the top of the loop so just skip over it here
+            import_modules(
+                (module for module in xml_module_store.modules[course_id].itervalues()
+                 if module.category != 'course'),
+                store, course_data_path, static_content_store, target_location_namespace, verbose=verbose
+            )
 
             # now import any 'draft' items
             if draft_store is not None:
@@ -288,7 +343,11 @@ def import_from_xml(store, data_dir, course_dirs=None,
     return xml_module_store, course_items
 
 
-def import_module(module, store, course_data_path, static_content_store, allow_not_found=False):
+def module_import_fields(module, course_data_path, static_content_store):
+    """
+    Returns (data, children, metadata) to store for module, importing any
+    static content its data links to along the way
+    """
     content = {}
     for field in module.fields:
         if field.scope != Scope.content:
@@ -326,17 +385,50 @@ def import_module(module, store, course_data_path, static_content_store, allow_n
     else:
         module_data = content
 
+    children = getattr(module, 'children', [])
+
+    # NOTE: It's important to use own_metadata here to avoid writing
+    # inherited metadata everywhere.
+    return module_data, children, dict(own_metadata(module))
+
+
+def import_module(module, store, course_data_path, static_content_store, allow_not_found=False):
+    module_data, children, metadata = module_import_fields(module, course_data_path, static_content_store)
+
     if allow_not_found:
         store.update_item(module.location, module_data, allow_not_found=allow_not_found)
     else:
         store.update_item(module.location, module_data)
 
-    if hasattr(module, 'children') and module.children != []:
-        store.update_children(module.location, module.children)
+    if children != []:
+        store.update_children(module.location, children)
 
-    # NOTE: It's important to use own_metadata here to avoid writing
-    # inherited metadata everywhere.
-    store.update_metadata(module.location, dict(own_metadata(module)))
+    store.update_metadata(module.location, metadata)
+
+
+def import_modules(modules, store, course_data_path, static_content_store, target_location_namespace=None, verbose=False):
+    """
+    Import modules (an iterable of descriptors) into store, remapping them to
+    target_location_namespace, using the store's bulk_write_items
+    """
+    def _items():
+        for module in modules:
+            # remap module to the new namespace
+            if target_location_namespace is not None:
+                module = remap_namespace(module, target_location_namespace)
+
+            if verbose:
+                log.debug('importing module location {0}'.format(module.location))
+
+            if module.category == 'static_tab':
+                # update_metadata keeps the course's tab list in step with static tabs
+                import_module(module, store, course_data_path, static_content_store)
+                continue
+
+            data, children, metadata = module_import_fields(module, course_data_path, static_content_store)
+            yield (module.location, data, children, metadata)
+
+    store.bulk_write_items(_items())
 
 
 def import_course_draft(xml_module_store, store, draft_store, course_data_path, static_content_store, target_location_namespace):
@@ -19,11 +19,16 @@ can be cloned when adding new modules to a course.
     children: A list of Location urls that define the template children
 
 Templates are defined on XModuleDescriptor types, in the template attribute.
+
+Since templates only change when update_templates is run, the CMS lists them
+through get_template_summaries, which only reads them from the modulestore
+again when they have been written to.
 """
 
 
 import logging
 from fs.memoryfs import MemoryFS
+from weakref import WeakKeyDictionary
 
 from collections import defaultdict
 from .x_module import XModuleDescriptor
@@ -32,6 +37,32 @@ from .modulestore import Location
 
 log = logging.getLogger(__name__)
 
+# modulestore -> (content version of the templates, what get_template_summaries
+# returns).  Cleared by update_templates.
+_TEMPLATE_SUMMARIES = WeakKeyDictionary()
+
+# where the templates are kept; its content version changes whenever one is written
+TEMPLATES_LOCATION = Location(['i4x', 'edx', 'templates', None, None, None])
+
+
+class TemplateSummary(object):
+    """
+    What the CMS needs to offer a template when adding a component, without
+    keeping the template descriptor around
+    """
+    def __init__(self, location, display_name, has_markdown):
+        self.location = location
+        self.display_name = display_name
+        self.has_markdown = has_markdown
+
+    @classmethod
+    def from_descriptor(cls, template):
+        return cls(
+            template.location,
+            template.display_name_with_default,
+            getattr(template, 'markdown', None) is not None,
+        )
+
 
 def all_templates():
     """
@@ -45,6 +76,34 @@ def all_templates():
     return templates
 
 
+def get_template_summaries(modulestore):
+    """
+    Returns a TemplateSummary for each template in modulestore.
+
+    The summaries are kept by each process, and only read from modulestore
+    again once the content version of the templates has changed, as it does
+    when update_templates writes them from any process.  If modulestore
+    doesn't keep content versions, they are read again only after a call to
+    update_templates in this process.
+    """
+    version = modulestore.get_course_content_version(TEMPLATES_LOCATION)
+    cached = _TEMPLATE_SUMMARIES.get(modulestore)
+    if cached is None or cached[0] != version:
+        summaries = [
+            TemplateSummary.from_descriptor(template)
+            for template in modulestore.get_items(TEMPLATES_LOCATION)
+        ]
+        cached = _TEMPLATE_SUMMARIES[modulestore] = (version, summaries)
+    return cached[1]
+
+
+def clear_template_summaries():
+    """
+    Forget the templates read by get_template_summaries
+    """
+    _TEMPLATE_SUMMARIES.clear()
+
+
 class TemplateTestSystem(MakoDescriptorSystem):
     """
     This system exists to help verify that XModuleDescriptors can be instantiated
@@ -65,6 +124,8 @@ def update_templates(modulestore):
     available from the installed plugins
     """
 
+    clear_template_summaries()
+
     # cdodge: build up a list of all existing templates. This will be used to determine which
     # templates have been removed from disk - and thus we need to remove from the DB
     templates_to_delete = modulestore.get_items(['i4x', 'edx', 'templates', None, None, None])
@@ -107,3 +168,6 @@ def update_templates(modulestore):
         logging.debug('deleting dangling templates = {0}'.format(templates_to_delete))
         for template in templates_to_delete:
             modulestore.delete_item(template.location)
+
+    # drop anything read while the templates were being written
+    clear_template_summaries()
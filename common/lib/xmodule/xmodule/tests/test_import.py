@@ -487,3 +487,25 @@ class ImportTestCase(BaseCourseTestCase):
         # and finally...
         course.cohort_config = {'cohorted': True}
         self.assertTrue(course.is_cohorted)
+
+    def test_grading_context_structure(self):
+        """
+        Check that a grading context rebuilt from grading_context_structure
+        matches the one computed by walking the course.
+        """
+        structure = self.get_course('toy').grading_context_structure()
+        self.assertTrue(structure['graded_sections'])
+
+        course = self.get_course('toy')
+        grading_context = course.load_grading_context(structure)
+        self.assertEqual(
+            [descriptor.location.url() for descriptor in grading_context['all_descriptors']],
+            structure['all_locations']
+        )
+        self.assertIs(course.grading_context, grading_context)
+
+        for section_format, sections in grading_context['graded_sections'].iteritems():
+            self.assertEqual(
+                [section['section_descriptor'].location.url() for section in sections],
+                [section['section_location'] for section in structure['graded_sections'][section_format]]
+            )
@@ -719,6 +719,15 @@ class DescriptorSystem(object):
         self.resources_fs = resources_fs
         self.error_tracker = error_tracker
 
+    def prefetch_items(self, locations):
+        """
+        Hint that load_item is about to be called for each of locations, so
+        that systems backed by a database can fetch them all at once.
+
+        Does nothing by default.
+        """
+        pass
+
 
 class XMLParsingSystem(DescriptorSystem):
     def __init__(self, load_item, resources_fs, error_tracker, process_xml, policy, **kwargs):
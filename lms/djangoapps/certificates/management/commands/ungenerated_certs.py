@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from certificates.models import certificate_status_for_student
+from certificates.models import GeneratedCertificate
 from certificates.queue import XQueueCertInterface
 from django.contrib.auth.models import User
 from optparse import make_option
@@ -19,6 +19,11 @@ class Command(BaseCommand):
 
     Use the --noop option to test without actually
     putting certificates on the queue to be generated.
+
+    Students are processed in username order, in batches of
+    --batch-size. Progress lines include the last username
+    processed, which can be passed to --start-after to resume
+    an interrupted run.
     """
 
     option_list = BaseCommand.option_list + (
@@ -41,6 +46,18 @@ class Command(BaseCommand):
                     'whose entry in the certificate table matches STATUS. '
                     'STATUS can be generating, unavailable, deleted, error '
                     'or notpassing.'),
+        make_option('-b', '--batch-size',
+                    metavar='N',
+                    dest='batch_size',
+                    type='int',
+                    default=100,
+                    help='Number of students to grade and queue at a time'),
+        make_option('--start-after',
+                    metavar='USERNAME',
+                    dest='start_after',
+                    default=None,
+                    help='Only process students whose username sorts '
+                    'after USERNAME'),
 
     )
 
@@ -78,30 +95,58 @@ class Command(BaseCommand):
 
             print "Fetching enrolled students for {0}".format(course_id)
             enrolled_students = User.objects.filter(
-                courseenrollment__course_id=course_id).prefetch_related(
-                    "groups").order_by('username')
+                courseenrollment__course_id=course_id)
+            if options['start_after']:
+                enrolled_students = enrolled_students.filter(
+                    username__gt=options['start_after'])
             xq = XQueueCertInterface()
             total = enrolled_students.count()
             count = 0
             start = datetime.datetime.now()
-            for student in enrolled_students:
-                count += 1
-                if count % STATUS_INTERVAL == 0:
-                    # Print a status update with an approximation of
-                    # how much time is left based on how long the last
-                    # interval took
-                    diff = datetime.datetime.now() - start
-                    timeleft = diff * (total - count) / STATUS_INTERVAL
-                    hours, remainder = divmod(timeleft.seconds, 3600)
-                    minutes, seconds = divmod(remainder, 60)
-                    print "{0}/{1} completed ~{2:02}:{3:02}m remaining".format(
-                        count, total, hours, minutes)
-                    start = datetime.datetime.now()
-
-                if certificate_status_for_student(
-                        student, course_id)['status'] in valid_statuses:
-                    if not options['noop']:
-                        # Add the certificate request to the queue
-                        ret = xq.add_cert(student, course_id, course=course)
+            for batch in self._batches(enrolled_students, options['batch_size']):
+                # certificate_status_for_student for the whole batch
+                statuses = dict(GeneratedCertificate.objects.filter(
+                    course_id=course_id, user__in=[student.id for student in batch]
+                ).values_list('user', 'status'))
+                to_add = [student for student in batch
+                          if statuses.get(student.id, CertificateStatuses.unavailable) in valid_statuses]
+
+                if to_add and not options['noop']:
+                    # Add the certificate requests to the queue
+                    results = xq.add_certs(to_add, course_id, course=course)
+                    for student, ret in results:
                         if ret == 'generating':
                             print '{0} - {1}'.format(student, ret)
+                        elif ret is None:
+                            print '{0} - unable to queue, will be retried on the next run'.format(student)
+
+                for student in batch:
+                    count += 1
+                    if count % STATUS_INTERVAL == 0:
+                        # Print a status update with an approximation of
+                        # how much time is left based on how long the last
+                        # interval took
+                        diff = datetime.datetime.now() - start
+                        timeleft = diff * (total - count) / STATUS_INTERVAL
+                        hours, remainder = divmod(timeleft.seconds, 3600)
+                        minutes, seconds = divmod(remainder, 60)
+                        print "{0}/{1} completed ~{2:02}:{3:02}m remaining (at {4})".format(
+                            count, total, hours, minutes, student.username)
+                        start = datetime.datetime.now()
+
+    def _batches(self, students, batch_size):
+        """
+        Yields lists of at most batch_size students, in username order,
+        fetching each batch with its own query
+        """
+        students = students.order_by('username').prefetch_related("groups")
+        last_username = None
+        while True:
+            batch = students
+            if last_username is not None:
+                batch = batch.filter(username__gt=last_username)
+            batch = list(batch[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_username = batch[-1].username
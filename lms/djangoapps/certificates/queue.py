@@ -11,6 +11,9 @@ from django.conf import settings
 from requests.auth import HTTPBasicAuth
 from student.models import UserProfile
 
+from collections import defaultdict
+from datetime import datetime
+
 import json
 import random
 import logging
@@ -38,6 +41,10 @@ class XQueueCertInterface(object):
                    view which will save the certificate
                    download URL.
 
+       add_certs:  add_cert for a batch of students, with the
+                   database lookups and writes done once per batch
+                   and the queue requests sent concurrently.
+
        regen_cert: Regenerate an existing certificate.
                    For a user that already has a certificate
                    this will delete the existing one and
@@ -50,6 +57,10 @@ class XQueueCertInterface(object):
 
     """
 
+    VALID_STATUSES = [status.generating,
+            status.unavailable, status.deleted, status.error,
+            status.notpassing]
+
     def __init__(self, request=None):
 
         # Get basic auth (username/password) for
@@ -71,6 +82,9 @@ class XQueueCertInterface(object):
                 settings.XQUEUE_INTERFACE['url'],
                 settings.XQUEUE_INTERFACE['django_auth'],
                 requests_auth,
+                pool_size=settings.XQUEUE_INTERFACE.get('pool_size', 10),
+                timeout=settings.XQUEUE_INTERFACE.get('timeout'),
+                retries=settings.XQUEUE_INTERFACE.get('retries', 0),
                 )
         self.whitelist = CertificateWhitelist.objects.all()
         self.restricted = UserProfile.objects.filter(allow_certificate=False)
@@ -142,16 +156,10 @@ class XQueueCertInterface(object):
 
         """
 
-        VALID_STATUSES = [status.generating,
-                status.unavailable, status.deleted, status.error,
-                status.notpassing]
-
         cert_status = certificate_status_for_student(
                               student, course_id)['status']
 
-        if cert_status in VALID_STATUSES:
-            # grade the student
-
+        if cert_status in self.VALID_STATUSES:
             # re-use the course passed in optionally so we don't have to re-fetch everything
             # for every student
             if course is None:
@@ -161,53 +169,183 @@ class XQueueCertInterface(object):
             cert, created = GeneratedCertificate.objects.get_or_create(
                    user=student, course_id=course_id)
 
-            grade = grades.grade(student, self.request, course)
             is_whitelisted = self.whitelist.filter(
                 user=student, course_id=course_id, whitelist=True).exists()
+            is_restricted = self.restricted.filter(user=student).exists()
 
-            if is_whitelisted or grade['grade'] is not None:
+            contents = self._grade_cert(cert, student, course_id, course, profile.name,
+                                        is_whitelisted, is_restricted)
+            if contents is not None:
+                self._send_to_xqueue(contents, cert.key)
+            cert.save()
+            if cert.status == status.notpassing:
+                cert_status = cert.status
 
-                key = make_hashkey(random.random())
+        return cert_status
 
-                cert.grade = grade['percent']
-                cert.user = student
-                cert.course_id = course_id
-                cert.key = key
-                cert.name = profile.name
+    def add_certs(self, students, course_id, course=None):
+        """
+        Arguments:
+          students - list of User.objects
+          course_id - courseenrollment.course_id (string)
+
+        The same as calling add_cert for each student, but the profiles,
+        certificates, whitelist and restricted entries for the whole batch
+        are fetched up front, the certificates are written together, and the
+        queue requests are sent with XQueueInterface.send_many.
 
-                # check to see whether the student is on the
-                # the embargoed country restricted list
-                # otherwise, put a new certificate request
-                # on the queue
-                if self.restricted.filter(user=student).exists():
-                    cert.status = status.restricted
+        The certificates are written (as generating, with their new keys)
+        before their queue requests are sent, so that they are there when
+        the update_certificate callback looks them up.  A certificate whose
+        queue request fails is then put back the way it was, so it will be
+        picked up again by the next run.
+
+        Returns a list of (student, status) pairs in the order of students,
+        where status is what add_cert would have returned for the student,
+        or None if the queue request for the student failed.
+        """
+        students = list(students)
+        if not students:
+            return []
+        if course is None:
+            course = courses.get_course_by_id(course_id)
+
+        user_ids = [student.id for student in students]
+        certs = dict((cert.user_id, cert) for cert in GeneratedCertificate.objects.filter(
+            course_id=course_id, user__in=user_ids))
+        previous = dict((cert.id, self._updated_values(cert)) for cert in certs.itervalues())
+        previous_modified = dict((cert.id, cert.modified_date) for cert in certs.itervalues())
+        names = dict(UserProfile.objects.filter(
+            user__in=user_ids).values_list('user', 'name'))
+        whitelisted = set(CertificateWhitelist.objects.filter(
+            course_id=course_id, whitelist=True, user__in=user_ids).values_list('user', flat=True))
+        restricted = set(self.restricted.filter(
+            user__in=user_ids).values_list('user', flat=True))
+
+        new_certs = []
+        changed_certs = []
+        to_send = []
+        statuses = {}
+        for student in students:
+            cert = certs.get(student.id)
+            if cert is None:
+                cert = GeneratedCertificate(user=student, course_id=course_id)
+            statuses[student.id] = cert.status
+            if cert.status in self.VALID_STATUSES:
+                # raises UserProfile.DoesNotExist like add_cert would
+                name = names[student.id] if student.id in names else UserProfile.objects.get(user=student).name
+                contents = self._grade_cert(cert, student, course_id, course, name,
+                                            student.id in whitelisted, student.id in restricted)
+                if cert.pk is None:
+                    new_certs.append(cert)
                 else:
-                    contents = {
-                        'action': 'create',
-                        'username': student.username,
-                        'course_id': course_id,
-                        'name': profile.name,
-                    }
-                    cert.status = status.generating
-                    self._send_to_xqueue(contents, key)
-                cert.save()
+                    changed_certs.append(cert)
+                if contents is not None:
+                    to_send.append((cert, contents))
+                if cert.status == status.notpassing:
+                    statuses[student.id] = cert.status
+
+        if new_certs:
+            GeneratedCertificate.objects.bulk_create(new_certs)
+        self._update_certs(changed_certs, previous)
+
+        replies = self.xqueue_interface.send_many([
+            (self._make_xheader(cert.key), json.dumps(contents))
+            for cert, contents in to_send
+        ])
+        for (cert, contents), (error, msg) in zip(to_send, replies):
+            if not error:
+                continue
+            logger.error('Unable to queue certificate for %s: %s', contents['username'], msg)
+            statuses[cert.user_id] = None
+            # put it back the way it was
+            if cert.pk is None:
+                GeneratedCertificate.objects.filter(user=cert.user_id, course_id=course_id).delete()
             else:
-                cert_status = status.notpassing
-                cert.grade = grade['percent']
-                cert.status = cert_status
-                cert.user = student
-                cert.course_id = course_id
-                cert.name = profile.name
-                cert.save()
+                GeneratedCertificate.objects.filter(id=cert.id).update(
+                    modified_date=previous_modified[cert.id], **previous[cert.id])
 
-        return cert_status
+        return [(student, statuses[student.id]) for student in students]
 
-    def _send_to_xqueue(self, contents, key):
+    # the fields of an existing certificate that _grade_cert can change
+    UPDATED_FIELDS = ('status', 'grade', 'name', 'key')
+
+    def _updated_values(self, cert):
+        """
+        Returns a dict of the UPDATED_FIELDS of cert, as they are written to the database
+        """
+        return dict((name, GeneratedCertificate._meta.get_field(name).get_prep_value(getattr(cert, name)))
+                    for name in self.UPDATED_FIELDS)
+
+    def _update_certs(self, certs, previous):
+        """
+        Save the changes to existing certs, given previous, a dict of
+        cert id -> _updated_values(cert) from when it was read.
+
+        Certificates are grouped by their new status and the other values
+        they change, and each group is written with a single update().
+        A new key is unique to its certificate, so those are still written
+        one at a time, but each of them has had a queue request of its own
+        anyway.  Certificates that haven't changed aren't written.
+        """
+        groups = defaultdict(list)
+        for cert in certs:
+            values = self._updated_values(cert)
+            changes = tuple(sorted((name, value) for name, value in values.iteritems()
+                                   if value != previous[cert.id][name]))
+            if changes:
+                groups[changes].append(cert.id)
+
+        modified_date = datetime.now()
+        for changes, ids in groups.iteritems():
+            # update() doesn't set auto_now fields
+            GeneratedCertificate.objects.filter(id__in=ids).update(modified_date=modified_date, **dict(changes))
+
+    def _grade_cert(self, cert, student, course_id, course, name, is_whitelisted, is_restricted):
+        """
+        Grade student and fill in cert (without saving it).
 
-        xheader = make_xheader(
+        Returns the contents of the queue request to make for the
+        certificate, or None if no request should be made.
+        """
+        grade = grades.grade(student, self.request, course)
+
+        cert.grade = grade['percent']
+        cert.user = student
+        cert.course_id = course_id
+        cert.name = name
+
+        if not (is_whitelisted or grade['grade'] is not None):
+            cert.status = status.notpassing
+            return None
+
+        cert.key = make_hashkey(random.random())
+
+        # check to see whether the student is on the
+        # the embargoed country restricted list
+        # otherwise, put a new certificate request
+        # on the queue
+        if is_restricted:
+            cert.status = status.restricted
+            return None
+
+        cert.status = status.generating
+        return {
+            'action': 'create',
+            'username': student.username,
+            'course_id': course_id,
+            'name': name,
+        }
+
+    def _make_xheader(self, key):
+        return make_xheader(
             'https://{0}/update_certificate?{1}'.format(
                 settings.SITE_NAME, key), key, settings.CERT_QUEUE)
 
+    def _send_to_xqueue(self, contents, key):
+
+        xheader = self._make_xheader(key)
+
         (error, msg) = self.xqueue_interface.send_to_queue(
                 header=xheader, body=json.dumps(contents))
         if error:
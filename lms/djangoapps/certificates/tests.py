@@ -4,8 +4,20 @@ when you run "manage.py test".
 
 Replace this with more appropriate tests for your application.
 """
+import json
+from datetime import datetime
 
+from django.core.management import call_command
 from django.test import TestCase
+from mock import Mock, patch
+
+from certificates.models import CertificateStatuses, GeneratedCertificate
+from certificates.queue import XQueueCertInterface
+from capa.xqueue_interface import XQueueInterface
+from student.models import UserProfile
+from student.tests.factories import CourseEnrollmentFactory, UserFactory
+
+COURSE_ID = 'edX/toy/2012_Fall'
 
 
 class SimpleTest(TestCase):
@@ -14,3 +26,141 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+def fake_grade(student, request, course):
+    """
+    Passing grades for students whose username starts with 'pass'
+    """
+    if student.username.startswith('pass'):
+        return {'grade': 'Pass', 'percent': 0.9}
+    return {'grade': None, 'percent': 0.1}
+
+
+@patch('certificates.queue.grades.grade', fake_grade)
+@patch.object(XQueueInterface, 'send_many')
+class AddCertsTest(TestCase):
+
+    def setUp(self):
+        self.new = UserFactory.create(username='pass_new')
+        self.existing = UserFactory.create(username='pass_existing')
+        self.failing = UserFactory.create(username='fail')
+        self.restricted = UserFactory.create(username='pass_restricted')
+        UserProfile.objects.filter(user=self.restricted).update(allow_certificate=False)
+        self.downloadable = UserFactory.create(username='pass_downloadable')
+
+        GeneratedCertificate.objects.create(user=self.existing, course_id=COURSE_ID)
+        # as a previous run would have left it
+        GeneratedCertificate.objects.create(user=self.failing, course_id=COURSE_ID, grade='0.1',
+                                            name='Robot Test', status=CertificateStatuses.notpassing)
+        GeneratedCertificate.objects.create(user=self.downloadable, course_id=COURSE_ID,
+                                            status=CertificateStatuses.downloadable)
+        self.long_ago = datetime(2000, 1, 1)
+        GeneratedCertificate.objects.filter(course_id=COURSE_ID).update(modified_date=self.long_ago)
+
+        self.students = [self.new, self.existing, self.failing, self.restricted, self.downloadable]
+
+    def cert(self, student):
+        return GeneratedCertificate.objects.get(user=student, course_id=COURSE_ID)
+
+    def sent(self, send_many, fail=()):
+        """
+        Make send_many reply with an error for the usernames in fail, and
+        record the username and key of each request it's given, and the
+        certificate that was in the database for it at the time
+        """
+        sent = {}
+
+        def send(submissions):
+            replies = []
+            for header, body in submissions:
+                username = json.loads(body)['username']
+                key = json.loads(header)['lms_key']
+                sent[username] = (key, GeneratedCertificate.objects.get(key=key))
+                replies.append((1, 'unavailable') if username in fail else (0, 'ok'))
+            return replies
+        send_many.side_effect = send
+        return sent
+
+    def test_add_certs(self, send_many):
+        sent = self.sent(send_many)
+        results = XQueueCertInterface().add_certs(self.students, COURSE_ID, course=Mock())
+
+        # the same statuses add_cert returns
+        self.assertEqual(results, [
+            (self.new, CertificateStatuses.unavailable),
+            (self.existing, CertificateStatuses.unavailable),
+            (self.failing, CertificateStatuses.notpassing),
+            (self.restricted, CertificateStatuses.unavailable),
+            (self.downloadable, CertificateStatuses.downloadable),
+        ])
+        self.assertEqual(self.cert(self.new).status, CertificateStatuses.generating)
+        self.assertEqual(self.cert(self.existing).status, CertificateStatuses.generating)
+        self.assertEqual(self.cert(self.existing).grade, '0.9')
+        self.assertEqual(self.cert(self.restricted).status, CertificateStatuses.restricted)
+        self.assertEqual(self.cert(self.downloadable).status, CertificateStatuses.downloadable)
+
+        self.assertEqual(send_many.call_count, 1)
+        self.assertEqual(sorted(sent), ['pass_existing', 'pass_new'])
+        for student in (self.new, self.existing):
+            key, cert_when_sent = sent[student.username]
+            self.assertEqual(self.cert(student).key, key)
+            # written before the request went out
+            self.assertEqual(cert_when_sent.status, CertificateStatuses.generating)
+
+        # unchanged certificates aren't written
+        self.assertEqual(self.cert(self.failing).modified_date, self.long_ago)
+        self.assertEqual(self.cert(self.downloadable).modified_date, self.long_ago)
+        self.assertNotEqual(self.cert(self.existing).modified_date, self.long_ago)
+
+    def test_add_certs_queue_failure(self, send_many):
+        other = UserFactory.create(username='pass_other')
+        self.sent(send_many, fail=['pass_existing', 'pass_new'])
+
+        results = dict(XQueueCertInterface().add_certs(self.students + [other], COURSE_ID, course=Mock()))
+
+        # put back as they were, to be retried by the next run
+        self.assertEqual(results[self.existing], None)
+        self.assertEqual(self.cert(self.existing).status, CertificateStatuses.unavailable)
+        self.assertEqual(self.cert(self.existing).key, '')
+        self.assertEqual(self.cert(self.existing).modified_date, self.long_ago)
+        self.assertEqual(results[self.new], None)
+        self.assertFalse(GeneratedCertificate.objects.filter(user=self.new, course_id=COURSE_ID).exists())
+
+        self.assertEqual(results[other], CertificateStatuses.unavailable)
+        self.assertEqual(self.cert(other).status, CertificateStatuses.generating)
+
+
+@patch('certificates.management.commands.ungenerated_certs.modulestore', Mock())
+@patch('certificates.management.commands.ungenerated_certs.XQueueCertInterface')
+class UngeneratedCertsTest(TestCase):
+
+    def setUp(self):
+        self.students = [CourseEnrollmentFactory.create(user=UserFactory.create(username='student%d' % n),
+                                                        course_id=COURSE_ID).user
+                         for n in range(5)]
+
+    def batches(self, xqueue_interface):
+        """
+        The lists of students add_certs was called with
+        """
+        add_certs = xqueue_interface.return_value.add_certs
+        return [call[0][0] for call in add_certs.call_args_list]
+
+    def test_batch_size(self, xqueue_interface):
+        xqueue_interface.return_value.add_certs.return_value = []
+        call_command('ungenerated_certs', course=COURSE_ID, batch_size=2)
+        self.assertEqual(self.batches(xqueue_interface),
+                         [self.students[0:2], self.students[2:4], self.students[4:]])
+
+    def test_start_after(self, xqueue_interface):
+        xqueue_interface.return_value.add_certs.return_value = []
+        call_command('ungenerated_certs', course=COURSE_ID, batch_size=2, start_after='student1')
+        self.assertEqual(self.batches(xqueue_interface), [self.students[2:4], self.students[4:]])
+
+    def test_only_unavailable(self, xqueue_interface):
+        xqueue_interface.return_value.add_certs.return_value = []
+        GeneratedCertificate.objects.create(user=self.students[1], course_id=COURSE_ID,
+                                            status=CertificateStatuses.downloadable)
+        call_command('ungenerated_certs', course=COURSE_ID, batch_size=10)
+        self.assertEqual(self.batches(xqueue_interface), [self.students[:1] + self.students[2:]])
@@ -7,18 +7,24 @@ from datetime import datetime, timedelta
 from functools import partial
 
 from django.conf import settings
-from django.contrib.auth.models import Group
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
 
 from xmodule.course_module import CourseDescriptor
 from xmodule.error_module import ErrorDescriptor
 from xmodule.modulestore import Location
 from xmodule.x_module import XModule, XModuleDescriptor
 
+from request_cache.middleware import RequestCache
 from student.models import CourseEnrollmentAllowed
 from courseware.masquerade import is_masquerading_as_student
 
 DEBUG_ACCESS = False
 
+# key under which the per-request AccessContext is stored in the request cache
+ACCESS_CONTEXT_KEY = 'courseware_access_context'
+
 log = logging.getLogger(__name__)
 
 
@@ -35,6 +41,58 @@ def debug(*args, **kwargs):
         log.debug(*args, **kwargs)
 
 
+class AccessContext(object):
+    """
+    Request-scoped memo of everything has_access() needs to look up more than once:
+
+    - the names of each user's auth groups, as a frozenset (one auth_group query per user)
+    - the staff / instructor group names for each course, so they aren't rebuilt
+      for every descriptor in the course
+    - the results of has_access(user, obj, action, course_context)
+
+    An AccessContext is only active while courseware.middleware.AccessContextMiddleware
+    is processing a request; outside of that every check goes to the database as before.
+    """
+    def __init__(self):
+        self.user_groups = {}
+        self.course_groups = {}
+        self.results = {}
+
+    def clear(self):
+        """Forget everything, e.g. after group membership changed mid-request"""
+        self.user_groups.clear()
+        self.course_groups.clear()
+        self.results.clear()
+
+    @classmethod
+    def activate(cls):
+        """Install a fresh AccessContext for the current request and return it"""
+        context = cls()
+        RequestCache.get_request_cache().data[ACCESS_CONTEXT_KEY] = context
+        return context
+
+    @classmethod
+    def deactivate(cls):
+        """Remove the AccessContext for the current request, if any"""
+        RequestCache.get_request_cache().data.pop(ACCESS_CONTEXT_KEY, None)
+
+    @classmethod
+    def current(cls):
+        """Return the active AccessContext, or None if there isn't one"""
+        return getattr(RequestCache.get_request_cache(), 'data', {}).get(ACCESS_CONTEXT_KEY)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def _clear_access_context_on_group_change(sender, **kwargs):
+    """
+    Group membership is part of what the AccessContext memoizes, so drop it
+    whenever a user is added to or removed from a group.
+    """
+    context = AccessContext.current()
+    if context is not None:
+        context.clear()
+
+
 def has_access(user, obj, action, course_context=None):
     """
     Check whether a user has the access to do action on obj.  Handles any magic
@@ -61,6 +119,50 @@ def has_access(user, obj, action, course_context=None):
 
     Returns a bool.  It is up to the caller to actually deny access in a way
     that makes sense in context.
+
+    Within a request the result is memoized in the active AccessContext.
+    """
+    context = AccessContext.current()
+    if context is None:
+        return _has_access(user, obj, action, course_context)
+
+    key = _access_memo_key(user, obj, action, course_context)
+    if key is None:
+        return _has_access(user, obj, action, course_context)
+
+    if key not in context.results:
+        context.results[key] = _has_access(user, obj, action, course_context)
+    return context.results[key]
+
+
+def _access_memo_key(user, obj, action, course_context):
+    """
+    Build the key has_access() results are memoized under, or None if this
+    check shouldn't be memoized.
+
+    XModules aren't memoized themselves: they delegate to their descriptor,
+    which is.
+    """
+    if isinstance(obj, XModule):
+        return None
+
+    if isinstance(obj, XModuleDescriptor):
+        obj_key = obj.location.url()
+    elif isinstance(obj, Location):
+        obj_key = obj.url()
+    elif isinstance(obj, basestring):
+        obj_key = obj
+    else:
+        return None
+
+    user_id = getattr(user, 'id', None) if user is not None else None
+    return (user_id, is_masquerading_as_student(user), type(obj).__name__,
+            obj_key, action, course_context)
+
+
+def _has_access(user, obj, action, course_context=None):
+    """
+    Does the actual work of has_access(), without memoization.
     """
     # delegate the work to type-specific functions.
     # (start with more specific types, then get more general)
@@ -388,6 +490,63 @@ def group_names_for(role, location, course_context=None):
 group_names_for_staff = partial(group_names_for, 'staff')
 group_names_for_instructor = partial(group_names_for, 'instructor')
 
+
+def _user_group_names(user):
+    """
+    Returns a frozenset of the names of the auth groups user belongs to.
+
+    Loaded once per user per request when an AccessContext is active.
+    """
+    context = AccessContext.current()
+    if context is None:
+        return frozenset(g.name for g in user.groups.all())
+
+    if user.id not in context.user_groups:
+        context.user_groups[user.id] = frozenset(g.name for g in user.groups.all())
+    return context.user_groups[user.id]
+
+
+def _course_access_group_names(location, course_context=None):
+    """
+    Returns (staff_groups, instructor_groups), the lists of group names that give
+    staff and instructor access to location in the context of a course run.
+
+    These only depend on the course, so when an AccessContext is active they
+    are computed once per course per request.
+    """
+    loc = Location(location)
+    course_id = loc.course_id if loc.category == 'course' else course_context
+    if course_id is None:
+        raise CourseContextRequired()
+
+    context = AccessContext.current()
+    key = (loc.course, course_id)
+    if context is not None and key in context.course_groups:
+        return context.course_groups[key]
+
+    group_names = (
+        group_names_for_staff(location, course_context) +
+        [_course_org_staff_group_name(location, course_context)],
+        group_names_for_instructor(location, course_context) +
+        [_course_org_instructor_group_name(location, course_context)],
+    )
+    if context is not None:
+        context.course_groups[key] = group_names
+    return group_names
+
+def course_staff_group_names(course):
+    """
+    Returns the names of all the groups whose members have staff access to
+    course (a CourseDescriptor): the staff and instructor groups for the course,
+    their legacy names, and the org-wide staff and instructor groups.
+
+    For set-based checks over many users at once; has_access is the way to
+    check a single user.
+    """
+    staff_groups, instructor_groups = _course_access_group_names(course.location)
+    return staff_groups + instructor_groups
+
+
 def _course_staff_group_name(location, course_context=None):
     """
     Get the name of the staff group for a location in the context of a course run.
@@ -500,7 +659,7 @@ def _adjust_start_date_for_beta_testers(user, descriptor):
         # bail early if no beta testing is set up
         return descriptor.lms.start
 
-    user_groups = [g.name for g in user.groups.all()]
+    user_groups = _user_group_names(user)
 
     beta_group = course_beta_test_group_name(descriptor.location)
     if beta_group in user_groups:
@@ -553,11 +712,10 @@ def _has_access_to_location(user, location, access_level, course_context):
         return True
 
     # If not global staff, is the user in the Auth group for this class?
-    user_groups = [g.name for g in user.groups.all()]
+    user_groups = _user_group_names(user)
+    staff_groups, instructor_groups = _course_access_group_names(location, course_context)
 
     if access_level == 'staff':
-        staff_groups = group_names_for_staff(location, course_context) + \
-                       [_course_org_staff_group_name(location, course_context)]
         for staff_group in staff_groups:
             if staff_group in user_groups:
                 debug("Allow: user in group %s", staff_group)
@@ -565,8 +723,6 @@ def _has_access_to_location(user, location, access_level, course_context):
         debug("Deny: user not in groups %s", staff_groups)
 
     if access_level == 'instructor' or access_level == 'staff': 	# instructors get staff privileges
-        instructor_groups = group_names_for_instructor(location, course_context) + \
-                            [_course_org_instructor_group_name(location, course_context)]
         for instructor_group in instructor_groups:
             if instructor_group in user_groups:
                 debug("Allow: user in group %s", instructor_group)
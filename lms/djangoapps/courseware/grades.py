@@ -1,23 +1,57 @@
 # Compute grades using real division, with no integer truncation
 from __future__ import division
 
+import json
 import random
 import logging
 
 from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
 from django.conf import settings
-from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 
-from .model_data import ModelDataCache, LmsKeyValueStore
+from .model_data import ModelDataCache, LmsKeyValueStore, chunks
 from xblock.core import Scope
 from .module_render import get_module, get_module_for_descriptor
+from util.cache import cache
 from xmodule import graders
-from xmodule.capa_module import CapaModule
+from xmodule.capa_module import CapaModule, CapaDescriptor
 from xmodule.graders import Score
-from .models import StudentModule
+from xmodule.modulestore.django import modulestore
+from .models import CountedStudentAnswers, CourseAnswerCounts, StudentModule
 
 log = logging.getLogger("mitx.courseware")
 
+# How long after a StudentModule is modified it may still be committed, and
+# so must be read again by the next incremental answer distribution
+ANSWER_COUNTS_SLACK = timedelta(minutes=5)
+
+
+def grading_context_for_course(course):
+    """
+    Returns course.grading_context, without walking the course tree if we can help it.
+
+    The structure of the grading context (locations, section formats and which
+    sections are graded) is cached per course content version, and rehydrated
+    by loading descriptors by location. Modulestores that don't track content
+    versions fall back to course.grading_context.
+    """
+    version = modulestore().get_course_content_version(course.location)
+    if version is None:
+        return course.grading_context
+
+    key = u"grading_context.{0}.{1}".format(course.id, version)
+    structure = cache.get(key)
+    if structure is None:
+        grading_context = course.grading_context
+        cache.set(key, course.grading_context_structure())
+        return grading_context
+
+    return course.load_grading_context(structure)
+
 
 def yield_module_descendents(module):
     stack = module.get_display_items()
@@ -56,7 +90,7 @@ def yield_problems(request, course, student):
     potentially answered.  (all that student has answered will definitely be in
     the list, but there may be others as well).
     """
-    grading_context = course.grading_context
+    grading_context = grading_context_for_course(course)
 
     descriptor_locations = (descriptor.location.url() for descriptor in grading_context['all_descriptors'])
     existing_student_modules = set(StudentModule.objects.filter(
@@ -92,7 +126,141 @@ def yield_problems(request, course, student):
                 yield problem
 
 
-def answer_distributions(request, course):
+def graded_problem_descriptors(course):
+    """
+    Returns a dict mapping location url -> descriptor for every capa problem in
+    the graded sections of course.
+    """
+    grading_context = grading_context_for_course(course)
+    problems = {}
+    for sections in grading_context['graded_sections'].itervalues():
+        for section in sections:
+            for descriptor in section['xmoduledescriptors']:
+                if isinstance(descriptor, CapaDescriptor):
+                    problems[descriptor.location.url()] = descriptor
+    return problems
+
+
+def iter_student_answers(course_id, module_state_keys, since=None, chunk_size=500):
+    """
+    Yields (id, module_state_key, student_answers) for every StudentModule
+    of an enrolled student in course_id for the given module_state_keys, straight
+    from the stored state, without instantiating any modules. student_answers
+    is {} for problems that haven't been answered.
+
+    If since is given, only the StudentModules modified since then, or not yet
+    in the course's CountedStudentAnswers, are yielded.
+
+    Rows are streamed from the database with iterator(), so memory use doesn't
+    grow with the number of students.
+    """
+    for chunk in chunks(module_state_keys, chunk_size):
+        rows = StudentModule.objects.filter(
+            course_id=course_id,
+            module_state_key__in=chunk,
+            student__courseenrollment__course_id=course_id,
+        )
+        if since is not None:
+            counted = CountedStudentAnswers.objects.filter(course_id=course_id).values('student_module_id')
+            rows = rows.filter(Q(modified__gte=since) | ~Q(id__in=counted))
+        for student_module_id, module_state_key, state in rows.values_list('id', 'module_state_key', 'state').iterator():
+            try:
+                student_answers = json.loads(state).get('student_answers') if state else None
+            except ValueError:
+                log.warning("Invalid JSON state for %s in %s", module_state_key, course_id)
+                continue
+            yield student_module_id, module_state_key, student_answers or {}
+
+
+def _count_answers(counts, module_state_key, student_answers, delta):
+    """
+    Adds delta to the count of each of student_answers in counts, a dict
+    module_state_key -> problem_id -> answer -> count
+    """
+    for problem_id, answer in student_answers.iteritems():
+        answers = counts.setdefault(module_state_key, {}).setdefault(problem_id, {})
+        # Answer can be a list or some other unhashable element.  Convert to string.
+        answer = str(answer)
+        answers[answer] = answers.get(answer, 0) + delta
+        if not answers[answer]:
+            del answers[answer]
+
+
+@transaction.commit_on_success
+def update_answer_counts(course_id, module_state_keys, chunk_size=500):
+    """
+    Brings the CourseAnswerCounts of course_id up to date for the problems
+    module_state_keys, and returns its counts, a dict
+    module_state_key -> problem_id -> answer -> count.
+
+    Only the StudentModules modified since the last update are read: the
+    answers they were counted with before, kept in CountedStudentAnswers, are
+    taken back out of the counts and their current answers put in.
+    """
+    CourseAnswerCounts.objects.get_or_create(course_id=course_id)
+    # Lock the counts, so that concurrent updates don't count the same changes twice
+    answer_counts = CourseAnswerCounts.objects.select_for_update().get(course_id=course_id)
+    counts = json.loads(answer_counts.counts)
+    started = timezone.now()
+
+    counted = CountedStudentAnswers.objects.filter(course_id=course_id)
+
+    # Forget the problems that are no longer in the course
+    dropped = set(counted.values_list('module_state_key', flat=True).distinct()) - set(module_state_keys)
+    for module_state_key in dropped:
+        counts.pop(module_state_key, None)
+    for chunk in chunks(dropped, chunk_size):
+        counted.filter(module_state_key__in=chunk).delete()
+
+    # Take out the answers of StudentModules that have been deleted, or whose
+    # students have unenrolled, since they were counted
+    current = StudentModule.objects.filter(course_id=course_id, student__courseenrollment__course_id=course_id)
+    stale = counted.exclude(student_module_id__in=current.values('id'))
+    stale_ids = []
+    for student_module_id, module_state_key, answers in stale.values_list(
+            'student_module_id', 'module_state_key', 'answers').iterator():
+        _count_answers(counts, module_state_key, json.loads(answers), -1)
+        stale_ids.append(student_module_id)
+    for chunk in chunks(stale_ids, chunk_size):
+        counted.filter(student_module_id__in=chunk).delete()
+
+    rows = iter_student_answers(course_id, module_state_keys, since=answer_counts.watermark)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            break
+
+        previous = dict(counted.filter(
+            student_module_id__in=[student_module_id for student_module_id, _, _ in batch]
+        ).values_list('student_module_id', 'answers'))
+
+        new_snapshots = []
+        for student_module_id, module_state_key, student_answers in batch:
+            answers = json.dumps(student_answers, sort_keys=True)
+            if student_module_id not in previous:
+                new_snapshots.append(CountedStudentAnswers(
+                    student_module_id=student_module_id,
+                    course_id=course_id,
+                    module_state_key=module_state_key,
+                    answers=answers,
+                ))
+            elif previous[student_module_id] != answers:
+                _count_answers(counts, module_state_key, json.loads(previous[student_module_id]), -1)
+                counted.filter(student_module_id=student_module_id).update(answers=answers)
+            else:
+                continue
+            _count_answers(counts, module_state_key, student_answers, 1)
+        CountedStudentAnswers.objects.bulk_create(new_snapshots)
+
+    # Rows are committed some time after they are modified, so leave some slack
+    # for those committed after we read past them to be read by the next update
+    answer_counts.watermark = started - ANSWER_COUNTS_SLACK
+    answer_counts.counts = json.dumps(counts)
+    answer_counts.save()
+    return counts
+
+
+def answer_distributions(course, incremental=False):
     """
     Given a course_descriptor, compute frequencies of answers for each problem:
 
@@ -100,21 +268,27 @@ def answer_distributions(request, course):
 
     dict: (problem url_name, problem display_name, problem_id) -> (dict : answer ->  count)
 
-    TODO (vshnayder): this is currently doing a full linear pass through all
-    students and all problems.  This will be just a little slow.
+    This is a single pass over the stored StudentModule state for the graded
+    problems in the course; no problems are instantiated. If incremental is
+    True, only the state modified since the last incremental call is read,
+    and the rest of the counts come from the course's CourseAnswerCounts.
     """
 
-    counts = defaultdict(lambda: defaultdict(int))
+    problems = graded_problem_descriptors(course)
 
-    enrolled_students = User.objects.filter(courseenrollment__course_id=course.id)
+    if incremental:
+        answer_counts = update_answer_counts(course.id, problems.keys())
+    else:
+        answer_counts = {}
+        for _, module_state_key, student_answers in iter_student_answers(course.id, problems.keys()):
+            _count_answers(answer_counts, module_state_key, student_answers, 1)
 
-    for student in enrolled_students:
-        for capa_module in yield_problems(request, course, student):
-            for problem_id in capa_module.lcp.student_answers:
-                # Answer can be a list or some other unhashable element.  Convert to string.
-                answer = str(capa_module.lcp.student_answers[problem_id])
-                key = (capa_module.url_name, capa_module.display_name_with_default, problem_id)
-                counts[key][answer] += 1
+    counts = defaultdict(lambda: defaultdict(int))
+    for module_state_key, problem in problems.iteritems():
+        for problem_id, answers in answer_counts.get(module_state_key, {}).iteritems():
+            if answers:
+                key = (problem.url_name, problem.display_name_with_default, problem_id)
+                counts[key].update(answers)
 
     return counts
 
@@ -138,12 +312,16 @@ def grade(student, request, course, model_data_cache=None, keep_raw_scores=False
     More information on the format is in the docstring for CourseGrader.
     """
 
-    grading_context = course.grading_context
+    grading_context = grading_context_for_course(course)
     raw_scores = []
 
     if model_data_cache is None:
         model_data_cache = ModelDataCache(grading_context['all_descriptors'], course.id, student)
 
+    # The set of modules the student has any state for, out of those the
+    # model_data_cache holds
+    touched_module_state_keys = model_data_cache.touched_module_state_keys()
+
     totaled_scores = {}
     # This next complicated loop is just to collect the totaled_scores, which is
     # passed to the grader
@@ -162,15 +340,7 @@ def grade(student, request, course, model_data_cache=None, keep_raw_scores=False
                     should_grade_section = True
                     break
 
-                # Create a fake key to pull out a StudentModule object from the ModelDataCache
-
-                key = LmsKeyValueStore.Key(
-                    Scope.user_state,
-                    student.id,
-                    moduledescriptor.location,
-                    None
-                )
-                if model_data_cache.find(key):
+                if moduledescriptor.location.url() in touched_module_state_keys:
                     should_grade_section = True
                     break
 
@@ -0,0 +1,23 @@
+'''
+Rebuild the per-module grade counts used by the staff grade histograms
+(courseware.models.StudentModuleGradeCount) from the StudentModules of a course.
+
+The counts are normally kept up to date as grades change; run this
+periodically, or after StudentModules have been changed directly in the
+database, to correct any drift.
+'''
+from django.core.management.base import BaseCommand, CommandError
+
+from courseware.models import StudentModuleGradeCount
+
+
+class Command(BaseCommand):
+    args = "<course_id course_id ...>"
+    help = "Recount the grades used for the staff grade histograms of the given courses"
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError("At least one course_id is required")
+        for course_id in args:
+            count = StudentModuleGradeCount.refresh(course_id)
+            print "{0}: refreshed grade counts for {1} modules".format(course_id, count)
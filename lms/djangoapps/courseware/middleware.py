@@ -0,0 +1,26 @@
+"""
+Middleware for courseware
+"""
+from courseware.access import AccessContext
+
+
+class AccessContextMiddleware(object):
+    """
+    Scopes a courseware.access.AccessContext to each request, so that group
+    memberships and has_access() results are looked up once per request rather
+    than once per descriptor.
+
+    Must come after request_cache.middleware.RequestCache, which clears the
+    request cache at the start of each request.
+    """
+    def process_request(self, request):
+        AccessContext.activate()
+        return None
+
+    def process_response(self, request, response):
+        AccessContext.deactivate()
+        return response
+
+    def process_exception(self, request, exception):
+        AccessContext.deactivate()
+        return None
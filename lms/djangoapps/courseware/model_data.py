@@ -32,10 +32,51 @@ def chunks(items, chunk_size):
     return (items[i:i + chunk_size] for i in xrange(0, len(items), chunk_size))
 
 
+def _intern(value):
+    """
+    Intern a location string used in a cache key, so that the many keys that
+    share a string share one copy of it.  Non-ascii strings are returned as-is
+    """
+    try:
+        return intern(str(value))
+    except UnicodeEncodeError:
+        return value
+
+
+class CachedRow(object):
+    """
+    A read-only view of a row fetched with `.values()`, giving attribute access
+    to its columns without the cost of instantiating a django model.
+
+    ModelDataCache.find_or_create promotes these to full model objects when a
+    field is actually written.
+    """
+    __slots__ = ('model_class', 'values')
+
+    def __init__(self, model_class, values):
+        self.model_class = model_class
+        self.values = values
+
+    def __getattr__(self, name):
+        try:
+            return self.values[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def to_model(self):
+        """
+        Return a model object for this row, without querying the database
+        """
+        return self.model_class(**self.values)
+
+
 class ModelDataCache(object):
     """
-    A cache of django model objects needed to supply the data
+    A cache of the data stored in courseware.models needed to supply the data
     for a module and its decendants
+
+    Rows are loaded with `.values()` and stored as CachedRows keyed by interned
+    location strings; they are only promoted to model objects when written.
     """
     def __init__(self, descriptors, course_id, user, select_for_update=False):
         '''
@@ -51,15 +92,29 @@ class ModelDataCache(object):
         select_for_update: True if rows should be locked until end of transaction
         '''
         self.cache = {}
-        self.descriptors = descriptors
+        self.descriptors = self._unique_descriptors(descriptors)
         self.select_for_update = select_for_update
         self.course_id = course_id
         self.user = user
 
         if user.is_authenticated():
             for scope, fields in self._fields_to_cache().items():
-                for field_object in self._retrieve_fields(scope, fields):
-                    self.cache[self._cache_key_from_field_object(scope, field_object)] = field_object
+                for model_class, row in self._retrieve_fields(scope, fields):
+                    self.cache[self._cache_key_from_row(scope, row)] = CachedRow(model_class, row)
+
+    @staticmethod
+    def _unique_descriptors(descriptors):
+        """
+        Return descriptors with any duplicate locations removed, preserving order
+        """
+        seen = set()
+        unique = []
+        for descriptor in descriptors:
+            url = descriptor.location.url()
+            if url not in seen:
+                seen.add(url)
+                unique.append(descriptor)
+        return unique
 
     @classmethod
     def cache_for_descriptor_descendents(cls, course_id, user, descriptor, depth=None,
@@ -75,44 +130,55 @@ class ModelDataCache(object):
             should be cached
         select_for_update: Flag indicating whether the rows should be locked until end of transaction
         """
-
-        def get_child_descriptors(descriptor, depth, descriptor_filter):
-            """
-            Return a list of all child descriptors down to the specified depth
-            that match the descriptor filter. Includes `descriptor`
-
-            descriptor: The parent to search inside
-            depth: The number of levels to descend, or None for infinite depth
-            descriptor_filter(descriptor): A function that returns True
-                if descriptor should be included in the results
-            """
-            if descriptor_filter(descriptor):
-                descriptors = [descriptor]
-            else:
-                descriptors = []
-
-            if depth is None or depth > 0:
-                new_depth = depth - 1 if depth is not None else depth
-
-                for child in descriptor.get_children() + descriptor.get_required_module_descriptors():
-                    descriptors.extend(get_child_descriptors(child, new_depth, descriptor_filter))
-
-            return descriptors
-
-        descriptors = get_child_descriptors(descriptor, depth, descriptor_filter)
-
+        descriptors = cls.descendent_descriptors(descriptor, depth, descriptor_filter)
         return ModelDataCache(descriptors, course_id, user, select_for_update)
 
+    @staticmethod
+    def descendent_descriptors(descriptor, depth=None, descriptor_filter=lambda descriptor: True):
+        """
+        Return a list of all descriptors below `descriptor` (inclusive) down to
+        the specified depth that match the descriptor filter, following both
+        children and required module descriptors.  Each location is included once.
+
+        descriptor: The parent to search inside
+        depth: The number of levels to descend, or None for infinite depth
+        descriptor_filter(descriptor): A function that returns True
+            if descriptor should be included in the results
+        """
+        descriptors = []
+        # map from location url to the largest remaining depth it was visited with
+        visited = {}
+        stack = [(descriptor, depth)]
+        while stack:
+            current, current_depth = stack.pop()
+            url = current.location.url()
+            if url in visited:
+                previous_depth = visited[url]
+                if previous_depth is None or (current_depth is not None and current_depth <= previous_depth):
+                    continue
+            elif descriptor_filter(current):
+                descriptors.append(current)
+            visited[url] = current_depth
+
+            if current_depth is None or current_depth > 0:
+                new_depth = current_depth - 1 if current_depth is not None else None
+                # push in reverse so that descendents come out in document order
+                children = list(current.get_children())
+                children.extend(current.get_required_module_descriptors())
+                stack.extend((child, new_depth) for child in reversed(children))
+
+        return descriptors
+
     def _query(self, model_class, **kwargs):
         """
         Queries model_class with **kwargs, optionally adding select_for_update if
-        self.select_for_update is set
+        self.select_for_update is set, returning the matching rows as dicts
         """
         query = model_class.objects
         if self.select_for_update:
             query = query.select_for_update()
-        query = query.filter(**kwargs)
-        return query
+        query = query.filter(**kwargs).values()
+        return ((model_class, row) for row in query)
 
     def _chunked_query(self, model_class, chunk_field, items, chunk_size=500, **kwargs):
         """
@@ -130,7 +196,8 @@ class ModelDataCache(object):
 
     def _retrieve_fields(self, scope, fields):
         """
-        Queries the database for all of the fields in the specified scope
+        Queries the database for all of the fields in the specified scope,
+        returning (model_class, row) pairs
         """
         if scope in (Scope.children, Scope.parent):
             return []
@@ -191,31 +258,41 @@ class ModelDataCache(object):
         Return the key used in the ModelDataCache for the specified KeyValueStore key
         """
         if key.scope == Scope.user_state:
-            return (key.scope, key.block_scope_id.url())
+            return (key.scope, _intern(key.block_scope_id.url()))
         elif key.scope == Scope.content:
-            return (key.scope, key.block_scope_id.url(), key.field_name)
+            return (key.scope, _intern(key.block_scope_id.url()), key.field_name)
         elif key.scope == Scope.settings:
-            return (key.scope, '%s-%s' % (self.course_id, key.block_scope_id.url()), key.field_name)
+            return (key.scope, _intern('%s-%s' % (self.course_id, key.block_scope_id.url())), key.field_name)
         elif key.scope == Scope.preferences:
             return (key.scope, key.block_scope_id, key.field_name)
         elif key.scope == Scope.user_info:
             return (key.scope, key.field_name)
 
-    def _cache_key_from_field_object(self, scope, field_object):
+    def _cache_key_from_row(self, scope, row):
         """
         Return the key used in the ModelDataCache for the specified scope and
-        field
+        row of column values
         """
         if scope == Scope.user_state:
-            return (scope, field_object.module_state_key)
+            return (scope, _intern(row['module_state_key']))
         elif scope == Scope.content:
-            return (scope, field_object.definition_id, field_object.field_name)
+            return (scope, _intern(row['definition_id']), row['field_name'])
         elif scope == Scope.settings:
-            return (scope, field_object.usage_id, field_object.field_name)
+            return (scope, _intern(row['usage_id']), row['field_name'])
         elif scope == Scope.preferences:
-            return (scope, field_object.module_type, field_object.field_name)
+            return (scope, row['module_type'], row['field_name'])
         elif scope == Scope.user_info:
-            return (scope, field_object.field_name)
+            return (scope, row['field_name'])
+
+    def touched_module_state_keys(self):
+        '''
+        Returns the set of module_state_keys of the StudentModules in this cache,
+        i.e. of the modules (among the descriptors the cache was built for, and
+        any created through it since) that this user has touched.
+
+        Read from the cache's Scope.user_state entries, without a query.
+        '''
+        return set(key[1] for key in self.cache if key[0] == Scope.user_state)
 
     def find(self, key):
         '''
@@ -223,16 +300,22 @@ class ModelDataCache(object):
 
         key: An `LmsKeyValueStore.Key` object selecting the object to find
 
-        returns the found object, or None if the object doesn't exist
+        returns the found object (either a CachedRow or, if it has been
+        written, a model object), or None if the object doesn't exist
         '''
         return self.cache.get(self._cache_key_from_kvs_key(key))
 
     def find_or_create(self, key):
         '''
         Find a model data object in this cache, or create it if it doesn't
-        exist
+        exist.  Always returns a model object, suitable for saving.
         '''
-        field_object = self.find(key)
+        cache_key = self._cache_key_from_kvs_key(key)
+        field_object = self.cache.get(cache_key)
+
+        if isinstance(field_object, CachedRow):
+            field_object = field_object.to_model()
+            self.cache[cache_key] = field_object
 
         if field_object is not None:
             return field_object
@@ -268,7 +351,6 @@ class ModelDataCache(object):
                 student=self.user,
             )
 
-        cache_key = self._cache_key_from_kvs_key(key)
         self.cache[cache_key] = field_object
         return field_object
 
@@ -352,10 +434,12 @@ class LmsKeyValueStore(KeyValueStore):
         if key.scope not in self._allowed_scopes:
             raise InvalidScopeError(key.scope)
 
-        field_object = self._model_data_cache.find(key)
-        if field_object is None:
+        if self._model_data_cache.find(key) is None:
             raise KeyError(key.field_name)
 
+        # find_or_create promotes the cached row to a model object we can write
+        field_object = self._model_data_cache.find_or_create(key)
+
         if key.scope == Scope.user_state:
             state = json.loads(field_object.state)
             del state[key.field_name]
@@ -14,7 +14,9 @@ ASSUMPTIONS: modules have unique IDs, even across different module_types
 """
 from django.contrib.auth.models import User
 from django.db import models
-from django.db.models.signals import post_save
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 
 class StudentModule(models.Model):
@@ -101,6 +103,131 @@ class StudentModuleHistory(models.Model):
             history_entry.save()
 
 
+class StudentModuleGradeCount(models.Model):
+    """
+    The number of StudentModules for a module with each grade, kept up to
+    date as StudentModules are saved and deleted, so that grade histograms
+    don't need an aggregate query over all of a module's StudentModules.
+
+    The counts for a course can be rebuilt from the StudentModules with
+    the refresh_grade_histograms management command.
+    """
+
+    class Meta:
+        unique_together = (('module_state_key', 'grade'),)
+
+    # stored as the grade of ungraded StudentModules: grade is part of the
+    # unique key, and NULLs never collide in a unique index
+    UNGRADED = -1.0
+
+    module_state_key = models.CharField(max_length=255, db_index=True, db_column='module_id')
+    grade = models.FloatField(default=UNGRADED)
+    count = models.IntegerField(default=0)
+
+    @classmethod
+    def _stored(cls, grade):
+        return cls.UNGRADED if grade is None else grade
+
+    @classmethod
+    def _histogram(cls, counts):
+        """
+        Returns [(grade, count)] for (stored grade, count) pairs, sorted by grade
+        """
+        return sorted((None if grade == cls.UNGRADED else grade, count) for grade, count in counts)
+
+    @classmethod
+    def histogram(cls, module_state_key):
+        """
+        Returns [(grade, count)] for module_state_key, sorted by grade,
+        for the grades with a non-zero count
+        """
+        return cls._histogram(cls.objects.filter(
+            module_state_key=module_state_key, count__gt=0
+        ).values_list('grade', 'count'))
+
+    @classmethod
+    def adjust(cls, module_state_key, grade, delta):
+        """
+        Add delta to the count of StudentModules for module_state_key with grade.
+
+        Nothing is stored for modules whose counts haven't been initialized
+        (see histogram_for_module), as there is nothing to adjust.
+        """
+        grade = cls._stored(grade)
+        counts = cls.objects.filter(module_state_key=module_state_key)
+        bucket = counts.filter(grade=grade)
+        if bucket.update(count=F('count') + delta) or delta < 0 or not counts.exists():
+            return
+        try:
+            sid = transaction.savepoint()
+            cls.objects.create(module_state_key=module_state_key, grade=grade, count=delta)
+            transaction.savepoint_commit(sid)
+        except IntegrityError:
+            # created by someone else in the meantime
+            transaction.savepoint_rollback(sid)
+            bucket.update(count=F('count') + delta)
+
+    @classmethod
+    def histogram_for_module(cls, module_state_key):
+        """
+        Returns [(grade, count)] for module_state_key, sorted by grade.
+
+        The first time a module is asked for, its counts are initialized with
+        an aggregate over its StudentModules.
+        """
+        histogram = cls.histogram(module_state_key)
+        if histogram or cls.objects.filter(module_state_key=module_state_key).exists():
+            return histogram
+
+        rows = StudentModule.objects.filter(module_state_key=module_state_key).values(
+            'grade').annotate(count=Count('id')).order_by()
+        counts = [cls(module_state_key=module_state_key, grade=cls._stored(row['grade']), count=row['count'])
+                  for row in rows]
+        if counts:
+            try:
+                sid = transaction.savepoint()
+                cls.objects.bulk_create(counts)
+                transaction.savepoint_commit(sid)
+            except IntegrityError:
+                # initialized by someone else in the meantime
+                transaction.savepoint_rollback(sid)
+        return cls._histogram((count.grade, count.count) for count in counts)
+
+    @classmethod
+    def refresh(cls, course_id):
+        """
+        Recount the grades of all StudentModules in course_id with a single
+        aggregate query, replacing the stored counts for its modules
+        """
+        rows = StudentModule.objects.filter(course_id=course_id).values(
+            'module_state_key', 'grade').annotate(count=Count('id')).order_by()
+        counts = [cls(module_state_key=row['module_state_key'], grade=cls._stored(row['grade']), count=row['count'])
+                  for row in rows]
+        module_state_keys = set(count.module_state_key for count in counts)
+        with transaction.commit_on_success():
+            for key in module_state_keys:
+                cls.objects.filter(module_state_key=key).delete()
+            cls.objects.bulk_create(counts)
+        return len(module_state_keys)
+
+    @receiver(post_init, sender=StudentModule)
+    def remember_grade(sender, instance, **kwargs):
+        instance._counted_grade = instance.grade
+
+    @receiver(post_save, sender=StudentModule)
+    def count_grade(sender, instance, created, **kwargs):
+        if created:
+            StudentModuleGradeCount.adjust(instance.module_state_key, instance.grade, 1)
+        elif instance.grade != instance._counted_grade:
+            StudentModuleGradeCount.adjust(instance.module_state_key, instance._counted_grade, -1)
+            StudentModuleGradeCount.adjust(instance.module_state_key, instance.grade, 1)
+        instance._counted_grade = instance.grade
+
+    @receiver(post_delete, sender=StudentModule)
+    def uncount_grade(sender, instance, **kwargs):
+        StudentModuleGradeCount.adjust(instance.module_state_key, instance._counted_grade, -1)
+
+
 class XModuleContentField(models.Model):
     """
     Stores data set in the Scope.content scope by an xmodule field
@@ -262,3 +389,36 @@ class OfflineComputedGradeLog(models.Model):
 
     def __unicode__(self):
         return "[OCGLog] %s: %s" % (self.course_id, self.created)
+
+
+class CourseAnswerCounts(models.Model):
+    """
+    The answer distribution of a course, kept so that it can be brought up
+    to date from just the StudentModules modified since it was computed.
+    See courseware.grades.answer_distributions.
+    """
+    course_id = models.CharField(max_length=255, unique=True)
+
+    # StudentModules modified since this are read again by the next update
+    watermark = models.DateTimeField(null=True, blank=True)
+
+    # module_state_key -> problem_id -> answer -> count, as JSON
+    counts = models.TextField(default='{}')
+
+    def __unicode__(self):
+        return "[CourseAnswerCounts] %s (%s)" % (self.course_id, self.watermark)
+
+
+class CountedStudentAnswers(models.Model):
+    """
+    The student_answers of a StudentModule as they are counted in its
+    course's CourseAnswerCounts, so that they can be taken back out of the
+    counts when they change, or the StudentModule goes away.
+    """
+    student_module_id = models.IntegerField(unique=True)
+    course_id = models.CharField(max_length=255, db_index=True)
+    module_state_key = models.CharField(max_length=255, db_column='module_id')
+    answers = models.TextField()  # student_answers, stored as JSON
+
+    def __unicode__(self):
+        return "[CountedStudentAnswers] %s: %s" % (self.student_module_id, self.module_state_key)
@@ -50,6 +50,10 @@ xqueue_interface = XQueueInterface(
     settings.XQUEUE_INTERFACE['url'],
     settings.XQUEUE_INTERFACE['django_auth'],
     requests_auth,
+    pool_size=settings.XQUEUE_INTERFACE.get('pool_size', 10),
+    timeout=settings.XQUEUE_INTERFACE.get('timeout'),
+    retries=settings.XQUEUE_INTERFACE.get('retries', 0),
+    outbox_path=settings.XQUEUE_INTERFACE.get('outbox_path'),
 )
 
 
@@ -112,3 +112,42 @@ class AccessTestCase(TestCase):
 
         # TODO:
         # Non-staff cannot enroll outside the open enrollment period if not specifically allowed
+
+
+class AccessContextTestCase(TestCase):
+    def setUp(self):
+        access.AccessContext.activate()
+
+    def tearDown(self):
+        access.AccessContext.deactivate()
+
+    def test_user_groups_loaded_once(self):
+        location = Location('i4x://edX/toy/course/2012_Fall')
+        u = Mock(is_staff=False, id=1)
+        g = Mock()
+        g.name = 'staff_edX/toy/2012_Fall'
+        u.groups.all.return_value = [g]
+
+        self.assertTrue(access._has_access_to_location(u, location, 'staff', None))
+        self.assertFalse(access._has_access_to_location(u, location, 'instructor', None))
+        self.assertEqual(u.groups.all.call_count, 1)
+
+    def test_has_access_memoized(self):
+        location = Location('i4x://edX/toy/course/2012_Fall')
+        u = Mock(is_staff=False, id=1, masquerade_as_student=False)
+        g = Mock()
+        g.name = 'staff_edX/toy/2012_Fall'
+        u.groups.all.return_value = [g]
+
+        self.assertTrue(access.has_access(u, location, 'staff'))
+        # the result is memoized for the rest of the request...
+        g.name = 'student_only'
+        self.assertTrue(access.has_access(u, location, 'staff'))
+
+        # ...but not once the request is over
+        access.AccessContext.deactivate()
+        self.assertFalse(access.has_access(u, location, 'staff'))
+
+    def test_no_context_outside_request(self):
+        access.AccessContext.deactivate()
+        self.assertIsNone(access.AccessContext.current())
@@ -0,0 +1,60 @@
+from django.test import TestCase
+
+from courseware.models import StudentModule, StudentModuleGradeCount
+from courseware.tests.factories import StudentModuleFactory
+from xmodule_modifiers import grade_histogram
+
+MODULE = 'i4x://MITx/999/problem/p1'
+COURSE_ID = 'MITx/999/Robot_Super_Course'
+
+
+class TestStudentModuleGradeCount(TestCase):
+
+    def create(self, grade):
+        return StudentModuleFactory.create(module_state_key=MODULE, course_id=COURSE_ID, grade=grade)
+
+    def test_initialized_from_student_modules(self):
+        self.create(1)
+        self.create(1)
+        self.create(2)
+        self.assertEquals([(1, 2), (2, 1)], StudentModuleGradeCount.histogram_for_module(MODULE))
+        self.assertEquals([(1, 2), (2, 1)], StudentModuleGradeCount.histogram(MODULE))
+
+    def test_updated_as_grades_change(self):
+        module = self.create(0)
+        StudentModuleGradeCount.histogram_for_module(MODULE)
+
+        module.grade = 1
+        module.save()
+        self.create(1)
+        self.assertEquals([(1, 2)], StudentModuleGradeCount.histogram(MODULE))
+
+        StudentModule.objects.get(id=module.id).delete()
+        self.assertEquals([(1, 1)], StudentModuleGradeCount.histogram(MODULE))
+
+    def test_refresh(self):
+        self.create(1)
+        StudentModuleGradeCount.histogram_for_module(MODULE)
+        StudentModule.objects.filter(module_state_key=MODULE).update(grade=2)
+        self.assertEquals([(1, 1)], StudentModuleGradeCount.histogram(MODULE))
+
+        StudentModuleGradeCount.refresh(COURSE_ID)
+        self.assertEquals([(2, 1)], StudentModuleGradeCount.histogram(MODULE))
+
+    def test_grade_histogram(self):
+        self.create(1)
+        self.assertEquals([(1, 1)], grade_histogram(MODULE))
+        self.create(None)
+        self.assertEquals([], grade_histogram(MODULE))
+
+    def test_ungraded_counted_in_one_bucket(self):
+        self.create(1)
+        StudentModuleGradeCount.histogram_for_module(MODULE)
+        self.create(None)
+        self.create(None)
+        self.assertEquals([(None, 2), (1, 1)], StudentModuleGradeCount.histogram(MODULE))
+        self.assertEquals(1, StudentModuleGradeCount.objects.filter(
+            module_state_key=MODULE, grade=StudentModuleGradeCount.UNGRADED).count())
+
+        StudentModuleGradeCount.refresh(COURSE_ID)
+        self.assertEquals([(None, 2), (1, 1)], StudentModuleGradeCount.histogram(MODULE))
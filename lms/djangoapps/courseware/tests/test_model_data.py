@@ -3,7 +3,7 @@ from mock import Mock
 from functools import partial
 
 from courseware.model_data import LmsKeyValueStore, InvalidWriteError
-from courseware.model_data import InvalidScopeError, ModelDataCache
+from courseware.model_data import InvalidScopeError, ModelDataCache, CachedRow
 from courseware.models import StudentModule, XModuleContentField, XModuleSettingsField
 from courseware.models import XModuleStudentInfoField, XModuleStudentPrefsField
 
@@ -138,6 +138,21 @@ class TestStudentModuleStorage(TestCase):
         "Test that `has` returns False for missing fields in StudentModule"
         self.assertFalse(self.kvs.has(user_state_key('not_a_field')))
 
+    def test_read_does_not_instantiate_model(self):
+        "Test that reading a field leaves the cached row as a CachedRow"
+        self.kvs.get(user_state_key('a_field'))
+        self.assertIsInstance(self.mdc.find(user_state_key('a_field')), CachedRow)
+
+    def test_touched_module_state_keys(self):
+        "Test that touched_module_state_keys includes modules with a StudentModule, from the cache"
+        with self.assertNumQueries(0):
+            self.assertEquals(set([location('def_id').url()]), self.mdc.touched_module_state_keys())
+
+    def test_write_promotes_to_model(self):
+        "Test that writing a field promotes the cached row to a StudentModule"
+        self.kvs.set(user_state_key('a_field'), 'new_value')
+        self.assertIsInstance(self.mdc.find(user_state_key('a_field')), StudentModule)
+
 
 class TestMissingStudentModule(TestCase):
     def setUp(self):
@@ -166,6 +181,12 @@ class TestMissingStudentModule(TestCase):
         self.assertEquals(location('def_id').url(), student_module.module_state_key)
         self.assertEquals(course_id, student_module.course_id)
 
+    def test_set_field_marks_module_touched(self):
+        "Test that creating a StudentModule adds it to touched_module_state_keys"
+        self.assertEquals(set(), self.mdc.touched_module_state_keys())
+        self.kvs.set(user_state_key('a_field'), 'a_value')
+        self.assertEquals(set([location('def_id').url()]), self.mdc.touched_module_state_keys())
+
     def test_delete_field_from_missing_student_module(self):
         "Test that deleting a field from a missing StudentModule raises a KeyError"
         self.assertRaises(KeyError, self.kvs.delete, user_state_key('a_field'))
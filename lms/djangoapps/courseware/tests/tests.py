@@ -24,7 +24,7 @@ from courseware.model_data import ModelDataCache
 from courseware.access import (has_access, _course_staff_group_name,
                                course_beta_test_group_name)
 
-from student.models import Registration
+from student.models import CourseEnrollment, Registration
 from xmodule.error_module import ErrorDescriptor
 from xmodule.modulestore.django import modulestore
 from xmodule.modulestore import Location
@@ -969,6 +969,47 @@ class TestCourseGrader(TestSubmittingProblems):
         self.submit_question_answer('FinalQuestion', {'2_1': 'Correct', '2_2': 'Correct'})
         self.check_grade_percent(1.0)   # Hooray! We got 100%
 
+    def h1p1_distribution(self, incremental=False):
+        """Returns the answer distribution of H1P1, as a dict problem_id -> answer -> count"""
+        distributions = grades.answer_distributions(self.course, incremental=incremental)
+        return dict(((problem_id, dict(answers))
+                     for (url_name, _, problem_id), answers in distributions.items()
+                     if url_name == 'H1P1'))
+
+    def test_answer_distributions(self):
+        self.submit_question_answer('H1P1', {'2_1': 'Correct', '2_2': 'Incorrect'})
+
+        self.assertEqual(self.h1p1_distribution(), {
+            'i4x-edX-graded-problem-H1P1_2_1': {'Correct': 1},
+            'i4x-edX-graded-problem-H1P1_2_2': {'Incorrect': 1},
+        })
+
+    def test_incremental_answer_distributions(self):
+        self.submit_question_answer('H1P1', {'2_1': 'Correct', '2_2': 'Incorrect'})
+
+        expected = {
+            'i4x-edX-graded-problem-H1P1_2_1': {'Correct': 1},
+            'i4x-edX-graded-problem-H1P1_2_2': {'Incorrect': 1},
+        }
+        self.assertEqual(self.h1p1_distribution(incremental=True), expected)
+        # Unchanged answers aren't counted again
+        self.assertEqual(self.h1p1_distribution(incremental=True), expected)
+
+        self.reset_question_answer('H1P1')
+        self.submit_question_answer('H1P1', {'2_1': 'Incorrect', '2_2': 'Incorrect'})
+
+        # The changed answer replaces the one counted before
+        expected = {
+            'i4x-edX-graded-problem-H1P1_2_1': {'Incorrect': 1},
+            'i4x-edX-graded-problem-H1P1_2_2': {'Incorrect': 1},
+        }
+        self.assertEqual(self.h1p1_distribution(incremental=True), expected)
+        self.assertEqual(self.h1p1_distribution(), expected)
+
+        # Answers of students who unenroll are taken back out
+        CourseEnrollment.objects.filter(user=self.student_user, course_id=self.course.id).delete()
+        self.assertEqual(self.h1p1_distribution(incremental=True), {})
+
 
 @override_settings(MODULESTORE=TEST_DATA_XML_MODULESTORE)
 class TestSchematicResponse(TestSubmittingProblems):
@@ -0,0 +1,173 @@
+"""
+Set-based enrollment of many students in a course at once, used by the
+instructor dashboard and the bulk_enroll management command.
+
+Rather than querying and saving one address at a time, all addresses are
+resolved with chunked __in queries, the changes are worked out in memory,
+and then applied with bulk_create and set-based deletes in one transaction.
+"""
+import logging
+import re
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+
+from courseware.access import course_staff_group_names
+from courseware.model_data import chunks
+from django_comment_common.models import Role, FORUM_ROLE_MODERATOR, FORUM_ROLE_STUDENT
+from student.models import (CourseEnrollment, CourseEnrollmentAllowed, adjust_course_enrollment_count,
+                            deferred_enrollment_counts)
+
+log = logging.getLogger(__name__)
+
+# Keep the number of parameters in a single query under sqlite3's limit
+QUERY_CHUNK_SIZE = 500
+
+
+def split_emails(students):
+    """
+    Return the list of addresses in students, a string of emails separated by
+    commas or whitespace, in order and without duplicates or empty entries.
+    """
+    emails = []
+    seen = set()
+    for email in re.split(r'[\s,]', students):
+        email = str(email.strip())
+        if email and email not in seen:
+            seen.add(email)
+            emails.append(email)
+    return emails
+
+
+def _chunked_values_list(queryset, field, values, *fields):
+    """
+    Runs queryset.filter(field__in=chunk).values_list(*fields) for each chunk
+    of values, and returns all the resulting rows
+    """
+    rows = []
+    for chunk in chunks(values, QUERY_CHUNK_SIZE):
+        rows.extend(queryset.filter(**{field + '__in': chunk}).values_list(*fields))
+    return rows
+
+
+def _staff_user_ids(course, course_id):
+    """
+    Returns the ids of the enrolled users who have staff access to course:
+    global staff, and members of any of the course's staff or instructor groups
+    """
+    return set(User.objects.filter(
+        Q(is_staff=True) | Q(groups__name__in=course_staff_group_names(course)),
+        courseenrollment__course_id=course_id,
+    ).values_list('id', flat=True))
+
+
+def _assign_default_forum_roles(course_id, users):
+    """
+    Give each of users, a list of (id, is_staff) pairs, the default forum role
+    for course_id, as django_comment_common.models.assign_default_role does for
+    each saved CourseEnrollment (bulk_create doesn't send post_save).
+    """
+    if not users:
+        return
+
+    roles = {
+        True: Role.objects.get_or_create(course_id=course_id, name=FORUM_ROLE_MODERATOR)[0],
+        False: Role.objects.get_or_create(course_id=course_id, name=FORUM_ROLE_STUDENT)[0],
+    }
+    membership = Role.users.through
+    existing = set(_chunked_values_list(
+        membership.objects.filter(role__in=roles.values()),
+        'user', [user_id for user_id, _ in users],
+        'role', 'user',
+    ))
+
+    membership.objects.bulk_create([
+        membership(role_id=roles[is_staff].id, user_id=user_id)
+        for user_id, is_staff in users
+        if (roles[is_staff].id, user_id) not in existing
+    ])
+
+
+def bulk_enroll_students(course, course_id, emails, overload=False):
+    """
+    Enroll each of emails (a list of addresses) in course.  Addresses that don't
+    belong to a user yet are added to the CourseEnrollmentAllowed list instead.
+
+    If overload is True, first un-enroll everyone not in emails who isn't
+    course staff, and clear the pending enrollment list.
+
+    Returns a dict mapping email -> what happened to it, with the same status
+    strings the instructor dashboard has always shown.
+    """
+    status = dict((email, 'unprocessed') for email in emails)
+    emails_lc = set(email.lower() for email in emails)
+
+    # the count adjustments for un-enrollments are applied once the transaction is committed
+    with deferred_enrollment_counts(), transaction.commit_on_success():
+        if overload:  	# delete all but staff
+            staff_ids = _staff_user_ids(course, course_id)
+            to_delete = []
+            enrollments = CourseEnrollment.objects.filter(course_id=course_id).values_list('id', 'user', 'user__email')
+            for enrollment_id, user_id, email in enrollments:
+                if user_id not in staff_ids and email.lower() not in emails_lc:
+                    status[email] = 'deleted'
+                    to_delete.append(enrollment_id)
+                else:
+                    status[email] = 'is staff'
+            for chunk in chunks(to_delete, QUERY_CHUNK_SIZE):
+                CourseEnrollment.objects.filter(id__in=chunk).delete()
+
+            ceaset = CourseEnrollmentAllowed.objects.filter(course_id=course_id)
+            for email in ceaset.values_list('email', flat=True):
+                status[email] = 'removed from pending enrollment list'
+            ceaset.delete()
+
+        # keyed by lowercased email, as email lookups are case-insensitive in MySQL
+        users = {}
+        for user_id, email, is_staff in _chunked_values_list(User.objects.all(), 'email', emails,
+                                                             'id', 'email', 'is_staff'):
+            users[email.lower()] = (user_id, is_staff)
+
+        enrolled_ids = set(uid for (uid,) in _chunked_values_list(
+            CourseEnrollment.objects.filter(course_id=course_id),
+            'user', [user_id for user_id, _ in users.values()],
+            'user',
+        ))
+
+        pending = [email for email in emails if email.lower() not in users]
+        already_allowed = set(email for (email,) in _chunked_values_list(
+            CourseEnrollmentAllowed.objects.filter(course_id=course_id),
+            'email', pending,
+            'email',
+        ))
+
+        new_enrollments = []
+        new_allowed = []
+        for email in emails:
+            user = users.get(email.lower())
+            if user is None:
+                # user not signed up yet, put in pending enrollment allowed table
+                if email in already_allowed:
+                    status[email] = 'user does not exist, enrollment already allowed, pending'
+                else:
+                    new_allowed.append(CourseEnrollmentAllowed(email=email, course_id=course_id))
+                    status[email] = 'user does not exist, enrollment allowed, pending'
+            elif user[0] in enrolled_ids:
+                status[email] = 'already enrolled'
+            else:
+                new_enrollments.append(user)
+                enrolled_ids.add(user[0])
+                status[email] = 'added'
+
+        CourseEnrollmentAllowed.objects.bulk_create(new_allowed)
+        CourseEnrollment.objects.bulk_create([
+            CourseEnrollment(user_id=user_id, course_id=course_id)
+            for user_id, _ in new_enrollments
+        ])
+        _assign_default_forum_roles(course_id, new_enrollments)
+
+    adjust_course_enrollment_count(course_id, len(new_enrollments))
+    log.info("bulk enrollment in %s: %d added, %d pending",
+             course_id, len(new_enrollments), len(new_allowed))
+    return status
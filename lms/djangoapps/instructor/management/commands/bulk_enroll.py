@@ -0,0 +1,41 @@
+#!/usr/bin/python
+#
+# django management command: enroll a list of students in a course
+
+from optparse import make_option
+
+from instructor.enrollment import bulk_enroll_students, split_emails
+from courseware.courses import get_course_by_id
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Enroll students in a course.  Usage: bulk_enroll course_id filename\n"
+    help += "   course_id: the course to enroll students in\n"
+    help += "   filename: a file of student emails, separated by commas or whitespace\n"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--overload',
+                    action='store_true',
+                    dest='overload',
+                    default=False,
+                    help='Un-enroll all non-staff students not in the file, and clear the pending enrollment list'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError(self.help)
+
+        course_id, filename = args
+        course = get_course_by_id(course_id)
+
+        with open(filename) as emails_file:
+            emails = split_emails(emails_file.read())
+
+        print "Enrolling %d students in %s (overload=%s)" % (len(emails), course_id, options['overload'])
+        status = bulk_enroll_students(course, course_id, emails, overload=options['overload'])
+
+        for email, action in sorted(status.items()):
+            print "%s: %s" % (email, action)
+        print "Done"
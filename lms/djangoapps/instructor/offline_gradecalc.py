@@ -81,6 +81,26 @@ def offline_grades_available(course_id):
     return ocgl.latest('created')
 
 
+def offline_gradesets(students, course_id):
+    '''
+    Returns a dict mapping user id to the offline computed gradeset for each of students
+    that has one, fetched in a single query.
+    '''
+    rows = models.OfflineComputedGrade.objects.filter(
+        user__in=[student.id for student in students],
+        course_id=course_id,
+    ).values_list('user', 'gradeset')
+    return dict((user_id, json.loads(gradeset)) for user_id, gradeset in rows)
+
+
+def missing_offline_gradeset(student, course_id):
+    '''
+    The gradeset returned for a student with no offline computed gradeset
+    '''
+    return dict(raw_scores=[], section_breakdown=[],
+                msg='Error: no offline gradeset available for %s, %s' % (student, course_id))
+
+
 def student_grades(student, request, course, keep_raw_scores=False, use_offline=False):
     '''
     This is the main interface to get grades.  It has the same parameters as grades.grade, as well
@@ -93,7 +113,6 @@ def student_grades(student, request, course, keep_raw_scores=False, use_offline=
     try:
         ocg = models.OfflineComputedGrade.objects.get(user=student, course_id=course.id)
     except models.OfflineComputedGrade.DoesNotExist:
-        return dict(raw_scores=[], section_breakdown=[],
-                    msg='Error: no offline gradeset available for %s, %s' % (student, course.id))
+        return missing_offline_gradeset(student, course.id)
 
     return json.loads(ocg.gradeset)
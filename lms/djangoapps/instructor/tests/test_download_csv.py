@@ -14,9 +14,11 @@ from django.test.utils import override_settings
 from django.contrib.auth.models import Group
 
 from django.core.urlresolvers import reverse
+from django.test.client import RequestFactory
 
 from courseware.access import _course_staff_group_name
 from courseware.tests.tests import LoginEnrollmentTestCase, TEST_DATA_XML_MODULESTORE, get_user
+from instructor.views import get_student_grade_summary_data, iter_student_grade_rows
 from xmodule.modulestore.django import modulestore
 import xmodule.modulestore.django
 
@@ -76,3 +78,16 @@ class TestInstructorDashboardGradeDownloadCSV(LoginEnrollmentTestCase):
 '''
 
         self.assertEqual(body, expected_body, msg)
+
+    def test_grade_rows_match_summary_data(self):
+        course = self.toy
+        self.logout()
+        self.login(self.student, self.password)
+        self.enroll(course)
+
+        request = RequestFactory().get('/')
+        datatable = get_student_grade_summary_data(request, course, course.id)
+        rows = list(iter_student_grade_rows(request, course, course.id, chunk_size=1))
+
+        self.assertEqual(rows[0], datatable['header'])
+        self.assertEqual(rows[1:], datatable['data'])
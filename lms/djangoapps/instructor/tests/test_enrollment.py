@@ -0,0 +1,64 @@
+"""
+Unit tests for bulk enrollment
+"""
+from mock import Mock
+
+from django.test import TestCase
+
+from django_comment_common.models import Role
+from student.models import CourseEnrollment, CourseEnrollmentAllowed
+from student.tests.factories import UserFactory, CourseEnrollmentFactory, GroupFactory
+from xmodule.modulestore import Location
+
+from instructor.enrollment import bulk_enroll_students, split_emails
+
+COURSE_ID = 'edX/toy/2012_Fall'
+
+
+class TestBulkEnrollment(TestCase):
+
+    def setUp(self):
+        self.course = Mock(location=Location('i4x', 'edX', 'toy', 'course', '2012_Fall'))
+        self.student = UserFactory.create(email='student@test.com')
+        self.enrolled = UserFactory.create(email='enrolled@test.com')
+        CourseEnrollmentFactory.create(user=self.enrolled, course_id=COURSE_ID)
+
+    def enrolled_emails(self):
+        return set(CourseEnrollment.objects.filter(course_id=COURSE_ID).values_list('user__email', flat=True))
+
+    def test_split_emails(self):
+        self.assertEqual(split_emails('a@test.com, b@test.com\nc@test.com a@test.com '),
+                         ['a@test.com', 'b@test.com', 'c@test.com'])
+
+    def test_enroll(self):
+        status = bulk_enroll_students(self.course, COURSE_ID,
+                                      ['student@test.com', 'enrolled@test.com', 'nobody@test.com'])
+        self.assertEqual(status, {
+            'student@test.com': 'added',
+            'enrolled@test.com': 'already enrolled',
+            'nobody@test.com': 'user does not exist, enrollment allowed, pending',
+        })
+        self.assertEqual(self.enrolled_emails(), set(['student@test.com', 'enrolled@test.com']))
+        self.assertTrue(CourseEnrollmentAllowed.objects.filter(course_id=COURSE_ID, email='nobody@test.com').exists())
+
+        # new enrollments get the default forum role
+        self.assertTrue(Role.objects.get(course_id=COURSE_ID, name='Student').users.filter(id=self.student.id).exists())
+
+        status = bulk_enroll_students(self.course, COURSE_ID, ['nobody@test.com'])
+        self.assertEqual(status, {'nobody@test.com': 'user does not exist, enrollment already allowed, pending'})
+
+    def test_overload(self):
+        staff = UserFactory.create(email='staff@test.com')
+        GroupFactory.create(name='staff_' + COURSE_ID).user_set.add(staff)
+        CourseEnrollmentFactory.create(user=staff, course_id=COURSE_ID)
+        CourseEnrollmentAllowed.objects.create(email='pending@test.com', course_id=COURSE_ID)
+
+        status = bulk_enroll_students(self.course, COURSE_ID, ['student@test.com'], overload=True)
+        self.assertEqual(status, {
+            'student@test.com': 'added',
+            'enrolled@test.com': 'deleted',
+            'staff@test.com': 'is staff',
+            'pending@test.com': 'removed from pending enrollment list',
+        })
+        self.assertEqual(self.enrolled_emails(), set(['student@test.com', 'staff@test.com']))
+        self.assertFalse(CourseEnrollmentAllowed.objects.filter(course_id=COURSE_ID).exists())
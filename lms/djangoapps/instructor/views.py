@@ -12,6 +12,7 @@ import requests
 from requests.status_codes import codes
 import urllib
 from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 from StringIO import StringIO
 
@@ -33,16 +34,23 @@ from django_comment_common.models import (Role,
                                           FORUM_ROLE_MODERATOR,
                                           FORUM_ROLE_COMMUNITY_TA)
 from django_comment_client.utils import has_forum_access
+from external_auth.models import ExternalAuthMap
 from psychometrics import psychoanalyze
-from student.models import CourseEnrollment, CourseEnrollmentAllowed
+from student.models import CourseEnrollment, CourseEnrollmentAllowed, UserProfile, course_enrollment_count
+from util.cache import cache
 from xmodule.modulestore.django import modulestore
 import xmodule.graders as xmgraders
 import track.views
 
-from .offline_gradecalc import student_grades, offline_grades_available
+from .enrollment import bulk_enroll_students, split_emails
+from .offline_gradecalc import (student_grades, offline_grades_available,
+                                offline_gradesets, missing_offline_gradeset)
 
 log = logging.getLogger(__name__)
 
+# number of students fetched (and graded) at a time when streaming grade CSVs
+STUDENT_CHUNK_SIZE = 500
+
 # internal commands for managing forum roles:
 FORUM_ROLE_ADD = 'add'
 FORUM_ROLE_REMOVE = 'remove'
@@ -59,7 +67,10 @@ def split_by_comma_and_whitespace(s):
 @cache_control(no_cache=True, no_store=True, must_revalidate=True)
 def instructor_dashboard(request, course_id):
     """Display the instructor dashboard for a course."""
-    course = get_course_with_access(request.user, course_id, 'staff', depth=None)
+    # the whole course tree is only needed to carry out actions; just
+    # displaying the dashboard gets by with the course itself
+    course_depth = None if request.POST.get('action') else 0
+    course = get_course_with_access(request.user, course_id, 'staff', depth=course_depth)
 
     instructor_access = has_access(request.user, course, 'instructor')   # an instructor can manage staff lists
 
@@ -81,20 +92,10 @@ def instructor_dashboard(request, course_id):
     datatable = {'header': ['Statistic', 'Value'],
                  'title': 'Course Statistics At A Glance',
                  }
-    data = [['# Enrolled', CourseEnrollment.objects.filter(course_id=course_id).count()]]
-    data += compute_course_stats(course).items()
+    data = [['# Enrolled', course_enrollment_count(course_id)]]
+    data += course_stats(course).items()
     if request.user.is_staff:
-        for field in course.fields:
-            if getattr(field.scope, 'user', False):
-                continue
-
-            data.append([field.name, json.dumps(field.read_json(course))])
-        for namespace in course.namespaces:
-            for field in getattr(course, namespace).fields:
-                if getattr(field.scope, 'user', False):
-                    continue
-
-                data.append(["{}.{}".format(namespace, field.name), json.dumps(field.read_json(course))])
+        data += course_field_data(course)
     datatable['data'] = data
 
     def return_csv(fn, datatable, fp=None):
@@ -189,13 +190,14 @@ def instructor_dashboard(request, course_id):
 
     elif 'Download CSV of all student grades' in action:
         track.views.server_track(request, 'dump-grades-csv', {}, page='idashboard')
-        return return_csv('grades_{0}.csv'.format(course_id),
-                          get_student_grade_summary_data(request, course, course_id, use_offline=use_offline))
+        return streaming_csv_response('grades_{0}.csv'.format(course_id),
+                                      iter_student_grade_rows(request, course, course_id, use_offline=use_offline))
 
     elif 'Download CSV of all RAW grades' in action:
         track.views.server_track(request, 'dump-grades-csv-raw', {}, page='idashboard')
-        return return_csv('grades_{0}_raw.csv'.format(course_id),
-                          get_student_grade_summary_data(request, course, course_id, get_raw_scores=True, use_offline=use_offline))
+        return streaming_csv_response('grades_{0}_raw.csv'.format(course_id),
+                                      iter_student_grade_rows(request, course, course_id, get_raw_scores=True,
+                                                              use_offline=use_offline))
 
     elif 'Download CSV of answer distributions' in action:
         track.views.server_track(request, 'dump-answer-dist-csv', {}, page='idashboard')
@@ -626,6 +628,16 @@ def instructor_dashboard(request, course_id):
 
     analytics_results = {}
 
+    def cached_analytics_result(analytics_name):
+        """get_analytics_result, cached for ANALYTICS_CACHE_TIMEOUT seconds"""
+        key = u'analytics.{0}.{1}'.format(course_id, analytics_name)
+        result = cache.get(key)
+        if result is None:
+            result = get_analytics_result(analytics_name)
+            if result is not None:
+                cache.set(key, result, settings.ANALYTICS_CACHE_TIMEOUT)
+        return result
+
     if idash_mode == 'Analytics':
         DASHBOARD_ANALYTICS = [
             # "StudentsAttemptedProblems",  # num students who tried given problem
@@ -637,8 +649,13 @@ def instructor_dashboard(request, course_id):
             # "StudentsPerProblemCorrect",  # foreach problem, num students correct
             "ProblemGradeDistribution",  # foreach problem, grade distribution
         ]
-        for analytic_name in DASHBOARD_ANALYTICS:
-            analytics_results[analytic_name] = get_analytics_result(analytic_name)
+        # fetch them all at once, rather than waiting on each in turn
+        pool = ThreadPool(len(DASHBOARD_ANALYTICS))
+        try:
+            results = pool.map(cached_analytics_result, DASHBOARD_ANALYTICS)
+        finally:
+            pool.close()
+        analytics_results = dict(zip(DASHBOARD_ANALYTICS, results))
 
     #----------------------------------------
     # offline grades?
@@ -933,6 +950,92 @@ def get_student_grade_summary_data(request, course, course_id, get_grades=True,
     datatable['data'] = data
     return datatable
 
+
+def iter_enrolled_students(course_id, chunk_size=STUDENT_CHUNK_SIZE):
+    '''
+    Yields the students enrolled in course_id, ordered by username, in lists of
+    at most chunk_size.  Each chunk is a separate query keyed on the last username
+    seen, so only one chunk of users is in memory at a time.
+    '''
+    enrolled_students = User.objects.filter(courseenrollment__course_id=course_id).order_by('username')
+    last_username = None
+    while True:
+        chunk = enrolled_students
+        if last_username is not None:
+            chunk = chunk.filter(username__gt=last_username)
+        chunk = list(chunk.prefetch_related("groups")[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_username = chunk[-1].username
+
+
+def iter_student_grade_rows(request, course, course_id, get_raw_scores=False, use_offline=False,
+                            chunk_size=STUDENT_CHUNK_SIZE):
+    '''
+    Yields the same rows as get_student_grade_summary_data(get_grades=True) would
+    put in its datatable, header first, computing grades one chunk of students
+    at a time so that memory use doesn't grow with the size of the course.
+    '''
+    header = ['ID', 'Username', 'Full Name', 'edX email', 'External email']
+    header_sent = False
+
+    for students in iter_enrolled_students(course_id, chunk_size):
+        # one query each for the names, external emails and (if used) offline
+        # grades of the whole chunk
+        student_ids = [student.id for student in students]
+        names = dict(UserProfile.objects.filter(user__in=student_ids).values_list('user', 'name'))
+        external_emails = dict(ExternalAuthMap.objects.filter(user__in=student_ids).values_list('user', 'external_email'))
+        if use_offline:
+            gradesets = offline_gradesets(students, course_id)
+
+        for student in students:
+            if use_offline:
+                gradeset = gradesets.get(student.id) or missing_offline_gradeset(student, course_id)
+            else:
+                gradeset = grades.grade(student, request, course, keep_raw_scores=get_raw_scores)
+
+            if get_raw_scores:
+                # TODO (ichuang) encode Score as dict instead of as list, so score[0] -> score['earned']
+                sgrades = [(getattr(score, 'earned', '') or score[0]) for score in gradeset['raw_scores']]
+            else:
+                sgrades = [x['percent'] for x in gradeset['section_breakdown']]
+
+            if not header_sent:
+                # the first student's gradeset labels the grade columns
+                if get_raw_scores:
+                    header += [score.section for score in gradeset['raw_scores']]
+                else:
+                    header += [x['label'] for x in gradeset['section_breakdown']]
+                yield header
+                header_sent = True
+
+            datarow = [student.id, student.username, names.get(student.id, ''), student.email,
+                       external_emails.get(student.id, '')]
+            yield datarow + sgrades
+
+    if not header_sent:
+        yield header
+
+
+def streaming_csv_response(filename, rows):
+    '''
+    Returns an HttpResponse that writes rows out as a CSV attachment as they are
+    generated, rather than building the whole file in memory first.
+    '''
+    def csv_lines():
+        buf = StringIO()
+        writer = csv.writer(buf, dialect='excel', quotechar='"', quoting=csv.QUOTE_ALL)
+        for row in rows:
+            writer.writerow([unicode(s).encode('utf-8') for s in row])
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    response = HttpResponse(csv_lines(), mimetype='text/csv')
+    response['Content-Disposition'] = 'attachment; filename={0}'.format(filename)
+    return response
+
 #-----------------------------------------------------------------------------
 
 
@@ -986,50 +1089,7 @@ def _do_enroll_students(course, course_id, students, overload=False):
     """Do the actual work of enrolling multiple students, presented as a string
     of emails separated by commas or returns"""
 
-    new_students = split_by_comma_and_whitespace(students)
-    new_students = [str(s.strip()) for s in new_students]
-    new_students_lc = [x.lower() for x in new_students]
-
-    if '' in new_students:
-        new_students.remove('')
-
-    status = dict([x, 'unprocessed'] for x in new_students)
-
-    if overload:  	# delete all but staff
-        todelete = CourseEnrollment.objects.filter(course_id=course_id)
-        for ce in todelete:
-            if not has_access(ce.user, course, 'staff') and ce.user.email.lower() not in new_students_lc:
-                status[ce.user.email] = 'deleted'
-                ce.delete()
-            else:
-                status[ce.user.email] = 'is staff'
-        ceaset = CourseEnrollmentAllowed.objects.filter(course_id=course_id)
-        for cea in ceaset:
-            status[cea.email] = 'removed from pending enrollment list'
-        ceaset.delete()
-
-    for student in new_students:
-        try:
-            user = User.objects.get(email=student)
-        except User.DoesNotExist:
-            # user not signed up yet, put in pending enrollment allowed table
-            if CourseEnrollmentAllowed.objects.filter(email=student, course_id=course_id):
-                status[student] = 'user does not exist, enrollment already allowed, pending'
-                continue
-            cea = CourseEnrollmentAllowed(email=student, course_id=course_id)
-            cea.save()
-            status[student] = 'user does not exist, enrollment allowed, pending'
-            continue
-
-        if CourseEnrollment.objects.filter(user=user, course_id=course_id):
-            status[student] = 'already enrolled'
-            continue
-        try:
-            nce = CourseEnrollment(user=user, course_id=course_id)
-            nce.save()
-            status[student] = 'added'
-        except:
-            status[student] = 'rejected'
+    status = bulk_enroll_students(course, course_id, split_emails(students), overload=overload)
 
     datatable = {'header': ['StudentEmail', 'action']}
     datatable['data'] = [[x, status[x]] for x in status]
@@ -1060,7 +1120,7 @@ def enroll_students(request, course_id):
     """
 
     course = get_course_with_access(request.user, course_id, 'staff')
-    existing_students = [ce.user.email for ce in CourseEnrollment.objects.filter(course_id=course_id)]
+    existing_students = list(CourseEnrollment.objects.filter(course_id=course_id).values_list('user__email', flat=True))
 
     new_students = request.POST.get('new_students')
     ret = _do_enroll_students(course, course_id, new_students)
@@ -1087,7 +1147,7 @@ def get_answers_distribution(request, course_id):
     """
     course = get_course_with_access(request.user, course_id, 'staff')
 
-    dist = grades.answer_distributions(request, course)
+    dist = grades.answer_distributions(course, incremental=True)
 
     d = {}
     d['header'] = ['url_name', 'display name', 'answer id', 'answer', 'count']
@@ -1101,6 +1161,61 @@ def get_answers_distribution(request, course_id):
 #-----------------------------------------------------------------------------
 
 
+def _cached_per_content_version(course, name, compute):
+    '''
+    compute(), cached under name per course content version, so that it only
+    runs again when the course changes.
+    '''
+    version = modulestore().get_course_content_version(course.location)
+    if version is None:
+        return compute()
+
+    key = u'{0}.{1}.{2}'.format(name, course.id, version)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value)
+    return value
+
+
+def course_stats(course):
+    '''
+    compute_course_stats(course), cached per course content version
+    so that the course tree only has to be walked when it changes.
+    '''
+    store = modulestore()
+    return _cached_per_content_version(
+        course, 'course_stats',
+        lambda: compute_course_stats(store.get_instance(course.id, course.location, depth=None)))
+
+
+def course_field_data(course):
+    '''
+    compute_course_field_data(course), cached per course content version
+    '''
+    return _cached_per_content_version(course, 'course_field_data', lambda: compute_course_field_data(course))
+
+
+def compute_course_field_data(course):
+    '''
+    Returns a [name, JSON value] row for each of the course's fields that
+    isn't scoped to a user, including those of its namespaces.
+    '''
+    data = []
+    for field in course.fields:
+        if getattr(field.scope, 'user', False):
+            continue
+
+        data.append([field.name, json.dumps(field.read_json(course))])
+    for namespace in course.namespaces:
+        for field in getattr(course, namespace).fields:
+            if getattr(field.scope, 'user', False):
+                continue
+
+            data.append(["{}.{}".format(namespace, field.name), json.dumps(field.read_json(course))])
+    return data
+
+
 def compute_course_stats(course):
     '''
     Compute course statistics, including number of problems, videos, html.
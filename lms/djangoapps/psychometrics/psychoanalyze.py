@@ -13,8 +13,9 @@ import numpy as np
 from scipy.optimize import curve_fit
 
 from django.conf import settings
-from django.db.models import Sum, Max
+from django.db.models import Count, Max
 from psychometrics.models import *
+from util.cache import cache
 
 log = logging.getLogger("mitx.psychometrics")
 
@@ -107,16 +108,41 @@ def make_histogram(ydata, bins=None):
     if bins is None:
         bins = range(0, 100, 10)
 
-    nbins = len(bins)
-    hist = dict(zip(bins, [0] * nbins))
-    for y in ydata:
-        for b in bins[::-1]:    # in reverse order
-            if y > b:
-                hist[b] += 1
-                break
+    ydata = np.asarray(ydata, dtype=float)
+    ydata = ydata[~np.isnan(ydata)]
+
+    # each y is counted in the largest bin b with y > b
+    idx = np.searchsorted(np.asarray(bins, dtype=float), ydata, side='left') - 1
+    counts = np.bincount(idx[idx >= 0], minlength=len(bins))
+
+    hist = dict((b, int(count)) for b, count in zip(bins, counts))
     # hist['bins'] = bins
     return hist
 
+
+def stat_summary(values):
+    """
+    Vectorized equivalent of str(StatVar) for values: cnt, avg, sdv, ignoring NaNs.
+    Returns (summary string, cnt, sdv).
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    cnt = len(values)
+    if cnt == 0:
+        return 'cnt=0, avg=0.000000, sdv=0.000000', 0, 0
+    avg = values.mean()
+    sdv = values.std()
+    return 'cnt=%d, avg=%f, sdv=%f' % (cnt, avg, sdv), cnt, sdv
+
+
+def cumulative_attempts(attempts, max_attempts):
+    """
+    Returns the fraction of the students with attempts (a non-empty int array)
+    who needed at most x attempts, for x from 1 to max_attempts
+    """
+    counts = np.bincount(attempts, minlength=max_attempts + 1)[1:max_attempts + 1]
+    return list(np.cumsum(counts) / len(attempts))
+
 #-----------------------------------------------------------------------------
 
 
@@ -126,18 +152,91 @@ def problems_with_psychometric_data(course_id):
     Does this for a given course_id.
     '''
     pmdset = PsychometricData.objects.using(db).filter(studentmodule__course_id=course_id)
-    plist = [p['studentmodule__module_state_key'] for p in pmdset.values('studentmodule__module_state_key').distinct()]
-    problems = dict((p, pmdset.filter(studentmodule__module_state_key=p).count()) for p in plist)
+    counts = pmdset.values('studentmodule__module_state_key').annotate(count=Count('id'))
+    problems = dict((p['studentmodule__module_state_key'], p['count']) for p in counts)
 
     return problems
 
 #-----------------------------------------------------------------------------
 
 
+class ProblemData(object):
+    """
+    The psychometric data for one problem, as columns:
+
+    grades, max_grades: float arrays from the StudentModules (NaN for no grade)
+    attempts: int array
+    checktimes: list of lists of datetimes (checktimes are stored as python
+        source, so they are only evaluated when needed)
+    """
+    def __init__(self, rows):
+        rows = list(rows)
+        self.count = len(rows)
+        self.grades = np.array([row[0] for row in rows], dtype=float)
+        self.max_grades = np.array([row[1] for row in rows], dtype=float)
+        self.attempts = np.array([row[2] or 0 for row in rows], dtype=int)
+        self._checktimes = [row[3] for row in rows]
+
+    @classmethod
+    def load(cls, problem):
+        """
+        Load the data for problem (a location url) in a single joined query
+        """
+        rows = PsychometricData.objects.using(db).filter(
+            studentmodule__module_state_key=problem
+        ).values_list('studentmodule__grade', 'studentmodule__max_grade', 'attempts', 'checktimes')
+        return cls(rows)
+
+    def check_intervals(self, max_minutes=20):
+        """
+        Returns an array of the time differences, in minutes, between successive
+        checks by the same student, ignoring any of max_minutes or longer
+        """
+        intervals = []
+        for checktimes in self._checktimes:
+            try:
+                checktimes = eval(checktimes)                   # update log of attempt timestamps
+            except:
+                continue
+            if len(checktimes) < 2:
+                continue
+            seconds = np.array([(ct - checktimes[0]).total_seconds() for ct in checktimes])
+            intervals.append(np.diff(seconds) / 60.0)
+        if not intervals:
+            return np.array([])
+        intervals = np.concatenate(intervals)
+        return intervals[intervals < max_minutes]
+
+
+def _plots_cache_key(problem):
+    """
+    Returns the cache key for the plots for problem.  This includes the number
+    of submissions and the time of the latest one, so cached plots are replaced
+    as soon as there is new data.
+    """
+    stats = PsychometricData.objects.using(db).filter(
+        studentmodule__module_state_key=problem
+    ).aggregate(Count('id'), Max('studentmodule__modified'))
+    return u'psychometrics.plots.{0}.{1}.{2}'.format(problem, stats['id__count'], stats['studentmodule__modified__max'])
+
+
 def generate_plots_for_problem(problem):
+    """
+    Returns (msg, plots) for problem, from cache if there have been no new
+    submissions since they were last generated
+    """
+    key = _plots_cache_key(problem)
+    result = cache.get(key)
+    if result is None:
+        result = _generate_plots_for_problem(problem)
+        cache.set(key, result)
+    return result
+
 
-    pmdset = PsychometricData.objects.using(db).filter(studentmodule__module_state_key=problem)
-    nstudents = pmdset.count()
+def _generate_plots_for_problem(problem):
+
+    data = ProblemData.load(problem)
+    nstudents = data.count
     msg = ""
     plots = []
 
@@ -145,11 +244,11 @@ def generate_plots_for_problem(problem):
         msg += "%s nstudents=%d --> skipping, too few" % (problem, nstudents)
         return msg, plots
 
-    max_grade = pmdset[0].studentmodule.max_grade
+    max_grade = data.max_grades[0]
+    if np.isnan(max_grade):
+        max_grade = 0
 
-    agdat = pmdset.aggregate(Sum('attempts'), Max('attempts'))
-    max_attempts = agdat['attempts__max']
-    total_attempts = agdat['attempts__sum']     # not used yet
+    max_attempts = int(data.attempts.max())
 
     msg += "max attempts = %d" % max_attempts
 
@@ -157,11 +256,9 @@ def generate_plots_for_problem(problem):
     dataset = {'xdat': xdat}
 
     # compute grade statistics
-    grades = [pmd.studentmodule.grade for pmd in pmdset]
-    gsv = StatVar()
-    for g in grades:
-        gsv += g
-    msg += "<br><p><font color='blue'>Grade distribution: %s</font></p>" % gsv
+    grades = data.grades
+    gsummary, _, _ = stat_summary(grades)
+    msg += "<br><p><font color='blue'>Grade distribution: %s</font></p>" % gsummary
 
     # generate grade histogram
     ghist = []
@@ -176,9 +273,10 @@ def generate_plots_for_problem(problem):
          }]
          }"""
 
-    if gsv.max > max_grade:
-        msg += "<br/><p><font color='red'>Something is wrong: max_grade=%s, but max(grades)=%s</font></p>" % (max_grade, gsv.max)
-        max_grade = gsv.max
+    gmax = np.nanmax(grades) if not np.isnan(grades).all() else None
+    if gmax is not None and gmax > max_grade:
+        msg += "<br/><p><font color='red'>Something is wrong: max_grade=%s, but max(grades)=%s</font></p>" % (max_grade, gmax)
+        max_grade = gmax
 
     if max_grade > 1:
         ghist = make_histogram(grades, np.linspace(0, max_grade, max_grade + 1))
@@ -195,26 +293,11 @@ def generate_plots_for_problem(problem):
         msg += "<br/>Not generating histogram: max_grade=%s" % max_grade
 
     # histogram of time differences between checks
-    # Warning: this is inefficient - doesn't scale to large numbers of students
-    dtset = []  # time differences in minutes
-    dtsv = StatVar()
-    for pmd in pmdset:
-        try:
-            checktimes = eval(pmd.checktimes)                   # update log of attempt timestamps
-        except:
-            continue
-        if len(checktimes) < 2:
-            continue
-        ct0 = checktimes[0]
-        for ct in checktimes[1:]:
-            dt = (ct - ct0).total_seconds() / 60.0
-            if dt < 20:                   # ignore if dt too long
-                dtset.append(dt)
-                dtsv += dt
-            ct0 = ct
-    if dtsv.cnt > 2:
-        msg += "<br/><p><font color='brown'>Time differences between checks: %s</font></p>" % dtsv
-        bins = np.linspace(0, 1.5 * dtsv.sdv(), 30)
+    dtset = data.check_intervals()  # time differences in minutes
+    dtsummary, dtcnt, dtsdv = stat_summary(dtset)
+    if dtcnt > 2:
+        msg += "<br/><p><font color='brown'>Time differences between checks: %s</font></p>" % dtsummary
+        bins = np.linspace(0, 1.5 * dtsdv, 30)
         dbar = bins[1] - bins[0]
         thist = make_histogram(dtset, bins)
         thist_json = json.dumps(sorted(thist.items(), key=lambda(x): x[0]))
@@ -232,16 +315,11 @@ def generate_plots_for_problem(problem):
     # one IRT plot curve for each grade received (TODO: this assumes integer grades)
     for grade in range(1, int(max_grade) + 1):
         yset = {}
-        gset = pmdset.filter(studentmodule__grade=grade)
-        ngset = gset.count()
+        gattempts = data.attempts[grades == grade]
+        ngset = len(gattempts)
         if ngset == 0:
             continue
-        ydat = []
-        ylast = 0
-        for x in xdat:
-            y = gset.filter(attempts=x).count() / ngset
-            ydat.append(y + ylast)
-            ylast = y + ylast
+        ydat = cumulative_attempts(gattempts, max_attempts)
         yset['ydat'] = ydat
 
         if len(ydat) > 3:         # try to fit to logistic function if enough data points
@@ -249,7 +327,7 @@ def generate_plots_for_problem(problem):
                 cfp = curve_fit(func_2pl, xdat, ydat, [1.0, max_attempts / 2.0])
                 yset['fitparam'] = cfp
                 yset['fitpts'] = func_2pl(np.array(xdat), *cfp[0])
-                yset['fiterr'] = [yd - yf for (yd, yf) in zip(ydat, yset['fitpts'])]
+                yset['fiterr'] = np.array(ydat) - yset['fitpts']
                 fitx = np.linspace(xdat[0], xdat[-1], 100)
                 yset['fitx'] = fitx
                 yset['fity'] = func_2pl(np.array(fitx), *cfp[0])
@@ -0,0 +1,177 @@
+"""
+Tests that the numpy computations in psychoanalyze give the same results as
+the loops they replaced, which are kept here as reference implementations.
+"""
+from __future__ import division
+
+import datetime
+
+import numpy as np
+from django.test import TestCase
+
+from psychometrics.psychoanalyze import (ProblemData, StatVar, cumulative_attempts, make_histogram,
+                                         stat_summary)
+
+
+def loop_make_histogram(ydata, bins=None):
+    """The make_histogram loop: each y is counted in the largest bin b with y > b"""
+    if bins is None:
+        bins = range(0, 100, 10)
+    hist = dict(zip(bins, [0] * len(bins)))
+    for y in ydata:
+        for b in bins[::-1]:
+            if y > b:
+                hist[b] += 1
+                break
+    return hist
+
+
+def loop_check_intervals(checktimes_list, max_minutes=20):
+    """The check interval loop of generate_plots_for_problem"""
+    dtset = []
+    for checktimes in checktimes_list:
+        try:
+            checktimes = eval(checktimes)
+        except:
+            continue
+        if len(checktimes) < 2:
+            continue
+        ct0 = checktimes[0]
+        for ct in checktimes[1:]:
+            dt = (ct - ct0).total_seconds() / 60.0
+            if dt < max_minutes:
+                dtset.append(dt)
+            ct0 = ct
+    return dtset
+
+
+def loop_cumulative_attempts(attempts, max_attempts):
+    """The IRT curve loop of generate_plots_for_problem"""
+    ydat = []
+    ylast = 0
+    for x in range(1, max_attempts + 1):
+        y = len([a for a in attempts if a == x]) / len(attempts)
+        ydat.append(y + ylast)
+        ylast = y + ylast
+    return ydat
+
+
+def checktimes(*minutes):
+    """The stored checktimes of checks at the given minutes past a start time"""
+    start = datetime.datetime(2013, 3, 1, 12, 0, 0)
+    return repr([start + datetime.timedelta(minutes=m) for m in minutes])
+
+
+class MakeHistogramTest(TestCase):
+
+    def assertSameHistogram(self, ydata, bins=None):
+        self.assertEqual(make_histogram(ydata, bins), loop_make_histogram(ydata, bins))
+
+    def test_default_bins(self):
+        self.assertSameHistogram([-5, 0, 3, 9.5, 10, 10.5, 55, 90, 99, 100, 250])
+
+    def test_values_on_bin_edges(self):
+        bins = list(np.linspace(0, 4, 5))
+        self.assertSameHistogram([0, 1, 2, 3, 4, 1, 1], bins)
+        self.assertSameHistogram([0.0, 1.0, 4.0], bins)
+
+    def test_linspace_bins(self):
+        bins = np.linspace(0, 1.5 * 2.3, 30)
+        self.assertSameHistogram([0.05 * n for n in range(100)], bins)
+
+    def test_empty(self):
+        self.assertSameHistogram([])
+        self.assertEqual(make_histogram([]), dict((b, 0) for b in range(0, 100, 10)))
+
+    def test_single_value(self):
+        self.assertSameHistogram([1], np.linspace(0, 1, 2))
+        self.assertSameHistogram([42])
+
+    def test_missing_values(self):
+        # None grades aren't counted (None > b is False)
+        self.assertSameHistogram([None, 2, None, 3], np.linspace(0, 3, 4))
+        self.assertEqual(make_histogram([float('nan'), 2], [0, 1, 2]), {0: 0, 1: 1, 2: 0})
+
+
+class StatSummaryTest(TestCase):
+
+    def assertSameSummary(self, values):
+        statvar = StatVar()
+        for value in values:
+            statvar += value
+        summary, cnt, sdv = stat_summary(values)
+        self.assertEqual(summary, str(statvar))
+        self.assertEqual(cnt, statvar.cnt)
+        self.assertAlmostEqual(sdv, statvar.sdv())
+
+    def test_values(self):
+        self.assertSameSummary([0, 1, 1, 2, 3, 5, 8])
+        self.assertSameSummary([0.25, 1.5, 19.75, 3.125])
+
+    def test_missing_values(self):
+        self.assertSameSummary([None, 1, None, 2, 4])
+
+    def test_single_value(self):
+        self.assertSameSummary([3])
+
+    def test_equal_values(self):
+        self.assertSameSummary([0.1] * 7)
+
+    def test_empty(self):
+        # StatVar divides by zero here
+        self.assertEqual(stat_summary([]), ('cnt=0, avg=0.000000, sdv=0.000000', 0, 0))
+
+
+class CheckIntervalsTest(TestCase):
+
+    def assertSameIntervals(self, checktimes_list, max_minutes=20):
+        data = ProblemData((1, 1, 1, times) for times in checktimes_list)
+        intervals = data.check_intervals(max_minutes)
+        expected = loop_check_intervals(checktimes_list, max_minutes)
+        self.assertEqual(len(intervals), len(expected))
+        for interval, dt in zip(intervals, expected):
+            self.assertAlmostEqual(interval, dt)
+
+    def test_intervals(self):
+        self.assertSameIntervals([
+            checktimes(0, 1, 2.5, 30, 31),
+            checktimes(0, 19.9, 39.9, 40),
+            checktimes(5, 6),
+        ])
+
+    def test_interval_limit(self):
+        # an interval of exactly max_minutes is left out
+        self.assertSameIntervals([checktimes(0, 20, 40.5, 41)])
+        self.assertSameIntervals([checktimes(0, 3, 10)], max_minutes=5)
+
+    def test_single_check(self):
+        self.assertSameIntervals([checktimes(0), checktimes(3)])
+
+    def test_unreadable_checktimes(self):
+        self.assertSameIntervals(['', 'not python', '[]', checktimes(0, 2)])
+
+    def test_empty(self):
+        self.assertSameIntervals([])
+        self.assertEqual(len(ProblemData([]).check_intervals()), 0)
+
+
+class CumulativeAttemptsTest(TestCase):
+
+    def assertSameCurve(self, attempts, max_attempts):
+        curve = cumulative_attempts(np.array(attempts, dtype=int), max_attempts)
+        expected = loop_cumulative_attempts(attempts, max_attempts)
+        self.assertEqual(len(curve), len(expected))
+        for y, expected_y in zip(curve, expected):
+            self.assertAlmostEqual(y, expected_y)
+
+    def test_curve(self):
+        self.assertSameCurve([1, 1, 2, 3, 3, 3, 5], 5)
+        self.assertSameCurve([2, 4, 4], 6)
+
+    def test_single_attempt(self):
+        self.assertSameCurve([1], 1)
+        self.assertEqual(cumulative_attempts(np.array([1]), 1), [1.0])
+
+    def test_unattempted(self):
+        # students with no attempts aren't on the curve, which then doesn't reach 1
+        self.assertSameCurve([0, 1, 2, 2], 2)
@@ -229,6 +229,30 @@ DEV_CONTENT = True
 TRACK_MAX_EVENT = 10000
 DEBUG_TRACK_LOG = False
 
+# Tracking events are written by a background thread, in batches of up to
+# TRACK_BATCH_SIZE or every TRACK_FLUSH_INTERVAL seconds.  Events beyond
+# TRACK_QUEUE_SIZE waiting to be written are dropped.  At exit, the process
+# waits up to TRACK_EXIT_FLUSH_TIMEOUT seconds for queued events to be written.
+TRACK_ASYNC = True
+TRACK_QUEUE_SIZE = 10000
+TRACK_BATCH_SIZE = 100
+TRACK_FLUSH_INTERVAL = 1.0
+TRACK_EXIT_FLUSH_TIMEOUT = 5.0
+
+# Requests to paths matching TRACK_IGNORE_URLS are not tracked.  The POST
+# data of requests matching TRACK_IGNORE_POST_URLS, of multipart requests, and
+# of requests with bodies over TRACK_MAX_POST_BODY bytes is not tracked, so
+# that the body does not have to be parsed.
+TRACK_IGNORE_URLS = [r'^/event$', r'^/login$']
+TRACK_IGNORE_POST_URLS = []
+TRACK_MAX_POST_BODY = 64 * 1024
+
+# Seconds to cache the grade histograms shown to staff under problems (0 to not cache)
+GRADE_HISTOGRAM_CACHE_TIMEOUT = 0
+
+# Seconds to cache the analytics shown on the instructor dashboard
+ANALYTICS_CACHE_TIMEOUT = 60
+
 MITX_ROOT_URL = ''
 
 LOGIN_REDIRECT_URL = MITX_ROOT_URL + '/accounts/login'
@@ -438,6 +462,7 @@ TEMPLATE_LOADERS = (
 MIDDLEWARE_CLASSES = (
     'contentserver.middleware.StaticContentServer',
     'request_cache.middleware.RequestCache',
+    'courseware.middleware.AccessContextMiddleware',
     'django_comment_client.middleware.AjaxExceptionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -25,6 +25,9 @@ MITX_FEATURES['ENABLE_DISCUSSION_SERVICE'] = True
 
 MITX_FEATURES['ENABLE_SERVICE_STATUS'] = True
 
+# Write tracking events as they happen, so tests can see them
+TRACK_ASYNC = False
+
 # Need wiki for courseware views to work. TODO (vshnayder): shouldn't need it.
 WIKI_ENABLED = True
 